@@ -17,15 +17,18 @@ import onnxruntime  # Required by ChromaDB
 import numpy as np  # Ensure NumPy is loaded early
 
 from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import OllamaEmbeddings
 from langchain_community.llms import Ollama
 from langchain.schema import HumanMessage, AIMessage
 
 # Import project modules
 from src.config import (
     CHROMA_PERSIST_DIR,
+    SPARSE_INDEX_DIR,
+    DENSE_INDEX_DIR,
     COLLECTION_NAME,
     EMBEDDING_MODEL,
+    QUERY_EMBEDDING_CACHE_SIZE,
+    QUERY_EMBEDDING_CACHE_TTL,
     LLM_MODEL,
     OLLAMA_BASE_URL,
     SYSTEM_PROMPT,
@@ -39,11 +42,24 @@ from src.config import (
     SPARSE_TOP_K,
     FINAL_TOP_K,
     RRF_K,
+    ADAPTIVE_DEPTH,
+    ADAPTIVE_DEPTHS,
+    SPARSE_DYNAMIC_PRUNING,
+    SPARSE_NUM_SHARDS,
+    DENSE_TIMEOUT,
+    SPARSE_TIMEOUT,
+    QUERY_EMBEDDING_TIMEOUT,
+    DENSE_BACKEND,
+    DENSE_HNSW_EF_SEARCH,
+    DENSE_RESCORE_FACTOR,
     ENABLE_INPUT_MODERATION,
     ENABLE_OUTPUT_VALIDATION,
     LLM_TEMPERATURE,
     MAX_HISTORY_LENGTH
 )
+from src.embedding import TimeoutOllamaEmbeddings
+from src.embedding_cache import CachedQueryEmbeddings, QueryEmbeddingCache
+from src.metadata_filter import MetadataFilter
 from src.retrieval import create_hybrid_retriever
 from src.guardrails import create_guardrails
 from src.utils import (
@@ -115,17 +131,26 @@ def initialize_rag_system():
     Cached to avoid reloading on every interaction.
     
     Returns:
-        Tuple of (vectorstore, retriever, llm, input_guard, output_guard)
+        Tuple of (vectorstore, retriever, llm, input_guard, output_guard, folders)
     """
     logger.info("Initializing RAG system...")
     
     try:
         # Initialize embeddings
-        embeddings = OllamaEmbeddings(
+        embeddings = TimeoutOllamaEmbeddings(
             model=EMBEDDING_MODEL,
-            base_url=OLLAMA_BASE_URL
+            base_url=OLLAMA_BASE_URL,
+            request_timeout=QUERY_EMBEDDING_TIMEOUT
         )
         
+        # Serve repeated questions from the query embedding cache (no Ollama call)
+        if QUERY_EMBEDDING_CACHE_SIZE:
+            embeddings = CachedQueryEmbeddings(
+                embeddings,
+                QueryEmbeddingCache(QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_TTL),
+                model_name=EMBEDDING_MODEL
+            )
+        
         # Load vector store
         vectorstore = Chroma(
             persist_directory=str(CHROMA_PERSIST_DIR),
@@ -133,29 +158,31 @@ def initialize_rag_system():
             collection_name=COLLECTION_NAME
         )
         
-        # Get all documents for BM25 indexing
-        all_docs = vectorstore.get()
-        
-        # Create document objects from the retrieved data
-        from types import SimpleNamespace
-        documents = []
-        for i in range(len(all_docs['ids'])):
-            doc = SimpleNamespace(
-                page_content=all_docs['documents'][i],
-                metadata=all_docs['metadatas'][i] if all_docs['metadatas'] else {}
-            )
-            documents.append(doc)
-        
-        # Initialize hybrid retriever
+        # Initialize hybrid retriever (memory-maps the BM25 index, and the dense
+        # index if enabled, written by ingestion; falls back to building BM25
+        # from the vector store and to querying ChromaDB for dense search)
         retriever = create_hybrid_retriever(
             vectorstore=vectorstore,
-            documents=documents,
             dense_top_k=DENSE_TOP_K,
             sparse_top_k=SPARSE_TOP_K,
             final_top_k=FINAL_TOP_K,
-            rrf_k=RRF_K
+            rrf_k=RRF_K,
+            sparse_index_dir=SPARSE_INDEX_DIR,
+            dynamic_pruning=SPARSE_DYNAMIC_PRUNING,
+            sparse_shards=SPARSE_NUM_SHARDS,
+            dense_timeout=DENSE_TIMEOUT,
+            sparse_timeout=SPARSE_TIMEOUT,
+            dense_index_dir=DENSE_INDEX_DIR if DENSE_BACKEND == "in_process" else None,
+            dense_ef_search=DENSE_HNSW_EF_SEARCH,
+            dense_rescore_factor=DENSE_RESCORE_FACTOR,
+            adaptive_depths=ADAPTIVE_DEPTHS if ADAPTIVE_DEPTH else None
         )
         
+        # Document folders offered as search scopes (read once here rather than
+        # from the index on every rerun)
+        folders = retriever.bm25_index.filter_values("folder") if retriever.bm25_index is not None else []
+        folders = [folder for folder in folders if folder]
+        
         # Initialize LLM
         llm = Ollama(
             model=LLM_MODEL,
@@ -170,14 +197,14 @@ def initialize_rag_system():
         )
         
         logger.info("RAG system initialized successfully")
-        return vectorstore, retriever, llm, input_guard, output_guard
+        return vectorstore, retriever, llm, input_guard, output_guard, folders
     
     except Exception as e:
         logger.error(f"Failed to initialize RAG system: {e}")
         raise
 
 
-def generate_response(query: str, retriever, llm, input_guard, output_guard, history: list):
+def generate_response(query: str, retriever, llm, input_guard, output_guard, history: list, metadata_filter=None):
     """
     Generate a response using the RAG pipeline.
     
@@ -188,6 +215,7 @@ def generate_response(query: str, retriever, llm, input_guard, output_guard, his
         input_guard: Input guardrail
         output_guard: Output guardrail
         history: Conversation history
+        metadata_filter: Optional MetadataFilter restricting the searched documents
         
     Returns:
         Tuple of (response_text, thinking_text, source_documents) or (error_message, None, None)
@@ -202,7 +230,7 @@ def generate_response(query: str, retriever, llm, input_guard, output_guard, his
         
         # Step 2: Retrieve relevant documents
         logger.info(f"Processing query: {query[:100]}...")
-        relevant_docs = retriever.retrieve(query)
+        relevant_docs = retriever.retrieve(query, metadata_filter=metadata_filter)
         
         if not relevant_docs:
             logger.warning("No relevant documents found")
@@ -359,13 +387,24 @@ def main():
     # Initialize RAG system
     try:
         with st.spinner("🔄 Initializing RAG system..."):
-            vectorstore, retriever, llm, input_guard, output_guard = initialize_rag_system()
+            vectorstore, retriever, llm, input_guard, output_guard, folders = initialize_rag_system()
     except Exception as e:
         st.error(f"❌ Failed to initialize RAG system: {e}")
         st.error("Please ensure Ollama is running with the required models:")
         st.code(f"ollama pull {EMBEDDING_MODEL}\nollama pull {LLM_MODEL}")
         st.stop()
     
+    # Optionally restrict retrieval to some document folders
+    with st.sidebar:
+        st.markdown("---")
+        st.header("📁 Search Scope")
+        selected_folders = st.multiselect(
+            "Search only in",
+            folders,
+            help="Leave empty to search all documents"
+        )
+    metadata_filter = MetadataFilter(folders=selected_folders) if selected_folders else None
+    
     # Display conversation history
     for i, message in enumerate(st.session_state.messages):
         with st.chat_message(message["role"]):
@@ -396,7 +435,8 @@ def main():
                     llm=llm,
                     input_guard=input_guard,
                     output_guard=output_guard,
-                    history=st.session_state.messages[:-1]  # Exclude current message
+                    history=st.session_state.messages[:-1],  # Exclude current message
+                    metadata_filter=metadata_filter
                 )
             
             # Display the final answer prominently
@@ -0,0 +1,172 @@
+"""
+Adaptive candidate depth benchmark.
+Runs hybrid retrieval (ChromaDB + BM25, fused with RRF) over a synthetic chunk
+corpus with a fixed candidate depth and with adaptive depths, and reports the
+latency, the number of candidates fetched per query, the depths queries
+stopped at, and how often the fused top K differs from the fixed-depth one.
+
+The embeddings are random projections of the chunk's words, so dense and
+sparse rankings agree to a degree, as with a real embedding model (hash-random
+embeddings never agree, and adaptive depth then always ends at full depth).
+
+Usage:
+    python benchmarks/bench_adaptive.py                       # 2 MB synthetic corpus
+    python benchmarks/bench_adaptive.py --depths 5 10 25 --query-length 8
+    python benchmarks/bench_adaptive.py --synthetic-mb 5 --queries 500
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+from langchain_community.vectorstores import Chroma
+from langchain_core.embeddings import Embeddings
+
+from benchmarks.bench_sparse import sample_queries
+from benchmarks.corpus import synthetic_corpus
+from src.chunking import TextChunker
+from src.config import (
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    SEPARATORS,
+    DENSE_TOP_K,
+    SPARSE_TOP_K,
+    FINAL_TOP_K,
+    RRF_K,
+    ADAPTIVE_DEPTHS,
+    DISTANCE_METRIC
+)
+from src.retrieval import create_hybrid_retriever
+
+
+class WordProjectionEmbeddings(Embeddings):
+    """Sum of fixed pseudo-random vectors of the lower-cased words of a text, normalized."""
+
+    def __init__(self, dimension: int = 256):
+        self.dimension = dimension
+        self._word_vectors = {}
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in text.lower().split():
+            word = word.strip(".,")
+            if word not in self._word_vectors:
+                rng = np.random.default_rng(zlib.crc32(word.encode("utf-8")))
+                self._word_vectors[word] = rng.standard_normal(self.dimension).astype(np.float32)
+            vector += self._word_vectors[word]
+        vector /= np.linalg.norm(vector) or 1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def count_candidates(retriever, fetched: Counter) -> None:
+    """Wrap the retriever's registered searches to count the candidates they return."""
+    def counted(search):
+        def wrapper(queries, k=None, **kwargs):
+            results = search(queries, k, **kwargs)
+            for docs, _ in (results if isinstance(results, list) else [results]):
+                fetched["candidates"] += len(docs)
+            return results
+        return wrapper
+
+    retriever.retrievers = [
+        (name, counted(search), timeout, counted(search_many) if search_many else None, filterable)
+        for name, search, timeout, search_many, filterable in retriever.retrievers
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fixed vs. adaptive candidate depth in hybrid retrieval")
+    parser.add_argument("--synthetic-mb", type=float, default=2.0, help="Size of the synthetic corpus in MB")
+    parser.add_argument("--zipf-exponent", type=float, default=1.0, help="Skew of the corpus word frequencies")
+    parser.add_argument("--dimension", type=int, default=256, help="Embedding dimension")
+    parser.add_argument("--depths", type=int, nargs="+", default=list(ADAPTIVE_DEPTHS),
+                        help="Adaptive candidate depths, before the full DENSE_TOP_K / SPARSE_TOP_K")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("--query-length", type=int, default=4, help="Query length in words")
+    args = parser.parse_args()
+
+    chunker = TextChunker(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, separators=SEPARATORS)
+    chunks = [
+        chunk
+        for text in synthetic_corpus(args.synthetic_mb, zipf_exponent=args.zipf_exponent)
+        for chunk in chunker.split_text(text)
+    ]
+    ids = [f"chunk_{i}" for i in range(len(chunks))]
+    queries = sample_queries(chunks, args.queries, args.query_length, seed=0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        vectorstore = Chroma.from_texts(
+            chunks,
+            WordProjectionEmbeddings(args.dimension),
+            ids=ids,
+            persist_directory=tmp,
+            collection_metadata={"hnsw:space": DISTANCE_METRIC}
+        )
+        print(f"Index: {len(chunks)} chunks, built in {time.perf_counter() - start:.1f}s")
+
+        results = {}
+        print(f"{'depths':>16s}  {'mean ms':>8s}  {'p95 ms':>7s}  {'candidates/query':>16s}  {'stopped at':<30s}")
+        for label, depths in (("fixed", None), ("adaptive", args.depths)):
+            retriever = create_hybrid_retriever(
+                vectorstore,
+                dense_top_k=DENSE_TOP_K,
+                sparse_top_k=SPARSE_TOP_K,
+                final_top_k=FINAL_TOP_K,
+                rrf_k=RRF_K,
+                adaptive_depths=depths
+            )
+            fetched = Counter()
+            count_candidates(retriever, fetched)
+
+            # Record the depth each query stopped at
+            stopped = Counter()
+            settled = retriever._settled
+
+            def recording_settled(rankings, depth, allowed):
+                if settled(rankings, depth, allowed):
+                    stopped[depth] += 1
+                    return True
+                return False
+            retriever._settled = recording_settled
+
+            retriever.retrieve(queries[0])  # warm up
+            fetched.clear()
+            stopped.clear()
+            latencies, results[label] = [], []
+            for query in queries:
+                query_start = time.perf_counter()
+                results[label].append([doc.page_content for doc in retriever.retrieve(query)])
+                latencies.append(time.perf_counter() - query_start)
+            latencies = np.array(latencies)
+
+            stopped["full"] = len(queries) - sum(stopped.values())
+            name = "fixed" if depths is None else " ".join(str(depth) for depth in retriever.adaptive_depths) + " full"
+            print(f"{name:>16s}  {latencies.mean() * 1e3:8.2f}  {np.percentile(latencies, 95) * 1e3:7.2f}  "
+                  f"{fetched['candidates'] / len(queries):16.1f}  "
+                  + ", ".join(f"{depth}: {count}" for depth, count in stopped.items() if count))
+
+        differences = sum(1 for fixed, adaptive in zip(results["fixed"], results["adaptive"]) if fixed != adaptive)
+        print(f"Queries whose fused top {FINAL_TOP_K} differs from fixed depth: {differences}")
+
+
+if __name__ == "__main__":
+    main()
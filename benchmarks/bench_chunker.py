@@ -0,0 +1,79 @@
+"""
+Chunker benchmark.
+Compares the throughput of the project's TextChunker against LangChain's
+RecursiveCharacterTextSplitter and checks that both produce the same chunks.
+
+Usage:
+    python benchmarks/bench_chunker.py                      # synthetic corpus
+    python benchmarks/bench_chunker.py --documents          # bundled documents/ tree
+    python benchmarks/bench_chunker.py --synthetic-mb 50
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from benchmarks.corpus import synthetic_corpus
+from src.chunking import TextChunker
+from src.config import CHUNK_SIZE, CHUNK_OVERLAP, DOCUMENTS_DIR, SEPARATORS
+from src.loaders import load_files, scan_documents
+
+
+def time_splitter(split: Callable[[str], List[str]], texts: List[str], repeat: int) -> float:
+    """Return the best wall time over `repeat` runs of split over all texts."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            split(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the chunker against RecursiveCharacterTextSplitter")
+    parser.add_argument("--documents", action="store_true", help="Use the documents/ tree instead of a synthetic corpus")
+    parser.add_argument("--synthetic-mb", type=float, default=20.0, help="Size of the synthetic corpus in MB")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per splitter (best time is reported)")
+    args = parser.parse_args()
+
+    if args.documents:
+        files = scan_documents(DOCUMENTS_DIR)
+        texts = [doc.page_content for doc in load_files(list(files.values()))]
+    else:
+        texts = synthetic_corpus(args.synthetic_mb)
+
+    total_chars = sum(len(text) for text in texts)
+    print(f"Corpus: {len(texts)} texts, {total_chars / 1e6:.1f} M characters")
+
+    langchain_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        separators=SEPARATORS,
+        length_function=len,
+    )
+    chunker = TextChunker(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, separators=SEPARATORS)
+
+    mismatches = sum(1 for text in texts if langchain_splitter.split_text(text) != chunker.split_text(text))
+    print(f"Texts with differing output: {mismatches}")
+
+    results = {
+        "RecursiveCharacterTextSplitter": time_splitter(langchain_splitter.split_text, texts, args.repeat),
+        "TextChunker": time_splitter(chunker.split_text, texts, args.repeat),
+    }
+
+    for name, elapsed in results.items():
+        print(f"{name:32s} {elapsed:8.3f}s  {total_chars / elapsed / 1e6:8.2f} M chars/s")
+
+    speedup = results["RecursiveCharacterTextSplitter"] / results["TextChunker"]
+    print(f"Speedup: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
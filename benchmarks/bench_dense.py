@@ -0,0 +1,139 @@
+"""
+Dense retrieval benchmark.
+Compares querying ChromaDB with searching the in-process dense index (exact
+matrix-vector product, HNSW graph, and int8 / product-quantized codes with and
+without full-precision rescoring) on synthetic embeddings, and reports the
+memory per embedding and the recall of each search against exact float32 search.
+
+Usage:
+    python benchmarks/bench_dense.py                       # 20k x 768 embeddings
+    python benchmarks/bench_dense.py --vectors 200000 --dimension 384
+    python benchmarks/bench_dense.py --space cosine --skip-chroma
+    python benchmarks/bench_dense.py --quantization pq --pq-subvectors 48
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.config import (
+    DENSE_TOP_K,
+    DENSE_HNSW_M,
+    DENSE_HNSW_EF_CONSTRUCTION,
+    DENSE_HNSW_EF_SEARCH,
+    DENSE_PQ_SUBVECTORS,
+    DENSE_RESCORE_FACTOR
+)
+from src.dense_index import DenseIndex
+
+
+def synthetic_embeddings(count: int, dimension: int, seed: int = 0, clusters: int = 200) -> np.ndarray:
+    """Embeddings drawn around random topic centres (closer to real chunk embeddings than pure noise)."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dimension)).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, size=count)]
+    return vectors + 0.5 * rng.normal(size=(count, dimension)).astype(np.float32)
+
+
+def time_search(search: Callable[[np.ndarray], np.ndarray], queries: np.ndarray) -> Tuple[np.ndarray, List]:
+    """Return per-query latencies (seconds) and the row numbers found for every query."""
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(search(query))
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies), results
+
+
+def recall(expected: List, actual: List) -> float:
+    """Mean fraction of the exact top-k rows that a search returned."""
+    return float(np.mean([len(set(a) & set(b)) / max(len(a), 1) for a, b in zip(expected, actual)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ChromaDB vs. in-process dense search")
+    parser.add_argument("--vectors", type=int, default=20_000, help="Number of embeddings")
+    parser.add_argument("--dimension", type=int, default=768, help="Embedding dimension")
+    parser.add_argument("--space", choices=["l2", "cosine", "ip"], default="l2", help="Distance function")
+    parser.add_argument("--top-k", type=int, default=DENSE_TOP_K, help="Neighbours retrieved per query")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("--skip-chroma", action="store_true", help="Do not time ChromaDB")
+    parser.add_argument("--quantization", choices=["int8", "pq"], nargs="*", default=["int8", "pq"],
+                        help="Quantized storage formats to compare")
+    parser.add_argument("--pq-subvectors", type=int, default=DENSE_PQ_SUBVECTORS, help="Bytes per embedding with pq")
+    parser.add_argument("--rescore-factor", type=int, default=DENSE_RESCORE_FACTOR or 4,
+                        help="Full-precision rescoring depth, in multiples of top-k")
+    args = parser.parse_args()
+
+    vectors = synthetic_embeddings(args.vectors, args.dimension)
+    # Questions land near the chunks that answer them
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(0, args.vectors, size=args.queries)]
+    queries = queries + 0.5 * rng.normal(size=queries.shape).astype(np.float32)
+    rows = [(np.arange(args.vectors), vectors)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        exact = DenseIndex.build(Path(tmp) / "exact", rows, args.vectors, args.dimension, space=args.space,
+                                 hnsw_threshold=args.vectors + 1)
+        start = time.perf_counter()
+        graph = DenseIndex.build(Path(tmp) / "hnsw", rows, args.vectors, args.dimension, space=args.space,
+                                 hnsw_threshold=0, hnsw_m=DENSE_HNSW_M,
+                                 hnsw_ef_construction=DENSE_HNSW_EF_CONSTRUCTION, ef_search=DENSE_HNSW_EF_SEARCH)
+        print(f"Index: {args.vectors} x {args.dimension} ({args.space}), HNSW built in {time.perf_counter() - start:.1f}s")
+
+        backends = {
+            "exact": (exact, 0),
+            "hnsw": (graph, 0),
+        }
+        for quantization in args.quantization:
+            start = time.perf_counter()
+            index = DenseIndex.build(Path(tmp) / quantization, rows, args.vectors, args.dimension, space=args.space,
+                                     quantization=quantization, pq_subvectors=args.pq_subvectors,
+                                     rescore_factor=args.rescore_factor, recall_k=args.top_k)
+            print(f"{quantization} codes built in {time.perf_counter() - start:.1f}s")
+            backends[quantization] = (index, 0)
+            backends[f"{quantization}+rs"] = (index, args.rescore_factor)
+
+        if not args.skip_chroma:
+            os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+            import chromadb
+
+            collection = chromadb.Client().create_collection("bench_dense", metadata={"hnsw:space": args.space})
+            ids = [str(i) for i in range(args.vectors)]
+            for first in range(0, args.vectors, 5000):
+                collection.add(ids=ids[first:first + 5000], embeddings=vectors[first:first + 5000].tolist())
+            backends["chroma"] = (collection, 0)
+
+        print(f"{'backend':>8s}  {'bytes/emb':>9s}  {'GB/1M':>6s}  {'mean ms':>8s}  {'p95 ms':>8s}  "
+              f"{'recall@' + str(args.top_k):>10s}")
+        expected = None
+        for name, (index, rescore_factor) in backends.items():
+            if name == "chroma":
+                search = lambda query: np.array(
+                    index.query(query_embeddings=[query.tolist()], n_results=args.top_k, include=[])["ids"][0],
+                    dtype=np.int64
+                )
+                bytes_per_row = exact.bytes_per_row
+            else:
+                index.rescore_factor = rescore_factor
+                search = lambda query: index.search(query, args.top_k)[0]
+                bytes_per_row = index.bytes_per_row
+
+            search(queries[0])  # warm up
+            latencies, results = time_search(search, queries)
+            if expected is None:  # exact search comes first
+                expected = results
+            print(f"{name:>8s}  {bytes_per_row:9d}  {bytes_per_row / 1e3:6.2f}  {latencies.mean() * 1e3:8.2f}  "
+                  f"{np.percentile(latencies, 95) * 1e3:8.2f}  {recall(expected, results):10.3f}")
+
+
+if __name__ == "__main__":
+    main()
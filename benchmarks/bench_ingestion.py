@@ -0,0 +1,200 @@
+"""
+Ingestion benchmark.
+Runs the indexing pipeline stage by stage (load, chunk, embed, store) and
+records wall time, throughput and peak memory for each stage as JSON.
+Embeddings come from a deterministic local stand-in, so no Ollama server is
+needed and runs are reproducible.
+
+Usage:
+    python benchmarks/bench_ingestion.py                           # bundled documents/ tree
+    python benchmarks/bench_ingestion.py --synthetic-files 500 --synthetic-kb 20
+    python benchmarks/bench_ingestion.py --output results/run.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+os.environ["ANONYMIZED_TELEMETRY"] = "False"
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks.corpus import write_synthetic_documents
+from src.config import CHUNK_SIZE, CHUNK_OVERLAP, DOCUMENTS_DIR
+from src.embedding import DeterministicEmbeddings
+from src.ingestion import DocumentIndexer
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far, in MB (None if unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def run_stage(name: str, func: Callable[[], Any], count: Callable[[Any], int], unit: str,
+              trace_memory: bool) -> Tuple[Any, Dict]:
+    """
+    Run one pipeline stage and measure it.
+
+    Args:
+        name: Stage name
+        func: Stage to run
+        count: Returns the number of items processed from the stage's result
+        unit: Unit of the items (for the throughput figure)
+        trace_memory: Record the Python heap peak with tracemalloc
+
+    Returns:
+        Tuple of (stage result, stage measurements)
+    """
+    if trace_memory:
+        tracemalloc.reset_peak()
+
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+
+    items = count(result)
+    stats = {
+        "wall_s": round(elapsed, 4),
+        "items": items,
+        "unit": unit,
+        "throughput_per_s": round(items / elapsed, 2) if elapsed > 0 else None,
+        "peak_python_mb": round(tracemalloc.get_traced_memory()[1] / 1e6, 2) if trace_memory else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    print(f"{name:6s} {elapsed:9.3f}s  {items:8d} {unit:6s}  {stats['throughput_per_s'] or 0:10.1f} {unit}/s")
+    return result, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ingestion pipeline stage by stage")
+    parser.add_argument("--documents-dir", type=Path, default=DOCUMENTS_DIR, help="Documents to index")
+    parser.add_argument("--synthetic-files", type=int, default=0,
+                        help="Index a synthetic corpus of this many files instead of --documents-dir")
+    parser.add_argument("--synthetic-kb", type=float, default=20.0, help="Size of each synthetic file in KB")
+    parser.add_argument("--embedding-dim", type=int, default=768, help="Dimension of the stand-in embeddings")
+    parser.add_argument("--workers", type=int, default=None, help="Loader worker processes (default: CPU count)")
+    parser.add_argument("--no-dedup", action="store_true", help="Disable near-duplicate chunk elimination")
+    parser.add_argument("--no-tracemalloc", action="store_true",
+                        help="Skip Python heap tracking (lower overhead, no peak_python_mb)")
+    parser.add_argument("--output", type=Path, default=None, help="Result file (default: benchmarks/results/)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+
+        if args.synthetic_files:
+            documents_dir = tmp_dir / "documents"
+            write_synthetic_documents(documents_dir, args.synthetic_files, args.synthetic_kb)
+            corpus = {"type": "synthetic", "files": args.synthetic_files, "file_kb": args.synthetic_kb}
+        else:
+            documents_dir = args.documents_dir
+            corpus = {"type": "directory", "path": str(documents_dir)}
+
+        # Caches are disabled so every run does the full amount of work
+        indexer = DocumentIndexer(
+            documents_dir=documents_dir,
+            persist_dir=tmp_dir / "chroma_db",
+            manifest_path=tmp_dir / "index_manifest.json",
+            loader_workers=args.workers,
+            use_embedding_cache=False,
+            use_pdf_cache=False,
+            deduplicate=not args.no_dedup,
+            embeddings=DeterministicEmbeddings(dimension=args.embedding_dim)
+        )
+
+        trace_memory = not args.no_tracemalloc
+        if trace_memory:
+            tracemalloc.start()
+
+        stages = {}
+        total_start = time.perf_counter()
+
+        documents, stages["load"] = run_stage(
+            "load", indexer.load_documents, len, "docs", trace_memory
+        )
+        corpus["documents"] = len(documents)
+        corpus["characters"] = sum(len(doc.page_content) for doc in documents)
+
+        def chunk():
+            indexer._reset_deduplicator()
+            return indexer.deduplicate_chunks(indexer.chunk_documents(documents))
+
+        chunks, stages["chunk"] = run_stage("chunk", chunk, len, "chunks", trace_memory)
+        del documents
+
+        texts = [chunk.page_content for chunk in chunks]
+        vectors, stages["embed"] = run_stage(
+            "embed", lambda: indexer.embeddings.embed_documents(texts), len, "chunks", trace_memory
+        )
+
+        def store():
+            ids, _ = indexer._assign_chunk_ids(chunks)
+            vectorstore = indexer._open_vectorstore()
+            batch_size = indexer.write_batch_size
+            for i in range(0, len(chunks), batch_size):
+                vectorstore._collection.upsert(
+                    ids=ids[i:i + batch_size],
+                    embeddings=vectors[i:i + batch_size],
+                    documents=texts[i:i + batch_size],
+                    metadatas=[chunk.metadata for chunk in chunks[i:i + batch_size]]
+                )
+            return vectorstore._collection.count()
+
+        _, stages["store"] = run_stage("store", store, lambda n: n, "chunks", trace_memory)
+
+        total = time.perf_counter() - total_start
+        if trace_memory:
+            tracemalloc.stop()
+
+    print(f"total  {total:9.3f}s")
+
+    result = {
+        "benchmark": "ingestion",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {
+            "chunk_size": CHUNK_SIZE,
+            "chunk_overlap": CHUNK_OVERLAP,
+            "embedding_dim": args.embedding_dim,
+            "loader_workers": args.workers,
+            "write_batch_size": indexer.write_batch_size,
+            "dedup": not args.no_dedup,
+            "tracemalloc": trace_memory,
+        },
+        "corpus": corpus,
+        "stages": stages,
+        "total_wall_s": round(total, 4),
+    }
+
+    output = args.output or RESULTS_DIR / f"ingestion_{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to: {output}")
+
+
+if __name__ == "__main__":
+    main()
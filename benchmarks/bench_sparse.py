@@ -0,0 +1,117 @@
+"""
+Sparse retrieval benchmark.
+Compares exhaustive BM25 top-k scoring with dynamic pruning (and optionally
+with scoring split over worker processes) on a synthetic chunk corpus, for
+queries of increasing length, and checks that all return the same documents
+with the same scores.
+
+Usage:
+    python benchmarks/bench_sparse.py                       # 20 MB synthetic corpus
+    python benchmarks/bench_sparse.py --synthetic-mb 100 --top-k 50
+    python benchmarks/bench_sparse.py --query-lengths 4 16 64
+    python benchmarks/bench_sparse.py --shards 4            # also time 4 worker processes
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks.corpus import synthetic_corpus
+from src.chunking import TextChunker
+from src.config import CHUNK_SIZE, CHUNK_OVERLAP, SEPARATORS, SPARSE_TOP_K
+from src.sparse_index import SparseIndex
+from src.sparse_shards import ShardedSparseSearcher
+
+
+def sample_queries(chunks: List[str], count: int, length: int, seed: int) -> List[str]:
+    """Draw queries of `length` words from random chunks, so every query has matches."""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        words = rng.choice(chunks).split()
+        queries.append(" ".join(rng.sample(words, min(length, len(words)))))
+    return queries
+
+
+def time_queries(searcher, queries: List[str], k: int, prune: bool) -> Tuple[np.ndarray, List]:
+    """Return per-query latencies (seconds) and results of top_k over all queries."""
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(searcher.top_k(query, k, prune=prune))
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark exhaustive vs. pruned BM25 top-k retrieval")
+    parser.add_argument("--synthetic-mb", type=float, default=20.0, help="Size of the synthetic corpus in MB")
+    parser.add_argument("--zipf-exponent", type=float, default=1.0, help="Skew of the corpus word frequencies")
+    parser.add_argument("--top-k", type=int, default=SPARSE_TOP_K, help="Documents retrieved per query")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per query length")
+    parser.add_argument("--query-lengths", type=int, nargs="+", default=[2, 4, 8, 16, 32],
+                        help="Query lengths in words")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="Also time pruned scoring split over this many worker processes")
+    args = parser.parse_args()
+
+    chunker = TextChunker(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, separators=SEPARATORS)
+    chunks = [
+        chunk
+        for text in synthetic_corpus(args.synthetic_mb, zipf_exponent=args.zipf_exponent)
+        for chunk in chunker.split_text(text)
+    ]
+
+    start = time.perf_counter()
+    index = SparseIndex.build(chunks)
+    print(f"Index: {index.num_docs} chunks, {index.num_terms} terms, built in {time.perf_counter() - start:.1f}s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sharded = None
+        if args.shards > 1:
+            # Workers open the index from disk, as in the app
+            index_dir = Path(tmp)
+            index.save(index_dir)
+            index = SparseIndex.load(index_dir)
+            sharded = ShardedSparseSearcher(index, index_dir, args.shards)
+            sharded.top_k("warm up", args.top_k)
+
+        header = f"{'words':>5s}  {'exhaustive ms':>13s}  {'pruned ms':>9s}  {'p95 exh.':>8s}  {'p95 pr.':>8s}  {'speedup':>7s}"
+        if sharded:
+            header += f"  {'sharded ms':>10s}"
+        print(header + f"  {'mismatches':>10s}")
+
+        for length in args.query_lengths:
+            queries = sample_queries(chunks, args.queries, length, seed=length)
+            exhaustive, expected = time_queries(index, queries, args.top_k, prune=False)
+            pruned, actual = time_queries(index, queries, args.top_k, prune=True)
+            if sharded:
+                parallel, parallel_results = time_queries(sharded, queries, args.top_k, prune=True)
+                actual = actual + parallel_results
+                expected = expected + expected
+
+            mismatches = sum(
+                1 for (docs_a, scores_a), (docs_b, scores_b) in zip(expected, actual)
+                if not (np.array_equal(docs_a, docs_b) and np.array_equal(scores_a, scores_b))
+            )
+            line = (f"{length:5d}  {exhaustive.mean() * 1e3:13.2f}  {pruned.mean() * 1e3:9.2f}  "
+                    f"{np.percentile(exhaustive, 95) * 1e3:8.2f}  {np.percentile(pruned, 95) * 1e3:8.2f}  "
+                    f"{exhaustive.sum() / pruned.sum():6.2f}x")
+            if sharded:
+                line += f"  {parallel.mean() * 1e3:10.2f}"
+            print(line + f"  {mismatches:10d}")
+
+        if sharded:
+            sharded.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Synthetic corpora for benchmarks.
+"""
+
+import itertools
+import random
+from pathlib import Path
+from typing import List, Optional
+
+
+def synthetic_corpus(size_mb: float, seed: int = 0, zipf_exponent: float = 0.0) -> List[str]:
+    """
+    Generate book-like texts (paragraphs of sentences) totalling roughly size_mb.
+
+    Args:
+        size_mb: Approximate corpus size in megabytes
+        seed: Random seed
+        zipf_exponent: Word frequencies follow a Zipf law with this exponent
+            (0 draws words uniformly; natural language is close to 1)
+
+    Returns:
+        List of texts
+    """
+    rng = random.Random(seed)
+    vocabulary = [
+        "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 10)))
+        for _ in range(5000)
+    ]
+    cum_weights: Optional[List[float]] = None
+    if zipf_exponent:
+        cum_weights = list(itertools.accumulate(1 / rank ** zipf_exponent for rank in range(1, len(vocabulary) + 1)))
+
+    texts = []
+    target = int(size_mb * 1_000_000)
+    produced = 0
+    while produced < target:
+        paragraphs = []
+        for _ in range(200):
+            sentences = [
+                " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(5, 25))).capitalize() + "."
+                for _ in range(rng.randint(2, 8))
+            ]
+            paragraphs.append(" ".join(sentences))
+        text = "\n\n".join(paragraphs)
+        texts.append(text)
+        produced += len(text)
+    return texts
+
+
+def write_synthetic_documents(target_dir: Path, num_files: int, file_kb: float, seed: int = 0) -> List[Path]:
+    """
+    Write a synthetic corpus of Markdown files.
+
+    Args:
+        target_dir: Directory to write the files to
+        num_files: Number of files
+        file_kb: Approximate size of each file in kilobytes
+        seed: Random seed
+
+    Returns:
+        Paths of the written files
+    """
+    target_dir.mkdir(parents=True, exist_ok=True)
+    text = "\n\n".join(synthetic_corpus(num_files * file_kb / 1000, seed=seed))
+    file_chars = int(file_kb * 1000)
+
+    paths = []
+    for i in range(num_files):
+        # Slice a different window of the text per file so files are not duplicates
+        start = (i * file_chars) % max(1, len(text) - file_chars)
+        path = target_dir / f"synthetic_{i:05d}.md"
+        path.write_text(text[start:start + file_chars], encoding="utf-8")
+        paths.append(path)
+    return paths
@@ -0,0 +1,143 @@
+"""
+Text analysis for the sparse (BM25) retriever.
+Turns text into normalized terms: Unicode normalization, case folding,
+punctuation stripping, optional stopword removal and optional stemming.
+The same analyzer must be used for indexing and querying, so its settings
+are stored with the index.
+"""
+
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+from src.config import BM25_STEMMER, BM25_REMOVE_STOPWORDS, BM25_STRIP_ACCENTS
+
+# Lucene's default English stopword set
+ENGLISH_STOPWORDS = frozenset([
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "if", "in",
+    "into", "is", "it", "no", "not", "of", "on", "or", "such", "that", "the",
+    "their", "then", "there", "these", "they", "this", "to", "was", "will", "with",
+])
+
+# Runs of letters and digits; everything else (punctuation, underscores, symbols) separates terms
+_TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+# Possessive suffix ("Bytaid's" -> "Bytaid")
+_POSSESSIVE_PATTERN = re.compile(r"(?<=\w)['’]s\b")
+
+
+def minimal_stem(term: str) -> str:
+    """
+    Strip English plural endings (the rules of Lucene's EnglishMinimalStemmer).
+    "policies" -> "policy", "clients" -> "client"; "status" and "class" are kept.
+
+    Args:
+        term: Lowercased term
+
+    Returns:
+        Stemmed term
+    """
+    if len(term) < 3 or term[-1] != "s":
+        return term
+
+    second_last = term[-2]
+    if second_last in ("u", "s"):
+        return term
+    if second_last == "e":
+        if len(term) > 3 and term[-3] == "i" and term[-4] not in ("a", "e"):
+            return term[:-3] + "y"
+        if term[-3] in ("i", "a", "o", "e"):
+            return term
+    return term[:-1]
+
+
+STEMMERS = {
+    "minimal": minimal_stem,
+}
+
+
+class Analyzer:
+    """
+    Configurable analyzer producing BM25 terms from text.
+    """
+
+    def __init__(
+        self,
+        stemmer: Optional[str] = BM25_STEMMER,
+        remove_stopwords: bool = BM25_REMOVE_STOPWORDS,
+        strip_accents: bool = BM25_STRIP_ACCENTS
+    ):
+        """
+        Initialize the analyzer.
+
+        Args:
+            stemmer: Name of the stemmer to apply (None or "minimal")
+            remove_stopwords: Drop common English function words
+            strip_accents: Remove diacritics after normalization ("café" -> "cafe")
+        """
+        if stemmer is not None and stemmer not in STEMMERS:
+            raise ValueError(f"Unknown stemmer '{stemmer}' (available: {', '.join(STEMMERS)})")
+
+        self.stemmer = stemmer
+        self.remove_stopwords = remove_stopwords
+        self.strip_accents = strip_accents
+
+        self._stem = STEMMERS[stemmer] if stemmer else None
+        self._stopwords = ENGLISH_STOPWORDS if remove_stopwords else frozenset()
+
+    def normalize(self, text: str) -> str:
+        """
+        Apply Unicode normalization and case folding.
+
+        Args:
+            text: Raw text
+
+        Returns:
+            Normalized text
+        """
+        text = unicodedata.normalize("NFKC", text).casefold()
+        if self.strip_accents:
+            text = "".join(
+                char for char in unicodedata.normalize("NFKD", text)
+                if not unicodedata.combining(char)
+            )
+        return text
+
+    def analyze(self, text: str) -> List[str]:
+        """
+        Turn text into terms.
+
+        Args:
+            text: Text to analyze
+
+        Returns:
+            List of terms, in order (repeated terms are repeated)
+        """
+        text = _POSSESSIVE_PATTERN.sub("", self.normalize(text))
+        terms = _TOKEN_PATTERN.findall(text)
+
+        if self._stopwords:
+            terms = [term for term in terms if term not in self._stopwords]
+        if self._stem:
+            stem = self._stem
+            terms = [stem(term) for term in terms]
+        return terms
+
+    __call__ = analyze
+
+    def to_config(self) -> Dict[str, Any]:
+        """Settings needed to recreate this analyzer (stored with the index)."""
+        return {
+            "stemmer": self.stemmer,
+            "remove_stopwords": self.remove_stopwords,
+            "strip_accents": self.strip_accents,
+        }
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "Analyzer":
+        """Recreate an analyzer from `to_config` output."""
+        return cls(
+            stemmer=config.get("stemmer"),
+            remove_stopwords=config.get("remove_stopwords", False),
+            strip_accents=config.get("strip_accents", False)
+        )
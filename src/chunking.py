@@ -0,0 +1,175 @@
+"""
+Text chunking for the indexing pipeline.
+A recursive character splitter with the same output as LangChain's
+RecursiveCharacterTextSplitter (keep_separator=True, strip_whitespace=True,
+length measured in characters) that works on character offsets instead of
+substrings and records where each chunk sits in its source text.
+"""
+
+from typing import Iterable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+Span = Tuple[int, int]
+
+
+class TextChunker:
+    """
+    Splits text into overlapping chunks, trying each separator in turn.
+
+    Pieces of the text are tracked as (start, end) offsets into the original
+    string, so pieces are never re-joined and dropping the front of a chunk
+    for the overlap is a pointer move rather than a list copy. Each character
+    is visited at most once per separator level, which keeps the cost linear
+    in the text length. Chunks are only materialized at the end.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        separators: Optional[List[str]] = None
+    ):
+        """
+        Initialize the chunker.
+
+        Args:
+            chunk_size: Maximum chunk length in characters
+            chunk_overlap: Maximum overlap between consecutive chunks in characters
+            separators: Separators to split on, from coarsest to finest
+        """
+        if chunk_overlap > chunk_size:
+            raise ValueError(
+                f"Chunk overlap ({chunk_overlap}) is larger than chunk size ({chunk_size})"
+            )
+
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = separators or ["\n\n", "\n", " ", ""]
+
+    def _split_on(self, text: str, start: int, end: int, separator: str) -> List[Span]:
+        """Split a span before every occurrence of separator (separator kept with the next piece)."""
+        if separator == "":
+            return [(i, i + 1) for i in range(start, end)]
+
+        # str.split finds the separators in C; only the piece lengths are used
+        parts = text[start:end].split(separator)
+        sep_len = len(separator)
+
+        spans = []
+        position = start + len(parts[0])
+        if position > start:
+            spans.append((start, position))
+        for part in parts[1:]:
+            piece_end = position + sep_len + len(part)
+            spans.append((position, piece_end))
+            position = piece_end
+        return spans
+
+    def _strip(self, text: str, start: int, end: int) -> Optional[Span]:
+        """Trim whitespace from both ends of a span; None if nothing is left."""
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return (start, end) if start < end else None
+
+    def _merge(self, text: str, splits: List[Span], output: List[Span]) -> None:
+        """Merge consecutive small pieces into chunks of at most chunk_size characters."""
+        # splits are contiguous, so a run of pieces is text[first_start:last_end]
+        first = 0
+        total = 0
+        for i, (start, end) in enumerate(splits):
+            length = end - start
+            if total + length > self.chunk_size and i > first:
+                chunk = self._strip(text, splits[first][0], splits[i - 1][1])
+                if chunk is not None:
+                    output.append(chunk)
+                # Drop pieces from the front until the remainder fits the overlap
+                while i > first and (
+                    total > self.chunk_overlap or total + length > self.chunk_size
+                ):
+                    total -= splits[first][1] - splits[first][0]
+                    first += 1
+            total += length
+
+        if first < len(splits):
+            chunk = self._strip(text, splits[first][0], splits[-1][1])
+            if chunk is not None:
+                output.append(chunk)
+
+    def _split(self, text: str, start: int, end: int, separators: List[str], output: List[Span]) -> None:
+        """Recursively split a span, appending chunk spans to output."""
+        separator = separators[-1]
+        remaining = []
+        for i, candidate in enumerate(separators):
+            if candidate == "":
+                separator = candidate
+                break
+            if text.find(candidate, start, end) != -1:
+                separator = candidate
+                remaining = separators[i + 1:]
+                break
+
+        good_splits = []
+        for span in self._split_on(text, start, end, separator):
+            if span[1] - span[0] < self.chunk_size:
+                good_splits.append(span)
+                continue
+
+            if good_splits:
+                self._merge(text, good_splits, output)
+                good_splits = []
+            if remaining:
+                self._split(text, span[0], span[1], remaining, output)
+            else:
+                output.append(span)
+
+        if good_splits:
+            self._merge(text, good_splits, output)
+
+    def split_spans(self, text: str) -> List[Span]:
+        """
+        Split text into chunks.
+
+        Args:
+            text: Text to split
+
+        Returns:
+            List of (start, end) character offsets of each chunk in text
+        """
+        output = []
+        self._split(text, 0, len(text), self.separators, output)
+        return output
+
+    def split_text(self, text: str) -> List[str]:
+        """
+        Split text into chunks.
+
+        Args:
+            text: Text to split
+
+        Returns:
+            List of chunk strings
+        """
+        return [text[start:end] for start, end in self.split_spans(text)]
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        """
+        Split documents into chunks, recording character offsets in chunk metadata.
+
+        Args:
+            documents: Documents to split
+
+        Returns:
+            List of chunk Documents with `start_index` and `end_index` metadata
+        """
+        chunks = []
+        for doc in documents:
+            text = doc.page_content
+            for start, end in self.split_spans(text):
+                metadata = dict(doc.metadata)
+                metadata["start_index"] = start
+                metadata["end_index"] = end
+                chunks.append(Document(page_content=text[start:end], metadata=metadata))
+        return chunks
@@ -13,6 +13,11 @@ PROJECT_ROOT = Path(__file__).parent.parent
 DOCUMENTS_DIR = PROJECT_ROOT / "documents"
 DATA_DIR = PROJECT_ROOT / "data"
 CHROMA_PERSIST_DIR = DATA_DIR / "chroma_db"
+INDEX_MANIFEST_PATH = DATA_DIR / "index_manifest.json"
+EMBEDDING_CACHE_PATH = DATA_DIR / "embedding_cache.sqlite3"
+PDF_CACHE_DIR = DATA_DIR / "pdf_cache"
+SPARSE_INDEX_DIR = DATA_DIR / "sparse_index"
+DENSE_INDEX_DIR = DATA_DIR / "dense_index"
 
 # ============================================================================
 # MODEL CONFIGURATIONS
@@ -23,6 +28,44 @@ OLLAMA_BASE_URL = "http://localhost:11434"
 EMBEDDING_MODEL = "nomic-embed-text"
 LLM_MODEL = "llama3"
 
+# ============================================================================
+# DOCUMENT LOADING
+# ============================================================================
+
+# Worker processes used to parse documents (None = one per CPU core)
+LOADER_MAX_WORKERS = None
+
+# PDF pages are extracted in ranges of this many pages per worker task
+PDF_PAGES_PER_TASK = 16
+
+# Cache extracted PDF page text, keyed by file hash and parser version
+ENABLE_PDF_CACHE = True
+
+# ============================================================================
+# EMBEDDING PARAMETERS
+# ============================================================================
+
+# Number of chunks sent to an embedding worker at a time
+EMBEDDING_BATCH_SIZE = 32
+
+# Maximum number of embedding batches in flight against the Ollama server
+EMBEDDING_MAX_CONCURRENCY = 4
+
+# Number of chunks embedded and written to ChromaDB per write
+CHROMA_WRITE_BATCH_SIZE = 256
+
+# Streaming ingestion: items buffered between pipeline stages
+PIPELINE_QUEUE_SIZE = 4
+
+# Persistent cache of chunk embeddings keyed by (model, chunk text hash)
+ENABLE_EMBEDDING_CACHE = True
+EMBEDDING_CACHE_MAX_MB = 1024
+
+# In-memory cache of query embeddings at question time, keyed by (model,
+# normalized query); entries expire after the TTL in seconds (None = never)
+QUERY_EMBEDDING_CACHE_SIZE = 1024  # 0 disables the cache
+QUERY_EMBEDDING_CACHE_TTL = 3600
+
 # ============================================================================
 # CHUNKING PARAMETERS
 # ============================================================================
@@ -34,6 +77,12 @@ CHUNK_OVERLAP = 200
 # Separators for Recursive Character Text Splitter
 SEPARATORS = ["\n\n", "\n", ". ", " ", ""]
 
+# Collapse exact and near-duplicate chunks (MinHash + LSH) before embedding
+ENABLE_CHUNK_DEDUP = True
+DEDUP_SIMILARITY_THRESHOLD = 0.9  # Estimated Jaccard similarity of word shingles
+DEDUP_NUM_PERM = 64
+DEDUP_BANDS = 16
+
 # ============================================================================
 # RETRIEVAL PARAMETERS
 # ============================================================================
@@ -48,6 +97,69 @@ FINAL_TOP_K = 5
 # Reciprocal Rank Fusion constant (typically 60)
 RRF_K = 60
 
+# Adaptive candidate depth: fetch ADAPTIVE_DEPTHS dense candidates first and
+# deepen (up to DENSE_TOP_K) only while more candidates could still change the
+# fused top FINAL_TOP_K; sparse search is exact and fetches SPARSE_TOP_K once.
+# Results match the full depth when dense search is exact (the unquantized
+# in-process index below DENSE_HNSW_THRESHOLD chunks); with an approximate backend
+# (ChromaDB's HNSW, the in-process HNSW graph or a quantized index) a shallower
+# search can miss neighbours a deeper one finds, so results are approximate.
+# Each extra step is another dense search: it only pays off when dense and
+# sparse usually agree on the top results (see benchmarks/bench_adaptive.py)
+ADAPTIVE_DEPTH = False
+ADAPTIVE_DEPTHS = (25,)
+
+# BM25 text analysis (changing these requires re-running ingestion)
+BM25_STEMMER = "minimal"  # None or "minimal" (English plural stripping)
+BM25_REMOVE_STOPWORDS = True
+BM25_STRIP_ACCENTS = True
+
+# Sparse index segments: merge this many similarly sized segments at a time, and
+# rewrite a segment once more than this fraction of its chunks has been deleted
+SPARSE_MERGE_FACTOR = 10
+SPARSE_MAX_DELETED_RATIO = 0.3
+
+# Skip BM25 candidates that provably cannot reach SPARSE_TOP_K (same results, less work)
+SPARSE_DYNAMIC_PRUNING = True
+
+# Score the persisted sparse index in this many worker processes, each over a
+# shard of the chunks (1 = score in the app process; up to one per CPU core)
+SPARSE_NUM_SHARDS = 1
+
+# Dense and sparse retrieval run concurrently, each with its own deadline in
+# seconds; a retriever that misses it is left out of that query's fusion
+# (None = wait indefinitely)
+DENSE_TIMEOUT = 10.0
+SPARSE_TIMEOUT = 5.0
+
+# Client timeout in seconds of each query embedding request to Ollama, so a hung
+# request frees its dense retrieval worker (None = wait indefinitely)
+QUERY_EMBEDDING_TIMEOUT = 10.0
+
+# Dense search backend: "chroma" queries the vector store, "in_process" searches a
+# memory-mapped copy of the embeddings written at ingestion time (ChromaDB stays
+# the system of record; falls back to it while the copy is missing or stale)
+DENSE_BACKEND = "chroma"
+
+# In-process dense index: exact search (one matrix-vector product) below this many
+# chunks, an HNSW graph from it on (changing these requires re-running ingestion)
+DENSE_HNSW_THRESHOLD = 50_000
+DENSE_HNSW_M = 16
+DENSE_HNSW_EF_CONSTRUCTION = 200
+
+# HNSW candidate list size at query time (raised to DENSE_TOP_K when smaller)
+DENSE_HNSW_EF_SEARCH = 128
+
+# Store the in-process dense index quantized: None (float32), "int8" (4x smaller)
+# or "pq" (product quantization, DENSE_PQ_SUBVECTORS bytes per chunk). Quantized
+# indexes are scanned without an HNSW graph (changing these requires re-running ingestion)
+DENSE_QUANTIZATION = None
+DENSE_PQ_SUBVECTORS = 96  # must divide the embedding dimension (768 for nomic-embed-text)
+
+# Re-rank this many times DENSE_TOP_K quantized candidates with the full-precision
+# embeddings (0 = no re-ranking, and the float32 copy is not kept on disk)
+DENSE_RESCORE_FACTOR = 4
+
 # ============================================================================
 # LLM GENERATION PARAMETERS
 # ============================================================================
@@ -0,0 +1,236 @@
+"""
+Near-duplicate chunk elimination for the indexing pipeline.
+Collapses exact and near-duplicate chunks (MinHash + LSH) into a single
+stored chunk whose metadata lists the sources of the dropped copies.
+"""
+
+import hashlib
+import logging
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Modulus of the MinHash permutations (Mersenne prime 2^61 - 1)
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+
+
+class ChunkDeduplicator:
+    """
+    Detects exact and near-duplicate chunks.
+    Exact duplicates are found by hashing whitespace/case-normalized text;
+    near duplicates by MinHash signatures over word shingles, bucketed with
+    locality-sensitive hashing and confirmed against a Jaccard threshold.
+
+    The first occurrence of a chunk is kept. State is kept across calls to
+    `deduplicate`, so chunks are also compared against earlier batches, and
+    against chunks registered with `seed` (e.g. already stored ones).
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        num_perm: int = 64,
+        bands: int = 16,
+        shingle_size: int = 3,
+        seed: int = 1
+    ):
+        """
+        Initialize the deduplicator.
+
+        Args:
+            threshold: Estimated Jaccard similarity above which two chunks are duplicates
+            num_perm: Number of MinHash permutations per signature
+            bands: Number of LSH bands (must divide num_perm)
+            shingle_size: Number of words per shingle
+            seed: Seed for the MinHash permutations
+        """
+        if num_perm % bands != 0:
+            raise ValueError("num_perm must be a multiple of bands")
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        # Keep a * x + b below 2^62 so it cannot overflow uint64 (x < 2^32)
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 29, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 29, size=num_perm, dtype=np.uint64)
+
+        self._exact: Dict[bytes, int] = {}
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._signatures: List[np.ndarray] = []
+        self._kept: List[Any] = []
+        self._merged_sources: List[List[str]] = []
+        self._seeded: Set[int] = set()
+        self._updated: Set[int] = set()
+
+        self.chunks_seen = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        self.bytes_saved = 0
+
+    def _shingle_hashes(self, normalized: str) -> np.ndarray:
+        """Hash the word shingles of normalized text to 32-bit integers."""
+        words = normalized.split(" ")
+        if len(words) <= self.shingle_size:
+            shingles = {normalized}
+        else:
+            shingles = {
+                " ".join(words[i:i + self.shingle_size])
+                for i in range(len(words) - self.shingle_size + 1)
+            }
+        return np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+            dtype=np.uint64,
+            count=len(shingles)
+        )
+
+    def _signature(self, normalized: str) -> np.ndarray:
+        """Compute the MinHash signature of normalized text."""
+        hashes = self._shingle_hashes(normalized)
+        permuted = (hashes[:, None] * self._a + self._b) % _MERSENNE_PRIME
+        return permuted.min(axis=0)
+
+    def _merge(self, kept_index: int, duplicate: Any) -> None:
+        """Record a dropped duplicate's source on the chunk that was kept."""
+        kept = self._kept[kept_index]
+        sources = self._merged_sources[kept_index]
+
+        source = duplicate.metadata.get("source")
+        if source and source != kept.metadata.get("source") and source not in sources:
+            sources.append(source)
+            kept.metadata["duplicate_sources"] = "; ".join(sources)
+
+        kept.metadata["duplicate_count"] = kept.metadata.get("duplicate_count", 0) + 1
+        self._updated.add(kept_index)
+        self.bytes_saved += len(duplicate.page_content.encode("utf-8"))
+
+    def _find(self, chunk: Any) -> Tuple[Optional[int], bool, bytes, np.ndarray, List[bytes]]:
+        """
+        Look up the kept chunk a chunk duplicates.
+
+        Returns:
+            Tuple of (index of the kept chunk or None, whether it is an exact
+            duplicate, text digest, MinHash signature, LSH band keys); the
+            signature and band keys are only computed if there is no exact match
+        """
+        normalized = " ".join(chunk.page_content.lower().split())
+
+        # Exact duplicates
+        digest = hashlib.sha1(normalized.encode("utf-8")).digest()
+        if digest in self._exact:
+            return self._exact[digest], True, digest, None, []
+
+        # Near duplicates: candidates share at least one LSH band
+        signature = self._signature(normalized)
+        band_keys = [
+            signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            for band in range(self.bands)
+        ]
+
+        checked = set()
+        for band, key in enumerate(band_keys):
+            for candidate in self._buckets[band].get(key, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                similarity = np.mean(self._signatures[candidate] == signature)
+                if similarity >= self.threshold:
+                    return candidate, False, digest, signature, band_keys
+
+        return None, False, digest, signature, band_keys
+
+    def _keep(self, chunk: Any, digest: bytes, signature: np.ndarray, band_keys: List[bytes]) -> None:
+        """Register a chunk as kept, so later duplicates collapse into it."""
+        index = len(self._kept)
+        self._kept.append(chunk)
+        self._merged_sources.append([])
+        self._signatures.append(signature)
+        self._exact[digest] = index
+        for band, key in enumerate(band_keys):
+            self._buckets[band].setdefault(key, []).append(index)
+
+    def deduplicate(self, chunks: List) -> List:
+        """
+        Drop chunks that duplicate a previously seen chunk.
+
+        Args:
+            chunks: List of document chunks
+
+        Returns:
+            Chunks to store, in their original order
+        """
+        unique = []
+
+        for chunk in chunks:
+            self.chunks_seen += 1
+            match, exact, digest, signature, band_keys = self._find(chunk)
+
+            if match is not None:
+                if exact:
+                    self.exact_duplicates += 1
+                else:
+                    self.near_duplicates += 1
+                self._merge(match, chunk)
+                continue
+
+            # New unique chunk
+            self._keep(chunk, digest, signature, band_keys)
+            unique.append(chunk)
+
+        return unique
+
+    def seed(self, chunks: List) -> None:
+        """
+        Register chunks that are already stored, so that duplicates of them
+        are dropped too. Seeded chunks are not counted in the statistics.
+
+        Args:
+            chunks: List of stored document chunks
+        """
+        for chunk in chunks:
+            match, _, digest, signature, band_keys = self._find(chunk)
+            if match is None:
+                self._seeded.add(len(self._kept))
+                self._keep(chunk, digest, signature, band_keys)
+
+    def merged_sources(self) -> Iterator[Tuple[Any, List[str]]]:
+        """
+        List the sources whose chunks were dropped in favour of each kept chunk.
+
+        Yields:
+            Tuple of (kept chunk, sources of its dropped duplicates other than its own)
+        """
+        for kept, sources in zip(self._kept, self._merged_sources):
+            if sources:
+                yield kept, sources
+
+    def updated_chunks(self) -> List:
+        """
+        Get the kept chunks whose duplicate metadata changed because a
+        duplicate was dropped in their favour. Seeded chunks are left out.
+
+        Returns:
+            List of kept document chunks, in the order they were kept
+        """
+        return [self._kept[index] for index in sorted(self._updated - self._seeded)]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get deduplication statistics.
+
+        Returns:
+            Dictionary with chunks seen, exact and near duplicates removed, and bytes saved
+        """
+        return {
+            "chunks_seen": self.chunks_seen,
+            "exact_duplicates": self.exact_duplicates,
+            "near_duplicates": self.near_duplicates,
+            "chunks_removed": self.exact_duplicates + self.near_duplicates,
+            "bytes_saved": self.bytes_saved,
+        }
@@ -0,0 +1,714 @@
+"""
+In-process dense index.
+Keeps a copy of the chunk embeddings as one contiguous float32 matrix that is
+memory-mapped on load, so dense search runs in the app process instead of
+going through the vector store. Small collections are searched exactly with a
+single matrix-vector product; above a size threshold an HNSW graph is built
+and searched instead. ChromaDB stays the system of record: the index is
+rebuilt from it at ingestion time.
+
+The embeddings can also be stored quantized (int8 per dimension, or product
+quantization), which cuts their memory several-fold. Queries are then scored
+against the codes without decompressing them (asymmetric distances: the query
+stays full precision), and a shortlist can be re-ranked with the full-precision
+embeddings, which are kept on disk for that but never scanned.
+
+Rows are aligned with the documents of the sparse index, so a dense hit is
+identified by the same global document number as a sparse hit, and its text
+and metadata are read from the sparse index's stored fields.
+"""
+
+import json
+import logging
+import shutil
+import threading
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:  # Installed with chromadb; only needed above the HNSW threshold
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+# Bump when the on-disk layout changes
+DENSE_INDEX_FORMAT_VERSION = 1
+
+# Description of the index (space, sizes, sparse index state it is aligned with)
+META_FILE = "meta.json"
+
+# Distance functions of ChromaDB collections ("hnsw:space"); smaller is closer
+SPACES = ("l2", "cosine", "ip")
+
+# Rows scored at a time when scanning quantized codes (small enough for the
+# decoded block to stay in cache)
+_SCAN_BLOCK = 4096
+
+# Queries scored at a time by search_many (bounds the rows x queries matrix)
+_QUERY_BLOCK = 256
+
+# Filtered searches scan the allowed rows exactly up to this many, even with an
+# HNSW graph (graph search under a selective filter visits mostly rejected nodes)
+_FILTERED_SCAN_ROWS = 50_000
+
+
+def _to_distances(space: str, dots: np.ndarray, norms: np.ndarray, query_norms) -> np.ndarray:
+    """
+    Turn dot products with queries into distances of the given space.
+    dots is (rows,) for one query or (rows, queries) for several, with norms
+    shaped to broadcast against it and query_norms a scalar or (queries,).
+    """
+    if space == "l2":
+        return norms.astype(np.float32) ** 2 - 2 * dots + np.square(query_norms)
+    if space == "cosine":
+        return 1 - dots / np.maximum(norms * query_norms, 1e-12)
+    return 1 - dots
+
+
+class ScalarQuantizer:
+    """
+    int8 quantization: every dimension is mapped linearly onto 256 levels over
+    the range it takes in the training sample (4x smaller than float32).
+    """
+
+    kind = "int8"
+
+    def __init__(self, low: Optional[np.ndarray] = None, scale: Optional[np.ndarray] = None):
+        self.low = low
+        self.scale = scale
+
+    @property
+    def code_dtype(self):
+        return np.int8
+
+    def code_size(self, dimension: int) -> int:
+        return dimension
+
+    def train(self, sample: np.ndarray) -> None:
+        """Learn the range of every dimension."""
+        self.low = sample.min(axis=0).astype(np.float32)
+        self.scale = np.maximum((sample.max(axis=0) - self.low) / 255, 1e-12).astype(np.float32)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        levels = np.clip(np.rint((vectors - self.low) / self.scale), 0, 255)
+        return (levels - 128).astype(np.int8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return self.low + self.scale * (codes.astype(np.float32) + 128)
+
+    def lookup(self, query_vector: np.ndarray) -> Tuple[np.ndarray, float]:
+        """Fold the quantization into the query: x.q = codes.(scale*q) + (low + 128*scale).q"""
+        weights = (self.scale * query_vector).astype(np.float32)
+        return weights, float(self.low @ query_vector + 128 * weights.sum())
+
+    def dots(self, codes: np.ndarray, table: Tuple[np.ndarray, float]) -> np.ndarray:
+        weights, offset = table
+        return codes.astype(np.float32) @ weights + offset
+
+    def save(self, directory: Path) -> None:
+        np.savez(directory / "quantizer.npz", low=self.low, scale=self.scale)
+
+    @classmethod
+    def load(cls, directory: Path, meta: dict) -> "ScalarQuantizer":
+        with np.load(directory / "quantizer.npz") as data:
+            return cls(low=data["low"], scale=data["scale"])
+
+
+class ProductQuantizer:
+    """
+    Product quantization: the embedding is split into subvectors, and each is
+    replaced by the number of its nearest centroid among 256 learned by k-means
+    on that subspace (one byte per subvector).
+    """
+
+    kind = "pq"
+
+    def __init__(self, num_subvectors: int, centroids: Optional[np.ndarray] = None):
+        self.num_subvectors = num_subvectors
+        self.centroids = centroids  # (subvectors, 256, subvector dimension)
+
+    @property
+    def code_dtype(self):
+        return np.uint8
+
+    def code_size(self, dimension: int) -> int:
+        if dimension % self.num_subvectors:
+            raise ValueError(
+                f"Embedding dimension {dimension} is not divisible into {self.num_subvectors} subvectors"
+            )
+        return self.num_subvectors
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        """View vectors as (rows, subvectors, subvector dimension)."""
+        return vectors.reshape(len(vectors), self.num_subvectors, -1)
+
+    def train(self, sample: np.ndarray, iterations: int = 10, seed: int = 0) -> None:
+        """Run k-means (256 centroids) on every subspace of the sample."""
+        self.code_size(sample.shape[1])
+        rng = np.random.default_rng(seed)
+        parts = self._split(sample.astype(np.float32))
+        centroids = np.zeros((self.num_subvectors, 256, parts.shape[2]), dtype=np.float32)
+
+        for j in range(self.num_subvectors):
+            data = parts[:, j]
+            means = data[rng.choice(len(data), 256, replace=len(data) < 256)]
+            for _ in range(iterations):
+                assignment = self._nearest(data, means)
+                counts = np.bincount(assignment, minlength=256)
+                sums = np.stack(
+                    [np.bincount(assignment, weights=data[:, d], minlength=256) for d in range(data.shape[1])],
+                    axis=1
+                )
+                empty = counts == 0
+                means = (sums / np.maximum(counts, 1)[:, None]).astype(np.float32)
+                # Re-seed unused centroids on random points
+                means[empty] = data[rng.choice(len(data), int(empty.sum()))]
+            centroids[j] = means
+        self.centroids = centroids
+
+    @staticmethod
+    def _nearest(data: np.ndarray, means: np.ndarray) -> np.ndarray:
+        return np.argmin((means ** 2).sum(axis=1) - 2 * data @ means.T, axis=1)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        parts = self._split(np.asarray(vectors, dtype=np.float32))
+        codes = np.empty((len(vectors), self.num_subvectors), dtype=np.uint8)
+        for j in range(self.num_subvectors):
+            codes[:, j] = self._nearest(parts[:, j], self.centroids[j])
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        parts = self.centroids[np.arange(self.num_subvectors), codes.astype(np.intp)]
+        return parts.reshape(len(codes), -1)
+
+    def lookup(self, query_vector: np.ndarray) -> np.ndarray:
+        """Dot product of every query subvector with every centroid of its subspace."""
+        table = np.einsum("jcd,jd->jc", self.centroids, query_vector.reshape(self.num_subvectors, -1))
+        return table.astype(np.float32)
+
+    def dots(self, codes: np.ndarray, table: np.ndarray) -> np.ndarray:
+        result = np.zeros(len(codes), dtype=np.float32)
+        for j in range(self.num_subvectors):
+            result += table[j].take(codes[:, j])
+        return result
+
+    def save(self, directory: Path) -> None:
+        np.savez(directory / "quantizer.npz", centroids=self.centroids)
+
+    @classmethod
+    def load(cls, directory: Path, meta: dict) -> "ProductQuantizer":
+        with np.load(directory / "quantizer.npz") as data:
+            return cls(meta["pq_subvectors"], centroids=data["centroids"])
+
+
+# Quantizers by DENSE_QUANTIZATION name
+QUANTIZERS = {"int8": ScalarQuantizer, "pq": ProductQuantizer}
+
+
+class DenseIndex:
+    """
+    Nearest-neighbour index over chunk embeddings.
+
+    Layout:
+        vectors.npy      embedding of every row (float32, rows x dimension)
+        norms.npy        L2 norm of every row
+        doc_numbers.npy  global sparse index document number of every row
+        hnsw.bin         HNSW graph (only above the size threshold, unquantized)
+        codes.npy        quantized embedding of every row (only when quantized)
+        code_norms.npy   L2 norm of every quantized embedding
+        quantizer.npz    quantizer parameters
+        meta.json        space, dimension, and the sparse index state the rows follow
+    """
+
+    def __init__(
+        self,
+        vectors: Optional[np.ndarray],
+        norms: np.ndarray,
+        doc_numbers: np.ndarray,
+        space: str = "l2",
+        sparse_state: Optional[List] = None,
+        graph=None,
+        ef_search: int = 128,
+        quantizer=None,
+        codes: Optional[np.ndarray] = None,
+        code_norms: Optional[np.ndarray] = None,
+        rescore_factor: int = 0
+    ):
+        """
+        Initialize the dense index.
+
+        Args:
+            vectors: Embedding matrix (rows x dimension, float32; may be None when quantized)
+            norms: L2 norm of every row
+            doc_numbers: Global sparse index document number of every row
+            space: Distance function, as in ChromaDB ("l2" squared, "cosine" or "ip")
+            sparse_state: Commit state of the sparse index the rows are aligned with
+            graph: HNSW graph over the rows (None = exact search)
+            ef_search: HNSW candidate list size at query time (at least k is used)
+            quantizer: ScalarQuantizer or ProductQuantizer the codes were made with
+            codes: Quantized embeddings (searched instead of vectors when given)
+            code_norms: L2 norm of every quantized embedding
+            rescore_factor: Re-rank this many times k quantized candidates with the
+                full-precision embeddings (0 = return quantized distances)
+        """
+        if space not in SPACES:
+            raise ValueError(f"Unknown distance space '{space}' (available: {', '.join(SPACES)})")
+
+        self.vectors = vectors
+        self.norms = norms
+        self.doc_numbers = doc_numbers
+        self.space = space
+        self.sparse_state = sparse_state
+        self.graph = graph
+        self.ef_search = ef_search
+        self.quantizer = quantizer
+        self.codes = codes
+        self.code_norms = code_norms
+        self.rescore_factor = rescore_factor if vectors is not None else 0
+
+        # hnswlib's ef is index-wide state; queries needing a larger one take the lock
+        self._ef_lock = threading.Lock()
+        if graph is not None:
+            graph.set_ef(ef_search)
+
+    @property
+    def num_rows(self) -> int:
+        return len(self.doc_numbers)
+
+    @property
+    def bytes_per_row(self) -> int:
+        """Memory scanned per embedding at query time (0 for an empty quantized index)."""
+        if self.codes is not None:
+            return self.codes.shape[1] * self.codes.itemsize + self.code_norms.itemsize
+        if self.vectors is None:
+            return 0
+        return self.vectors.shape[1] * self.vectors.itemsize + self.norms.itemsize
+
+    @classmethod
+    def build(
+        cls,
+        index_dir: Path,
+        batches: Iterable[Tuple[np.ndarray, np.ndarray]],
+        num_rows: int,
+        dimension: int,
+        space: str = "l2",
+        sparse_state: Optional[Sequence] = None,
+        hnsw_threshold: int = 50_000,
+        hnsw_m: int = 16,
+        hnsw_ef_construction: int = 200,
+        ef_search: int = 128,
+        quantization: Optional[str] = None,
+        pq_subvectors: int = 96,
+        rescore_factor: int = 0,
+        train_size: int = 10_000,
+        recall_k: int = 50
+    ) -> "DenseIndex":
+        """
+        Write an index to disk, streaming the embeddings in batches so the
+        whole matrix never has to be held in memory, and open it.
+
+        Args:
+            index_dir: Target directory (replaced)
+            batches: (document numbers, embeddings) batches, num_rows rows in total
+            num_rows: Total number of rows
+            dimension: Embedding dimension
+            space: Distance function of the collection
+            sparse_state: Commit state of the sparse index the document numbers refer to
+            hnsw_threshold: Build an HNSW graph from this many rows on (unquantized only)
+            hnsw_m: HNSW graph degree
+            hnsw_ef_construction: HNSW candidate list size while building
+            ef_search: HNSW candidate list size at query time
+            quantization: Store the embeddings quantized: None, "int8" or "pq"
+            pq_subvectors: Bytes per embedding with "pq" (must divide the dimension)
+            rescore_factor: Shortlist size for full-precision re-ranking, in
+                multiples of k (0 = none, and the float32 embeddings are not kept)
+            train_size: Embeddings sampled to train the quantizer
+            recall_k: Depth at which the recall of the quantized search is measured
+
+        Returns:
+            DenseIndex instance (memory-mapped)
+        """
+        if quantization is not None and quantization not in QUANTIZERS:
+            raise ValueError(f"Unknown quantization '{quantization}' (available: {', '.join(QUANTIZERS)})")
+
+        tmp_dir = index_dir.with_name(index_dir.name + ".tmp")
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+        tmp_dir.mkdir(parents=True)
+
+        vectors = np.lib.format.open_memmap(
+            tmp_dir / "vectors.npy", mode="w+", dtype=np.float32, shape=(num_rows, dimension)
+        )
+        doc_numbers = np.zeros(num_rows, dtype=np.int64)
+        row = 0
+        for numbers, embeddings in batches:
+            vectors[row:row + len(numbers)] = embeddings
+            doc_numbers[row:row + len(numbers)] = numbers
+            row += len(numbers)
+        if row != num_rows:
+            raise ValueError(f"Expected {num_rows} embeddings, got {row}")
+
+        norms = np.linalg.norm(vectors, axis=1).astype(np.float32) if num_rows else np.zeros(0, dtype=np.float32)
+        np.save(tmp_dir / "norms.npy", norms)
+        np.save(tmp_dir / "doc_numbers.npy", doc_numbers)
+
+        meta = {
+            "format_version": DENSE_INDEX_FORMAT_VERSION,
+            "space": space,
+            "dimension": dimension,
+            "num_rows": num_rows,
+            "hnsw": False,
+            "quantization": quantization,
+            "vectors": True,
+            "sparse_state": [list(entry) for entry in sparse_state] if sparse_state is not None else None,
+        }
+
+        if quantization is not None and num_rows:
+            quantizer = ProductQuantizer(pq_subvectors) if quantization == "pq" else ScalarQuantizer()
+            sample = np.random.default_rng(0).choice(num_rows, min(train_size, num_rows), replace=False)
+            quantizer.train(np.asarray(vectors[np.sort(sample)]))
+            quantizer.save(tmp_dir)
+
+            codes = np.lib.format.open_memmap(
+                tmp_dir / "codes.npy", mode="w+", dtype=quantizer.code_dtype,
+                shape=(num_rows, quantizer.code_size(dimension))
+            )
+            code_norms = np.zeros(num_rows, dtype=np.float32)
+            for start in range(0, num_rows, _SCAN_BLOCK):
+                block = slice(start, start + _SCAN_BLOCK)
+                codes[block] = quantizer.encode(np.asarray(vectors[block]))
+                code_norms[block] = np.linalg.norm(quantizer.decode(codes[block]), axis=1)
+            np.save(tmp_dir / "code_norms.npy", code_norms)
+
+            meta["pq_subvectors"] = pq_subvectors
+            meta["recall"] = _quantized_recall(
+                cls(vectors, norms, np.arange(num_rows), space),
+                cls(vectors, norms, np.arange(num_rows), space,
+                    quantizer=quantizer, codes=codes, code_norms=code_norms, rescore_factor=rescore_factor),
+                recall_k
+            )
+            logger.info(
+                f"Quantized {num_rows} embeddings ({quantization}, "
+                f"{codes.shape[1] * codes.itemsize} bytes each); recall@{recall_k} vs. float32: "
+                f"{meta['recall']['quantized']:.3f}, with rescoring: {meta['recall']['rescored']:.3f}"
+            )
+            codes.flush()
+            del codes
+        elif num_rows >= hnsw_threshold:
+            if hnswlib is None:
+                raise ImportError("hnswlib is required for an HNSW dense index (pip install chroma-hnswlib)")
+            graph = hnswlib.Index(space=space, dim=dimension)
+            graph.init_index(max_elements=num_rows, M=hnsw_m, ef_construction=hnsw_ef_construction)
+            for start in range(0, num_rows, 10_000):
+                end = min(start + 10_000, num_rows)
+                graph.add_items(np.asarray(vectors[start:end]), np.arange(start, end))
+            graph.save_index(str(tmp_dir / "hnsw.bin"))
+            meta["hnsw"] = True
+            logger.info(f"Built HNSW graph over {num_rows} embeddings (M={hnsw_m})")
+
+        vectors.flush()
+        del vectors
+
+        # The full-precision copy is only read back to re-rank shortlists
+        if quantization is not None and not rescore_factor:
+            (tmp_dir / "vectors.npy").unlink()
+            meta["vectors"] = False
+
+        with open(tmp_dir / META_FILE, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+        if index_dir.exists():
+            shutil.rmtree(index_dir)
+        tmp_dir.rename(index_dir)
+        return cls.load(index_dir, ef_search=ef_search, rescore_factor=rescore_factor)
+
+    @classmethod
+    def load(cls, index_dir: Path, mmap: bool = True, ef_search: int = 128, rescore_factor: int = 0) -> "DenseIndex":
+        """
+        Open an index written by `build`.
+
+        Args:
+            index_dir: Index directory
+            mmap: Memory-map the embedding matrix instead of reading it into memory
+            ef_search: HNSW candidate list size at query time
+            rescore_factor: Shortlist size for full-precision re-ranking of a
+                quantized index, in multiples of k (0 = none)
+
+        Returns:
+            DenseIndex instance
+        """
+        with open(index_dir / META_FILE, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        if meta.get("format_version") != DENSE_INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported dense index format {meta.get('format_version')} in {index_dir}")
+
+        mode = "r" if mmap else None
+        graph = None
+        if meta["hnsw"]:
+            if hnswlib is None:
+                raise ImportError("hnswlib is required to load an HNSW dense index")
+            graph = hnswlib.Index(space=meta["space"], dim=meta["dimension"])
+            graph.load_index(str(index_dir / "hnsw.bin"), max_elements=meta["num_rows"])
+
+        quantizer = codes = code_norms = None
+        if meta.get("quantization") and meta["num_rows"]:
+            quantizer = QUANTIZERS[meta["quantization"]].load(index_dir, meta)
+            codes = np.load(index_dir / "codes.npy", mmap_mode=mode)
+            code_norms = np.load(index_dir / "code_norms.npy", mmap_mode=mode)
+
+        sparse_state = meta.get("sparse_state")
+        return cls(
+            vectors=np.load(index_dir / "vectors.npy", mmap_mode=mode) if meta.get("vectors", True) else None,
+            norms=np.load(index_dir / "norms.npy", mmap_mode=mode),
+            doc_numbers=np.load(index_dir / "doc_numbers.npy", mmap_mode=mode),
+            space=meta["space"],
+            sparse_state=[tuple(entry) for entry in sparse_state] if sparse_state is not None else None,
+            graph=graph,
+            ef_search=ef_search,
+            quantizer=quantizer,
+            codes=codes,
+            code_norms=code_norms,
+            rescore_factor=rescore_factor
+        )
+
+    def aligned_with(self, sparse_state: Optional[Tuple]) -> bool:
+        """Check that the rows follow the given sparse index commit state."""
+        return sparse_state is not None and self.sparse_state is not None and tuple(self.sparse_state) == sparse_state
+
+    def distances(self, query_vector: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Exact distances from a query to rows of the index.
+
+        Args:
+            query_vector: Query embedding
+            rows: Rows to compare against (None = all rows, one matrix-vector product)
+
+        Returns:
+            Distance to every requested row, in the index's space
+        """
+        if rows is not None and 2 * len(rows) > self.num_rows:
+            # One pass over the contiguous matrix beats gathering most of its rows
+            return self.distances(query_vector)[rows]
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        vectors = self.vectors if rows is None else self.vectors[rows]
+        norms = self.norms if rows is None else self.norms[rows]
+        return _to_distances(self.space, vectors @ query_vector, norms, float(np.linalg.norm(query_vector)))
+
+    def quantized_distances(self, query_vector: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Approximate distances from a query to rows of the index, computed on
+        the codes (asymmetric: the query itself is not quantized).
+
+        Args:
+            query_vector: Query embedding
+            rows: Rows to compare against (None = all rows)
+
+        Returns:
+            Distance to every requested row, in the index's space
+        """
+        if rows is not None and 2 * len(rows) > self.num_rows:
+            return self.quantized_distances(query_vector)[rows]
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        table = self.quantizer.lookup(query_vector)
+        num_rows = self.num_rows if rows is None else len(rows)
+        dots = np.empty(num_rows, dtype=np.float32)
+        for start in range(0, num_rows, _SCAN_BLOCK):
+            codes = self.codes[start:start + _SCAN_BLOCK] if rows is None else self.codes[rows[start:start + _SCAN_BLOCK]]
+            dots[start:start + _SCAN_BLOCK] = self.quantizer.dots(codes, table)
+        norms = self.code_norms if rows is None else self.code_norms[rows]
+        return _to_distances(self.space, dots, norms, float(np.linalg.norm(query_vector)))
+
+    def rows_of(self, doc_numbers: np.ndarray) -> np.ndarray:
+        """
+        Rows holding some documents (rows follow document number order).
+
+        Args:
+            doc_numbers: Global sparse index document numbers, ascending
+
+        Returns:
+            Rows of the documents that have one, ascending
+        """
+        doc_numbers = np.asarray(doc_numbers, dtype=np.int64)
+        rows = np.searchsorted(self.doc_numbers, doc_numbers)
+        found = rows < self.num_rows
+        found[found] = self.doc_numbers[rows[found]] == doc_numbers[found]
+        return rows[found]
+
+    def _use_graph(self, rows: Optional[np.ndarray]) -> bool:
+        """Whether to search the HNSW graph rather than scan (a few allowed rows are scanned exactly)."""
+        return self.graph is not None and (rows is None or len(rows) > _FILTERED_SCAN_ROWS)
+
+    def _graph_search(self, query_vectors: np.ndarray, k: int,
+                      rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Query the HNSW graph.
+
+        Args:
+            query_vectors: Query embeddings (queries x dimension)
+            k: Number of rows to return per query
+            rows: Only accept these rows (None = all rows)
+
+        Returns:
+            Tuple of (rows, distances), one line per query, nearest first
+        """
+        accept = None
+        if rows is not None:
+            allowed = np.zeros(self.num_rows, dtype=bool)
+            allowed[rows] = True
+            accept = allowed.__getitem__
+
+        if k > self.ef_search:
+            with self._ef_lock:
+                self.graph.set_ef(k)
+                labels, distances = self.graph.knn_query(query_vectors, k=k, filter=accept)
+                self.graph.set_ef(self.ef_search)
+        else:
+            labels, distances = self.graph.knn_query(query_vectors, k=k, filter=accept)
+        return labels.astype(np.int64), distances
+
+    def search(self, query_vector: Sequence[float], k: int,
+               doc_numbers: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k nearest rows to a query embedding.
+
+        With `doc_numbers` (e.g. the documents passing a metadata filter), only
+        their rows are compared against: exact and quantized search scan just
+        those rows, so the cost shrinks with the filter's selectivity, and the
+        HNSW graph is only used when more than _FILTERED_SCAN_ROWS remain.
+
+        Args:
+            query_vector: Query embedding
+            k: Number of rows to return
+            doc_numbers: Restrict the search to these global document numbers (ascending)
+
+        Returns:
+            Tuple of (global sparse index document numbers, distances), nearest first
+        """
+        rows = None if doc_numbers is None else self.rows_of(doc_numbers)
+        num_rows = self.num_rows if rows is None else len(rows)
+        k = min(k, num_rows)
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        if self._use_graph(rows):
+            labels, distances = self._graph_search(query_vector, k, rows)
+            found, distances = labels[0], distances[0]
+        elif self.codes is not None:
+            # Shortlist on the codes, then re-rank it with the full-precision embeddings
+            depth = min(k * self.rescore_factor, num_rows) if self.rescore_factor else k
+            positions, distances = _nearest(self.quantized_distances(query_vector, rows), depth)
+            found = positions if rows is None else rows[positions]
+            if self.rescore_factor:
+                found = np.sort(found)  # sequential reads from the mapped matrix
+                order, distances = _nearest(self.distances(query_vector, found), k)
+                found = found[order]
+        else:
+            positions, distances = _nearest(self.distances(query_vector, rows), k)
+            found = positions if rows is None else rows[positions]
+
+        return np.asarray(self.doc_numbers[found]), distances.astype(np.float32)
+
+    def search_many(self, query_vectors: np.ndarray, k: int,
+                    doc_numbers: Optional[np.ndarray] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Find the k nearest rows to each of many query embeddings. Exact search
+        scores a block of queries with one matrix multiplication, and the HNSW
+        graph takes the whole batch in one call.
+
+        Args:
+            query_vectors: Query embeddings (queries x dimension)
+            k: Number of rows to return per query
+            doc_numbers: Restrict the search to these global document numbers (as `search`)
+
+        Returns:
+            (global sparse index document numbers, distances) of every query, nearest first
+        """
+        query_vectors = np.asarray(query_vectors, dtype=np.float32).reshape(len(query_vectors), -1)
+        rows = None if doc_numbers is None else self.rows_of(doc_numbers)
+        k = min(k, self.num_rows if rows is None else len(rows))
+        if k <= 0 or self.codes is not None or not len(query_vectors):
+            # Quantized codes are scored through per-query lookup tables
+            return [self.search(query_vector, k, doc_numbers) for query_vector in query_vectors]
+
+        if self._use_graph(rows):
+            labels, distances = self._graph_search(query_vectors, k, rows)
+            return [
+                (np.asarray(self.doc_numbers[found]), row_distances.astype(np.float32))
+                for found, row_distances in zip(labels, distances)
+            ]
+
+        # Gather the allowed rows unless they are most of the matrix
+        gather = rows is not None and 2 * len(rows) <= self.num_rows
+        vectors = self.vectors[rows] if gather else self.vectors
+        norms = self.norms[rows] if gather else self.norms
+        results = []
+        for start in range(0, len(query_vectors), _QUERY_BLOCK):
+            block = query_vectors[start:start + _QUERY_BLOCK]
+            all_distances = _to_distances(self.space, vectors @ block.T, norms[:, None], np.linalg.norm(block, axis=1))
+            if rows is not None and not gather:
+                all_distances = all_distances[rows]
+            for column in range(len(block)):
+                positions, distances = _nearest(all_distances[:, column], k)
+                found = positions if rows is None else rows[positions]
+                results.append((np.asarray(self.doc_numbers[found]), distances.astype(np.float32)))
+        return results
+
+
+def _nearest(distances: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Positions and values of the k smallest distances, nearest first."""
+    if k < len(distances):
+        rows = np.argpartition(distances, k - 1)[:k]
+    else:
+        rows = np.arange(len(distances))
+    rows = rows[np.argsort(distances[rows], kind="stable")]
+    return rows, distances[rows]
+
+
+def _quantized_recall(exact: DenseIndex, quantized: DenseIndex, k: int, num_queries: int = 100) -> dict:
+    """
+    Measure how many of the exact k nearest rows a quantized index finds, with
+    and without full-precision re-ranking. Queries are midpoints of random
+    pairs of rows (like a question close to, but not copied from, the chunks).
+
+    Args:
+        exact: Unquantized index over the same rows
+        quantized: Quantized index
+        k: Search depth
+        num_queries: Number of queries
+
+    Returns:
+        Dict with the mean "quantized" and "rescored" recall@k
+    """
+    rng = np.random.default_rng(1)
+    pairs = rng.integers(0, exact.num_rows, size=(num_queries, 2))
+    rescore_factor = quantized.rescore_factor or 4
+
+    found = {"quantized": [], "rescored": []}
+    for first, second in pairs:
+        query_vector = (exact.vectors[first] + exact.vectors[second]) / 2
+        expected = set(exact.search(query_vector, k)[0].tolist())
+        for name, factor in (("quantized", 0), ("rescored", rescore_factor)):
+            quantized.rescore_factor = factor
+            rows = quantized.search(query_vector, k)[0]
+            found[name].append(len(expected.intersection(rows.tolist())) / len(expected))
+
+    quantized.rescore_factor = rescore_factor
+    return {"k": k, "quantized": float(np.mean(found["quantized"])), "rescored": float(np.mean(found["rescored"]))}
+
+
+def dense_index_exists(index_dir: Path) -> bool:
+    """
+    Check whether a dense index has been written to a directory.
+
+    Args:
+        index_dir: Index directory
+
+    Returns:
+        True if the index description is present
+    """
+    return (index_dir / META_FILE).exists()
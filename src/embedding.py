@@ -0,0 +1,177 @@
+"""
+Embedding helpers for the indexing pipeline.
+Wraps an embedding model so chunks are embedded in batches with bounded concurrency,
+and provides a deterministic stand-in model for reproducible runs without Ollama.
+"""
+
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+import requests
+from langchain_community.embeddings import OllamaEmbeddings
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that splits documents into batches and embeds them
+    concurrently, keeping at most `max_concurrency` batches in flight.
+    """
+
+    def __init__(self, embeddings: Embeddings, batch_size: int = 32, max_concurrency: int = 4):
+        """
+        Initialize the batched embeddings wrapper.
+
+        Args:
+            embeddings: Underlying embedding model (e.g. OllamaEmbeddings)
+            batch_size: Number of texts per batch
+            max_concurrency: Maximum number of batches embedded at the same time
+        """
+        if batch_size < 1 or max_concurrency < 1:
+            raise ValueError("batch_size and max_concurrency must be positive")
+
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a list of texts, preserving their order.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            List of embedding vectors
+        """
+        if not texts:
+            return []
+
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+        if len(batches) == 1 or self.max_concurrency == 1:
+            results = [self.embeddings.embed_documents(batch) for batch in batches]
+        else:
+            workers = min(self.max_concurrency, len(batches))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(self.embeddings.embed_documents, batches))
+
+        return [vector for batch_vectors in results for vector in batch_vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embed a single query.
+
+        Args:
+            text: Query text
+
+        Returns:
+            Embedding vector
+        """
+        return self.embeddings.embed_query(text)
+
+
+def embed_queries(embeddings: Embeddings, texts: List[str], max_concurrency: int = 4) -> List[List[float]]:
+    """
+    Embed many queries in one call. Models that embed queries differently from
+    documents (OllamaEmbeddings prefixes its query instruction) cannot go
+    through embed_documents, so unless the model has its own `embed_queries`
+    the queries are sent concurrently, at most `max_concurrency` at a time.
+
+    Args:
+        embeddings: Embedding model
+        texts: Query texts
+        max_concurrency: Maximum number of queries embedded at the same time
+
+    Returns:
+        List of embedding vectors, in the order of texts
+    """
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts)
+    if len(texts) <= 1 or max_concurrency <= 1:
+        return [embeddings.embed_query(text) for text in texts]
+
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(texts))) as executor:
+        return list(executor.map(embeddings.embed_query, texts))
+
+
+class TimeoutOllamaEmbeddings(OllamaEmbeddings):
+    """
+    OllamaEmbeddings with a client timeout on every request. OllamaEmbeddings
+    waits for the server indefinitely, so a hung request would hold the thread
+    that sent it (e.g. a dense retrieval worker) until the server answers.
+    """
+
+    request_timeout: Optional[float] = None
+    """Seconds to wait for the server to respond (None = no timeout)."""
+
+    def _process_emb_response(self, input: str) -> List[float]:
+        headers = {"Content-Type": "application/json", **(self.headers or {})}
+        try:
+            res = requests.post(
+                f"{self.base_url}/api/embeddings",
+                headers=headers,
+                json={"model": self.model, "prompt": input, **self._default_params},
+                timeout=self.request_timeout
+            )
+        except requests.exceptions.RequestException as e:
+            raise ValueError(f"Error raised by inference endpoint: {e}")
+
+        if res.status_code != 200:
+            raise ValueError(f"Error raised by inference API HTTP code: {res.status_code}, {res.text}")
+        try:
+            return res.json()["embedding"]
+        except requests.exceptions.JSONDecodeError as e:
+            raise ValueError(f"Error raised by inference API: {e}.\nResponse: {res.text}")
+
+
+class DeterministicEmbeddings(Embeddings):
+    """
+    Local stand-in for an embedding model.
+    Each text maps to a fixed pseudo-random unit vector seeded by its hash,
+    so runs are reproducible without an Ollama server (benchmarks, tests).
+    """
+
+    def __init__(self, dimension: int = 768):
+        """
+        Initialize the deterministic embeddings.
+
+        Args:
+            dimension: Length of the generated vectors
+        """
+        self.dimension = dimension
+
+    def _embed(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a list of texts.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            List of embedding vectors
+        """
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embed a single query.
+
+        Args:
+            text: Query text
+
+        Returns:
+            Embedding vector
+        """
+        return self._embed(text)
@@ -0,0 +1,479 @@
+"""
+Embedding caches.
+The persistent cache used by the indexing pipeline stores vectors in SQLite
+keyed by embedding model and a hash of the chunk text, so text that was already
+embedded is never sent to the embedding model again. The query cache keeps
+recent query embeddings in memory, so repeated questions skip the embedding
+call at question time.
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from src.embedding import embed_queries
+
+logger = logging.getLogger(__name__)
+
+# Fraction of the size limit the cache is trimmed down to when it overflows
+EVICTION_TARGET = 0.9
+
+
+def hash_text(text: str) -> str:
+    """
+    Hash a chunk of text for use as a cache key.
+
+    Args:
+        text: Text to hash
+
+    Returns:
+        Hex digest of the UTF-8 encoded text
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed cache of embedding vectors.
+    Vectors are stored as packed float32 blobs and evicted least-recently-used
+    first once the cache grows past its size limit.
+    """
+
+    def __init__(self, cache_path: Path, model_name: str, max_size_mb: float = 1024):
+        """
+        Initialize the embedding cache.
+
+        Args:
+            cache_path: Location of the SQLite database file
+            model_name: Embedding model the vectors belong to (part of the cache key)
+            max_size_mb: Maximum total size of stored vectors in megabytes
+        """
+        self.cache_path = cache_path
+        self.model_name = model_name
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(cache_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+        self._size_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+
+        logger.info(f"Embedding cache opened at {cache_path} ({self._size_bytes / 1e6:.1f} MB)")
+
+    def get_many(self, text_hashes: List[str]) -> Dict[str, List[float]]:
+        """
+        Look up cached vectors.
+
+        Args:
+            text_hashes: Hashes of the texts to look up
+
+        Returns:
+            Mapping of text hash to vector for the hashes found in the cache
+        """
+        found = {}
+        unique_hashes = list(dict.fromkeys(text_hashes))
+
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(unique_hashes), 500):
+                batch = unique_hashes[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND text_hash IN ({placeholders})",
+                    [self.model_name, *batch]
+                ).fetchall()
+                for text_hash, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[text_hash] = vector.tolist()
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, self.model_name, text_hash) for text_hash in found]
+                )
+                self._conn.commit()
+
+            hits = sum(1 for text_hash in text_hashes if text_hash in found)
+            self.hits += hits
+            self.misses += len(text_hashes) - hits
+
+        return found
+
+    def put_many(self, text_hashes: List[str], vectors: List[List[float]]) -> None:
+        """
+        Store vectors in the cache, evicting old entries if the size limit is exceeded.
+
+        Args:
+            text_hashes: Hashes of the embedded texts
+            vectors: Embedding vectors, one per hash
+        """
+        now = time.time()
+        blobs = {text_hash: array("f", vector).tobytes() for text_hash, vector in zip(text_hashes, vectors)}
+        unique_hashes = list(blobs)
+
+        with self._lock:
+            # Vectors already cached (e.g. stored by another process) are
+            # replaced, so their size is not added twice
+            replaced = 0
+            for i in range(0, len(unique_hashes), 500):
+                batch = unique_hashes[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                replaced += self._conn.execute(
+                    f"SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings "
+                    f"WHERE model = ? AND text_hash IN ({placeholders})",
+                    [self.model_name, *batch]
+                ).fetchone()[0]
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                [(self.model_name, text_hash, blob, now) for text_hash, blob in blobs.items()]
+            )
+            self._conn.commit()
+            self._size_bytes += sum(len(blob) for blob in blobs.values()) - replaced
+
+            if self._size_bytes > self.max_size_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Delete least-recently-used vectors until the cache is below its target size."""
+        target = int(self.max_size_bytes * EVICTION_TARGET)
+
+        while self._size_bytes > target:
+            rows = self._conn.execute(
+                "SELECT rowid, LENGTH(vector) FROM embeddings ORDER BY last_used LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                self._size_bytes = 0
+                break
+
+            selected = []
+            for rowid, size in rows:
+                selected.append((rowid,))
+                self._size_bytes -= size
+                if self._size_bytes <= target:
+                    break
+
+            self._conn.executemany("DELETE FROM embeddings WHERE rowid = ?", selected)
+            self.evictions += len(selected)
+
+        self._conn.commit()
+        logger.info(f"Embedding cache trimmed to {self._size_bytes / 1e6:.1f} MB")
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Get cache statistics.
+
+        Returns:
+            Dictionary with hits, misses, hit rate, evictions and size in megabytes
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size_mb": self._size_bytes / 1e6,
+        }
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that consults an EmbeddingCache before calling the
+    underlying model, and only embeds cache misses.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache):
+        """
+        Initialize the cached embeddings wrapper.
+
+        Args:
+            embeddings: Underlying embedding model
+            cache: Cache to read from and write to
+        """
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a list of texts, reusing cached vectors where possible.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            List of embedding vectors
+        """
+        if not texts:
+            return []
+
+        text_hashes = [hash_text(text) for text in texts]
+        vectors: Dict[str, Optional[List[float]]] = self.cache.get_many(text_hashes)
+
+        # Embed each distinct missing text once
+        missing = {}
+        for text_hash, text in zip(text_hashes, texts):
+            if text_hash not in vectors and text_hash not in missing:
+                missing[text_hash] = text
+
+        if missing:
+            new_vectors = self.embeddings.embed_documents(list(missing.values()))
+            self.cache.put_many(list(missing.keys()), new_vectors)
+            vectors.update(zip(missing.keys(), new_vectors))
+
+        return [vectors[text_hash] for text_hash in text_hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embed a single query (queries are not cached).
+
+        Args:
+            text: Query text
+
+        Returns:
+            Embedding vector
+        """
+        return self.embeddings.embed_query(text)
+
+
+def normalize_query(text: str) -> str:
+    """
+    Normalize a query for cache lookups: Unicode normalization, case folding
+    and collapsed whitespace ("What is  Bytaid?" and "what is bytaid?" match).
+
+    Args:
+        text: Query text
+
+    Returns:
+        Normalized query text
+    """
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded in-memory cache of query embeddings, keyed by embedding model and
+    normalized query text. Entries are evicted least-recently-used first once
+    the cache is full, and expire a fixed time after they were embedded.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: Optional[float] = 3600):
+        """
+        Initialize the query embedding cache.
+
+        Args:
+            max_entries: Maximum number of cached queries
+            ttl_seconds: Lifetime of an entry in seconds (None = until evicted)
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries must be positive")
+
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        # (model, normalized query) -> (time embedded, vector), least recently used first
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, model_name: str, query: str) -> Optional[List[float]]:
+        """
+        Look up a query embedding.
+
+        Args:
+            model_name: Embedding model
+            query: Normalized query text
+
+        Returns:
+            Cached vector, or None on a miss
+        """
+        key = (model_name, query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds is not None and time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, model_name: str, query: str, vector: List[float]) -> None:
+        """
+        Store a query embedding, evicting the least recently used one if the cache is full.
+
+        Args:
+            model_name: Embedding model
+            query: Normalized query text
+            vector: Embedding vector
+        """
+        with self._lock:
+            self._entries[(model_name, query)] = (time.monotonic(), vector)
+            self._entries.move_to_end((model_name, query))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Get cache statistics.
+
+        Returns:
+            Dictionary with hits, misses, hit rate, evictions, expirations and entries
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._entries),
+            }
+
+    def clear(self) -> None:
+        """Drop every cached embedding."""
+        with self._lock:
+            self._entries.clear()
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves repeated queries from a QueryEmbeddingCache
+    instead of calling the underlying model. Documents are passed through.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: QueryEmbeddingCache, model_name: str,
+                 log_every: int = 100):
+        """
+        Initialize the cached query embeddings wrapper.
+
+        Args:
+            embeddings: Underlying embedding model
+            cache: Cache of query embeddings
+            model_name: Name of the embedding model (part of the cache key)
+            log_every: Log the cache statistics every this many queries
+        """
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name
+        self.log_every = log_every
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a list of texts (not cached).
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            List of embedding vectors
+        """
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embed a single query, reusing the cached vector of an equivalent query.
+
+        Args:
+            text: Query text
+
+        Returns:
+            Embedding vector
+        """
+        key = normalize_query(text)
+        vector = self.cache.get(self.model_name, key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(self.model_name, key, vector)
+
+        self._log_stats()
+        return list(vector)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed many queries, reusing cached vectors and embedding each distinct
+        uncached query once, in a single batch.
+
+        Args:
+            texts: Query texts
+
+        Returns:
+            List of embedding vectors, in the order of texts
+        """
+        keys = [normalize_query(text) for text in texts]
+        vectors = {}
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key in vectors or key in missing:
+                continue
+            vector = self.cache.get(self.model_name, key)
+            if vector is None:
+                missing[key] = text
+            else:
+                vectors[key] = vector
+
+        if missing:
+            for key, vector in zip(missing, embed_queries(self.embeddings, list(missing.values()))):
+                self.cache.put(self.model_name, key, vector)
+                vectors[key] = vector
+
+        self._log_stats()
+        return [list(vectors[key]) for key in keys]
+
+    def _log_stats(self) -> None:
+        """Log the cache statistics every `log_every` lookups."""
+        stats = self.cache.stats()
+        if self.log_every and (stats["hits"] + stats["misses"]) % self.log_every == 0:
+            logger.info(
+                f"Query embedding cache: {stats['hits']} hits, {stats['misses']} misses "
+                f"({stats['hit_rate']:.1%} hit rate), {stats['entries']} entries"
+            )
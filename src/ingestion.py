@@ -3,20 +3,20 @@ Indexing Pipeline for RAG Chatbot.
 Loads documents, chunks them, generates embeddings, and stores in ChromaDB.
 """
 
+import argparse
+import itertools
 import logging
+import time
+import uuid
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 import sys
 
-from langchain_community.document_loaders import (
-    TextLoader,
-    PyPDFLoader,
-    Docx2txtLoader,
-    DirectoryLoader
-)
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import numpy as np
 from langchain_community.vectorstores import Chroma
 from langchain_community.embeddings import OllamaEmbeddings
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from tqdm import tqdm
 
 # Add parent directory to path to import from src
@@ -25,11 +25,37 @@ sys.path.append(str(Path(__file__).parent.parent))
 from src.config import (
     DOCUMENTS_DIR,
     CHROMA_PERSIST_DIR,
+    INDEX_MANIFEST_PATH,
+    EMBEDDING_CACHE_PATH,
+    PDF_CACHE_DIR,
+    SPARSE_INDEX_DIR,
+    DENSE_INDEX_DIR,
     CHUNK_SIZE,
     CHUNK_OVERLAP,
     SEPARATORS,
+    ENABLE_CHUNK_DEDUP,
+    DEDUP_SIMILARITY_THRESHOLD,
+    DEDUP_NUM_PERM,
+    DEDUP_BANDS,
     COLLECTION_NAME,
     EMBEDDING_MODEL,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_MAX_CONCURRENCY,
+    CHROMA_WRITE_BATCH_SIZE,
+    LOADER_MAX_WORKERS,
+    PDF_PAGES_PER_TASK,
+    ENABLE_PDF_CACHE,
+    PIPELINE_QUEUE_SIZE,
+    ENABLE_EMBEDDING_CACHE,
+    EMBEDDING_CACHE_MAX_MB,
+    DENSE_BACKEND,
+    DENSE_HNSW_THRESHOLD,
+    DENSE_HNSW_M,
+    DENSE_HNSW_EF_CONSTRUCTION,
+    DENSE_QUANTIZATION,
+    DENSE_PQ_SUBVECTORS,
+    DENSE_RESCORE_FACTOR,
+    DENSE_TOP_K,
     OLLAMA_BASE_URL
 )
 from src.utils import (
@@ -38,9 +64,39 @@ from src.utils import (
     validate_document_directory,
     get_supported_file_extensions
 )
+from src.chunking import TextChunker
+from src.dedup import ChunkDeduplicator
+from src.embedding import BatchedEmbeddings
+from src.embedding_cache import CachedEmbeddings, EmbeddingCache
+from src.loaders import LOADER_MAPPING, iter_load_files, load_files, scan_documents
+from src.pdf_loader import PdfPageCache
+from src.pipeline import batched, bounded_stage
+from src.manifest import IndexManifest, compute_file_hash
+from src.metadata_filter import FILTER_FIELDS, source_fields
+from src.dense_index import DenseIndex
+from src.sparse_index import SparseIndex, sparse_index_exists
 
 logger = logging.getLogger(__name__)
 
+# Namespace for deterministic chunk IDs (uuid5 of source path, page and offset)
+CHUNK_ID_NAMESPACE = uuid.UUID("6f1c2b1e-8f3a-5d4c-9b7e-2a1d0c3e4f50")
+
+
+def make_chunk_id(rel_path: str, page: Any, start_index: int) -> str:
+    """
+    Build a stable chunk ID from where the chunk comes from.
+    Re-indexing the same content yields the same IDs, so writes are idempotent upserts.
+    
+    Args:
+        rel_path: Source file path relative to the documents directory
+        page: Page number (None for formats without pages)
+        start_index: Character offset of the chunk within its page/document
+        
+    Returns:
+        Chunk ID string
+    """
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{rel_path}|{page}|{start_index}"))
+
 
 class DocumentIndexer:
     """
@@ -54,7 +110,19 @@ class DocumentIndexer:
         persist_dir: Path,
         chunk_size: int = CHUNK_SIZE,
         chunk_overlap: int = CHUNK_OVERLAP,
-        embedding_model: str = EMBEDDING_MODEL
+        embedding_model: str = EMBEDDING_MODEL,
+        manifest_path: Path = INDEX_MANIFEST_PATH,
+        embedding_batch_size: int = EMBEDDING_BATCH_SIZE,
+        embedding_concurrency: int = EMBEDDING_MAX_CONCURRENCY,
+        write_batch_size: int = CHROMA_WRITE_BATCH_SIZE,
+        loader_workers: int = LOADER_MAX_WORKERS,
+        queue_size: int = PIPELINE_QUEUE_SIZE,
+        use_embedding_cache: bool = ENABLE_EMBEDDING_CACHE,
+        deduplicate: bool = ENABLE_CHUNK_DEDUP,
+        use_pdf_cache: bool = ENABLE_PDF_CACHE,
+        sparse_index_dir: Path = SPARSE_INDEX_DIR,
+        dense_index_dir: Optional[Path] = DENSE_INDEX_DIR if DENSE_BACKEND == "in_process" else None,
+        embeddings: Optional[Embeddings] = None
     ):
         """
         Initialize the Document Indexer.
@@ -65,26 +133,63 @@ class DocumentIndexer:
             chunk_size: Size of text chunks (in characters/tokens)
             chunk_overlap: Overlap between chunks
             embedding_model: Name of the Ollama embedding model
+            manifest_path: Location of the index manifest used for incremental runs
+            embedding_batch_size: Number of chunks per embedding batch
+            embedding_concurrency: Maximum number of embedding batches in flight
+            write_batch_size: Number of chunks embedded and written to ChromaDB at a time
+            loader_workers: Worker processes used to parse documents (None = CPU count)
+            queue_size: Items buffered between stages of the streaming pipeline
+            use_embedding_cache: Reuse previously computed chunk embeddings from disk
+            deduplicate: Collapse exact and near-duplicate chunks before embedding
+            use_pdf_cache: Reuse extracted PDF page text from disk for unchanged PDFs
+            sparse_index_dir: Where the BM25 index used at query time is written
+            dense_index_dir: Where the in-process dense index is written (None = not built)
+            embeddings: Embedding model to use instead of OllamaEmbeddings
+                (e.g. a deterministic stand-in for benchmarks)
         """
         self.documents_dir = documents_dir
         self.persist_dir = persist_dir
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
         self.embedding_model = embedding_model
+        self.manifest_path = manifest_path
+        self.sparse_index_dir = sparse_index_dir
+        self.dense_index_dir = dense_index_dir
+        self.write_batch_size = write_batch_size
+        self.loader_workers = loader_workers
+        self.pdf_cache = PdfPageCache(PDF_CACHE_DIR) if use_pdf_cache else None
+        self.queue_size = queue_size
+        self.deduplicate = deduplicate
+        self.deduplicator = None
         
         # Initialize embeddings
-        logger.info(f"Initializing Ollama embeddings with model: {embedding_model}")
-        self.embeddings = OllamaEmbeddings(
-            model=embedding_model,
-            base_url=OLLAMA_BASE_URL
+        if embeddings is None:
+            logger.info(f"Initializing Ollama embeddings with model: {embedding_model}")
+            embeddings = OllamaEmbeddings(
+                model=embedding_model,
+                base_url=OLLAMA_BASE_URL
+            )
+        self.embeddings = BatchedEmbeddings(
+            embeddings,
+            batch_size=embedding_batch_size,
+            max_concurrency=embedding_concurrency
         )
         
-        # Text splitter
-        self.text_splitter = RecursiveCharacterTextSplitter(
+        # Only embed chunks whose text has not been embedded before
+        self.embedding_cache = None
+        if use_embedding_cache:
+            self.embedding_cache = EmbeddingCache(
+                EMBEDDING_CACHE_PATH,
+                model_name=embedding_model,
+                max_size_mb=EMBEDDING_CACHE_MAX_MB
+            )
+            self.embeddings = CachedEmbeddings(self.embeddings, self.embedding_cache)
+        
+        # Text splitter (records start/end character offsets in chunk metadata)
+        self.text_splitter = TextChunker(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
-            separators=SEPARATORS,
-            length_function=len,
+            separators=SEPARATORS
         )
         
         logger.info("DocumentIndexer initialized")
@@ -98,71 +203,188 @@ class DocumentIndexer:
         """
         logger.info(f"Loading documents from: {self.documents_dir}")
         
-        all_documents = []
+        files = self.scan_documents()
         
-        # Load PDF files
-        try:
-            pdf_loader = DirectoryLoader(
-                str(self.documents_dir),
-                glob="**/*.pdf",
-                loader_cls=PyPDFLoader,
-                show_progress=True,
-                use_multithreading=True
-            )
-            pdf_docs = pdf_loader.load()
-            all_documents.extend(pdf_docs)
-            logger.info(f"Loaded {len(pdf_docs)} PDF documents")
-        except Exception as e:
-            logger.warning(f"Error loading PDFs: {e}")
+        counts = {}
+        for path in files.values():
+            counts[path.suffix.lower()] = counts.get(path.suffix.lower(), 0) + 1
+        for ext in LOADER_MAPPING:
+            logger.info(f"Found {counts.get(ext, 0)} {ext} files")
         
-        # Load text files
+        all_documents = load_files(
+            list(files.values()),
+            max_workers=self.loader_workers,
+            pdf_cache=self.pdf_cache,
+            pdf_pages_per_task=PDF_PAGES_PER_TASK
+        )
+        self._log_pdf_cache_stats()
+        
+        logger.info(f"Total documents loaded: {len(all_documents)}")
+        return all_documents
+    
+    def scan_documents(self) -> Dict[str, Path]:
+        """
+        Find all supported files in the documents directory.
+        
+        Returns:
+            Mapping of path relative to the documents directory to absolute path
+        """
+        return scan_documents(self.documents_dir)
+    
+    def _log_pdf_cache_stats(self) -> None:
+        """Log how many PDFs were served from the page text cache."""
+        if self.pdf_cache is not None and self.pdf_cache.hits + self.pdf_cache.misses:
+            logger.info(
+                f"PDF text cache: {self.pdf_cache.hits} hits, {self.pdf_cache.misses} misses"
+            )
+    
+    def _relative_source(self, source: str) -> str:
+        """Convert a document's source metadata to a path relative to the documents directory."""
         try:
-            txt_loader = DirectoryLoader(
-                str(self.documents_dir),
-                glob="**/*.txt",
-                loader_cls=TextLoader,
-                show_progress=True
+            return Path(source).resolve().relative_to(self.documents_dir.resolve()).as_posix()
+        except ValueError:
+            return Path(source).as_posix()
+    
+    def _assign_chunk_ids(self, chunks: List) -> Tuple[List[str], Dict[str, List[str]]]:
+        """
+        Derive a deterministic ID for every chunk and group the IDs by source file.
+        Also records the chunk's folder and file type in its metadata, for
+        metadata-filtered retrieval.
+        
+        Args:
+            chunks: List of document chunks
+            
+        Returns:
+            Tuple of (chunk IDs in chunk order, mapping of relative file path to chunk IDs)
+        """
+        ids = []
+        ids_by_file = {}
+        for position, chunk in enumerate(chunks):
+            rel_path = self._relative_source(chunk.metadata.get("source", ""))
+            chunk.metadata.update(source_fields(rel_path))
+            chunk_id = make_chunk_id(
+                rel_path,
+                chunk.metadata.get("page"),
+                chunk.metadata.get("start_index", position)
             )
-            txt_docs = txt_loader.load()
-            all_documents.extend(txt_docs)
-            logger.info(f"Loaded {len(txt_docs)} text documents")
-        except Exception as e:
-            logger.warning(f"Error loading text files: {e}")
+            ids.append(chunk_id)
+            ids_by_file.setdefault(rel_path, []).append(chunk_id)
+        return ids, ids_by_file
+    
+    def _duplicate_ids_by_file(self) -> Dict[str, List[str]]:
+        """
+        Map every file whose chunks were dropped as duplicates of another
+        file's chunks to the IDs of the chunks that were kept in their place.
         
-        # Load DOCX files
-        try:
-            docx_loader = DirectoryLoader(
-                str(self.documents_dir),
-                glob="**/*.docx",
-                loader_cls=Docx2txtLoader,
-                show_progress=True
+        Returns:
+            Mapping of relative file path to kept chunk IDs
+        """
+        duplicate_ids_by_file = {}
+        if self.deduplicator is None:
+            return duplicate_ids_by_file
+        
+        for kept, sources in self.deduplicator.merged_sources():
+            kept_id = make_chunk_id(
+                self._relative_source(kept.metadata.get("source", "")),
+                kept.metadata.get("page"),
+                kept.metadata.get("start_index", 0)
             )
-            docx_docs = docx_loader.load()
-            all_documents.extend(docx_docs)
-            logger.info(f"Loaded {len(docx_docs)} DOCX documents")
-        except Exception as e:
-            logger.warning(f"Error loading DOCX files: {e}")
+            for source in sources:
+                duplicate_ids_by_file.setdefault(self._relative_source(source), []).append(kept_id)
+        return duplicate_ids_by_file
+    
+    def _seed_deduplicator(self, vectorstore: Chroma, chunk_ids: List[str]) -> None:
+        """
+        Register stored chunks with the deduplicator, so that chunks of
+        re-indexed files that duplicate them are merged into them instead of
+        being stored again. The stored duplicate_sources and duplicate_count
+        metadata of these chunks is not rewritten; the manifest's
+        duplicate_ids record which files share them.
         
-        # Load markdown files
-        try:
-            md_loader = DirectoryLoader(
-                str(self.documents_dir),
-                glob="**/*.md",
-                loader_cls=TextLoader,
-                show_progress=True
+        Args:
+            vectorstore: ChromaDB vector store instance
+            chunk_ids: IDs of the stored chunks
+        """
+        if self.deduplicator is None or not chunk_ids:
+            return
+        for i in range(0, len(chunk_ids), self.write_batch_size):
+            stored = vectorstore._collection.get(
+                ids=chunk_ids[i:i + self.write_batch_size],
+                include=["documents", "metadatas"]
             )
-            md_docs = md_loader.load()
-            all_documents.extend(md_docs)
-            logger.info(f"Loaded {len(md_docs)} Markdown documents")
-        except Exception as e:
-            logger.warning(f"Error loading Markdown files: {e}")
+            self.deduplicator.seed([
+                Document(page_content=text, metadata=metadata or {})
+                for text, metadata in zip(stored["documents"], stored["metadatas"])
+            ])
+    
+    def _delete_stale_chunks(self, vectorstore: Chroma, keep_ids: set) -> int:
+        """
+        Delete every chunk in the collection whose ID was not written by this run.
         
-        logger.info(f"Total documents loaded: {len(all_documents)}")
-        return all_documents
+        Args:
+            vectorstore: ChromaDB vector store instance
+            keep_ids: IDs of the chunks that make up the current corpus
+            
+        Returns:
+            Number of deleted chunks
+        """
+        existing_ids = vectorstore.get(include=[])["ids"]
+        stale_ids = [chunk_id for chunk_id in existing_ids if chunk_id not in keep_ids]
+        self._delete_ids(vectorstore, stale_ids)
+        return len(stale_ids)
+    
+    def _update_duplicate_metadata(self, vectorstore: Chroma) -> None:
+        """
+        Rewrite the metadata of the chunks stored by this run that had
+        duplicates dropped in their favour. In streaming runs a duplicate can
+        turn up after its kept chunk was written, so the stored
+        duplicate_sources and duplicate_count would miss it. Only metadata is
+        updated; nothing is embedded again.
+        
+        Args:
+            vectorstore: ChromaDB vector store instance
+        """
+        if self.deduplicator is None:
+            return
+        chunks = self.deduplicator.updated_chunks()
+        ids, _ = self._assign_chunk_ids(chunks)
+        for i in range(0, len(chunks), self.write_batch_size):
+            vectorstore._collection.update(
+                ids=ids[i:i + self.write_batch_size],
+                metadatas=[chunk.metadata for chunk in chunks[i:i + self.write_batch_size]]
+            )
+        if chunks:
+            logger.info(f"Updated duplicate metadata of {len(chunks)} stored chunks")
+    
+    def _delete_ids(self, vectorstore: Chroma, ids: List[str]) -> None:
+        """Delete chunks from the vector store in bounded batches."""
+        for i in range(0, len(ids), self.write_batch_size):
+            vectorstore.delete(ids=ids[i:i + self.write_batch_size])
+        if ids:
+            logger.info(f"Deleted {len(ids)} stale chunks")
+    
+    def _manifest_settings(self) -> Dict:
+        """Settings that invalidate previously indexed chunks when changed."""
+        return {
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "embedding_model": self.embedding_model,
+            "collection_name": COLLECTION_NAME,
+            "filter_fields": list(FILTER_FIELDS),
+        }
+    
+    def _open_vectorstore(self) -> Chroma:
+        """Open the persisted ChromaDB collection."""
+        ensure_directories_exist([self.persist_dir])
+        return Chroma(
+            persist_directory=str(self.persist_dir),
+            embedding_function=self.embeddings,
+            collection_name=COLLECTION_NAME
+        )
     
     def chunk_documents(self, documents: List) -> List:
         """
-        Split documents into chunks using RecursiveCharacterTextSplitter.
+        Split documents into chunks using the recursive character chunker.
         
         Args:
             documents: List of Document objects
@@ -178,12 +400,320 @@ class DocumentIndexer:
         logger.info(f"Created {len(chunks)} chunks")
         return chunks
     
-    def create_vectorstore(self, chunks: List) -> Chroma:
+    def _reset_deduplicator(self) -> None:
+        """Start a fresh deduplication state for an indexing run."""
+        self.deduplicator = ChunkDeduplicator(
+            threshold=DEDUP_SIMILARITY_THRESHOLD,
+            num_perm=DEDUP_NUM_PERM,
+            bands=DEDUP_BANDS
+        ) if self.deduplicate else None
+    
+    def deduplicate_chunks(self, chunks: List) -> List:
+        """
+        Drop exact and near-duplicate chunks, merging their sources into the kept chunk.
+        
+        Args:
+            chunks: List of document chunks
+            
+        Returns:
+            List of unique chunks
+        """
+        if self.deduplicator is None:
+            return chunks
+        return self.deduplicator.deduplicate(chunks)
+    
+    def _log_dedup_stats(self) -> None:
+        """Log how many chunks and bytes deduplication saved."""
+        if self.deduplicator is None:
+            return
+        stats = self.deduplicator.stats()
+        logger.info(
+            f"Deduplication removed {stats['chunks_removed']} of {stats['chunks_seen']} chunks "
+            f"({stats['exact_duplicates']} exact, {stats['near_duplicates']} near-duplicate), "
+            f"saving {stats['bytes_saved'] / 1e6:.2f} MB"
+        )
+    
+    def store_chunks(self, vectorstore: Chroma, chunks: List, ids: List[str]) -> None:
+        """
+        Embed chunks and write them to the vector store in bounded batches.
+        
+        Args:
+            vectorstore: ChromaDB vector store instance
+            chunks: List of document chunks
+            ids: Chunk IDs, one per chunk
+        """
+        start = time.perf_counter()
+        
+        with tqdm(total=len(chunks), desc="Embedding chunks", unit="chunk") as progress:
+            for i in range(0, len(chunks), self.write_batch_size):
+                batch = chunks[i:i + self.write_batch_size]
+                self._write_batch(vectorstore, batch, ids[i:i + self.write_batch_size])
+                progress.update(len(batch))
+        
+        self._log_throughput(len(chunks), time.perf_counter() - start)
+    
+    def _write_batch(self, vectorstore: Chroma, batch: List, ids: List[str]) -> None:
+        """Embed one batch of chunks and write it to the vector store."""
+        vectorstore.add_texts(
+            texts=[chunk.page_content for chunk in batch],
+            metadatas=[chunk.metadata for chunk in batch],
+            ids=ids
+        )
+    
+    def _log_throughput(self, num_chunks: int, elapsed: float) -> None:
+        """Log the embedding and storage rate."""
+        rate = num_chunks / elapsed if elapsed > 0 else 0.0
+        logger.info(f"Embedded and stored {num_chunks} chunks in {elapsed:.1f}s ({rate:.1f} chunks/s)")
+        
+        if self.embedding_cache is not None:
+            stats = self.embedding_cache.stats()
+            logger.info(
+                f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses "
+                f"({stats['hit_rate']:.1%} hit rate), {stats['evictions']} evictions, "
+                f"{stats['size_mb']:.1f} MB"
+            )
+    
+    def stream_chunks(self, file_paths: List[Path]) -> Iterator:
+        """
+        Lazily load and chunk files, one file at a time.
+        
+        Args:
+            file_paths: Paths of the documents to index
+            
+        Yields:
+            Document chunks
+        """
+        for path, documents in iter_load_files(
+            file_paths,
+            max_workers=self.loader_workers,
+            pdf_cache=self.pdf_cache,
+            pdf_pages_per_task=PDF_PAGES_PER_TASK
+        ):
+            if documents:
+                yield from self.deduplicate_chunks(self.text_splitter.split_documents(documents))
+    
+    def stream_index(self, vectorstore: Chroma, file_paths: List[Path]) -> Tuple[Dict[str, List[str]], int]:
+        """
+        Index files through a streaming pipeline.
+        Loading and chunking run in a background stage connected to the
+        embedding and storage stage by a bounded queue, so parsing overlaps
+        with embedding and only a few batches are held in memory at a time.
+        Duplicates of chunks from earlier batches are still dropped; once all
+        batches are stored, the kept chunks' metadata is rewritten to list
+        their sources.
+        
+        Args:
+            vectorstore: ChromaDB vector store instance
+            file_paths: Paths of the documents to index
+            
+        Returns:
+            Tuple of (mapping of relative file path to chunk IDs, number of chunks stored)
+        """
+        start = time.perf_counter()
+        ids_by_file = {}
+        total_chunks = 0
+        
+        batches = bounded_stage(
+            batched(self.stream_chunks(file_paths), self.write_batch_size),
+            maxsize=self.queue_size,
+            name="load-and-chunk"
+        )
+        
+        with tqdm(desc="Embedding chunks", unit="chunk") as progress:
+            for batch in batches:
+                ids, batch_ids_by_file = self._assign_chunk_ids(batch)
+                self._write_batch(vectorstore, batch, ids)
+                
+                for rel_path, file_ids in batch_ids_by_file.items():
+                    ids_by_file.setdefault(rel_path, []).extend(file_ids)
+                total_chunks += len(batch)
+                progress.update(len(batch))
+        
+        # Duplicates may turn up after their kept chunk's batch was written
+        self._update_duplicate_metadata(vectorstore)
+        
+        self._log_throughput(total_chunks, time.perf_counter() - start)
+        self._log_pdf_cache_stats()
+        return ids_by_file, total_chunks
+    
+    def _write_manifest(self, ids_by_file: Dict[str, List[str]]) -> None:
+        """
+        Replace the index manifest with the files indexed by a full run,
+        including files whose chunks were all dropped as duplicates.
+        
+        Args:
+            ids_by_file: Mapping of relative file path to chunk IDs
+        """
+        manifest = IndexManifest(self.manifest_path, settings=self._manifest_settings())
+        duplicate_ids_by_file = self._duplicate_ids_by_file()
+        for rel_path in sorted(set(ids_by_file) | set(duplicate_ids_by_file)):
+            source_path = self.documents_dir / rel_path
+            if source_path.exists():
+                manifest.update(
+                    rel_path,
+                    compute_file_hash(source_path),
+                    ids_by_file.get(rel_path, []),
+                    duplicate_ids_by_file.get(rel_path)
+                )
+        manifest.save()
+    
+    def build_sparse_index(self, vectorstore: Chroma, streaming: bool = False) -> SparseIndex:
+        """
+        Build the BM25 index over everything now stored in the collection and
+        write it to disk, so the app can memory-map it instead of rebuilding it.
+        Chunk texts and metadata are stored in the index to serve search results.
+        
+        Args:
+            vectorstore: ChromaDB vector store instance
+            streaming: Read the collection in pages of write_batch_size chunks and
+                write each page as an index segment, instead of loading it whole
+            
+        Returns:
+            SparseIndex instance
+        """
+        logger.info("Building sparse (BM25) index...")
+        start = time.perf_counter()
+        
+        if streaming:
+            sparse_index = SparseIndex.build_on_disk(self._stored_pages(vectorstore), self.sparse_index_dir)
+        else:
+            stored = vectorstore._collection.get(include=["documents", "metadatas"])
+            sparse_index = SparseIndex.build(stored["documents"], doc_ids=stored["ids"], metadatas=stored["metadatas"])
+            sparse_index.save(self.sparse_index_dir)
+        
+        logger.info(f"Sparse index built in {time.perf_counter() - start:.1f}s")
+        return sparse_index
+    
+    def _stored_pages(self, vectorstore: Chroma) -> Iterator[Tuple[List[str], List[str], List[Dict]]]:
+        """Read the collection's (texts, chunk IDs, metadatas) in pages of write_batch_size chunks."""
+        total = vectorstore._collection.count()
+        for offset in range(0, total, self.write_batch_size):
+            stored = vectorstore._collection.get(
+                limit=self.write_batch_size,
+                offset=offset,
+                include=["documents", "metadatas"]
+            )
+            yield stored["documents"], stored["ids"], stored["metadatas"]
+    
+    def update_sparse_index(self, vectorstore: Chroma, removed_ids: List[str], added_ids: List[str],
+                            streaming: bool = False) -> SparseIndex:
+        """
+        Apply an incremental run to the persisted BM25 index: delete the chunks of
+        changed and removed files and add the newly written chunks as a new segment.
+        Falls back to a full build if there is no usable index yet.
+        
+        Args:
+            vectorstore: ChromaDB vector store instance
+            removed_ids: Chunk IDs no longer valid
+            added_ids: Chunk IDs written by this run
+            streaming: Read the added chunks (and the collection, for a full
+                build) in pages of write_batch_size chunks
+            
+        Returns:
+            SparseIndex instance
+        """
+        sparse_index = None
+        if sparse_index_exists(self.sparse_index_dir):
+            try:
+                sparse_index = SparseIndex.load(self.sparse_index_dir)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Rebuilding sparse index: {e}")
+        
+        if sparse_index is None:
+            return self.build_sparse_index(vectorstore, streaming=streaming)
+        
+        num_removed = sparse_index.remove_documents(removed_ids)
+        page_size = self.write_batch_size if streaming else max(len(added_ids), 1)
+        for first in range(0, len(added_ids), page_size):
+            stored = vectorstore._collection.get(ids=added_ids[first:first + page_size], include=["documents", "metadatas"])
+            sparse_index.add_documents(stored["documents"], stored["ids"], stored["metadatas"])
+        if not added_ids:
+            sparse_index.maybe_merge()
+        
+        if sparse_index.num_docs != vectorstore._collection.count():
+            logger.warning("Sparse index out of sync with the vector store; rebuilding it")
+            return self.build_sparse_index(vectorstore, streaming=streaming)
+        
+        sparse_index.save(self.sparse_index_dir)
+        logger.info(
+            f"Sparse index updated: {len(added_ids)} chunks added, {num_removed} removed, "
+            f"{len(sparse_index.segments)} segment(s)"
+        )
+        return sparse_index
+    
+    def build_dense_index(self, vectorstore: Chroma, sparse_index: SparseIndex) -> Optional[DenseIndex]:
+        """
+        Copy the stored embeddings into the in-process dense index, one row per
+        live chunk of the sparse index in document number order, and write it
+        to disk. Rebuilt in full on every run (embeddings are only read back
+        from ChromaDB, not recomputed).
+        
+        Args:
+            vectorstore: ChromaDB vector store instance
+            sparse_index: Saved sparse index the rows are aligned with
+            
+        Returns:
+            DenseIndex instance, or None if no dense index is configured
+        """
+        if self.dense_index_dir is None:
+            return None
+        
+        logger.info("Building in-process dense index...")
+        start = time.perf_counter()
+        
+        # Global document numbers and chunk IDs of the live chunks
+        doc_numbers, doc_ids = [], []
+        base = 0
+        for segment in sparse_index.segments:
+            live = segment.live_mask()
+            for local in np.flatnonzero(live).tolist():
+                doc_numbers.append(base + local)
+                doc_ids.append(segment.doc_ids[local])
+            base += segment.num_docs
+        
+        def fetch(first: int) -> Tuple[np.ndarray, np.ndarray]:
+            batch_ids = doc_ids[first:first + self.write_batch_size]
+            stored = vectorstore._collection.get(ids=batch_ids, include=["embeddings"])
+            rows = dict(zip(stored["ids"], stored["embeddings"]))
+            missing = [chunk_id for chunk_id in batch_ids if chunk_id not in rows]
+            if missing:
+                raise ValueError(f"{len(missing)} chunks of the sparse index have no stored embedding")
+            numbers = np.asarray(doc_numbers[first:first + len(batch_ids)], dtype=np.int64)
+            return numbers, np.asarray([rows[chunk_id] for chunk_id in batch_ids], dtype=np.float32)
+        
+        # The first batch gives the embedding dimension
+        first_batch = fetch(0) if doc_ids else (np.zeros(0, dtype=np.int64), np.zeros((0, 0), dtype=np.float32))
+        batches = itertools.chain(
+            [first_batch],
+            (fetch(first) for first in range(self.write_batch_size, len(doc_ids), self.write_batch_size))
+        )
+        
+        dense_index = DenseIndex.build(
+            self.dense_index_dir,
+            batches,
+            num_rows=len(doc_ids),
+            dimension=first_batch[1].shape[1],
+            space=(vectorstore._collection.metadata or {}).get("hnsw:space", "l2"),
+            sparse_state=sparse_index.commit_state(self.sparse_index_dir),
+            hnsw_threshold=DENSE_HNSW_THRESHOLD,
+            hnsw_m=DENSE_HNSW_M,
+            hnsw_ef_construction=DENSE_HNSW_EF_CONSTRUCTION,
+            quantization=DENSE_QUANTIZATION,
+            pq_subvectors=DENSE_PQ_SUBVECTORS,
+            rescore_factor=DENSE_RESCORE_FACTOR,
+            recall_k=DENSE_TOP_K
+        )
+        
+        logger.info(f"Dense index built with {dense_index.num_rows} embeddings in {time.perf_counter() - start:.1f}s")
+        return dense_index
+    
+    def create_vectorstore(self, chunks: List, ids: List[str] = None) -> Chroma:
         """
         Create ChromaDB vector store from document chunks.
         
         Args:
             chunks: List of document chunks
+            ids: Optional chunk IDs (derived from chunk sources if omitted)
             
         Returns:
             ChromaDB vector store instance
@@ -191,30 +721,188 @@ class DocumentIndexer:
         logger.info("Creating ChromaDB vector store...")
         logger.info(f"Persist directory: {self.persist_dir}")
         
-        # Ensure persist directory exists
-        ensure_directories_exist([self.persist_dir])
+        # Ensure persist directory exists and open the collection
+        vectorstore = self._open_vectorstore()
         
-        # Create vector store with progress bar
         logger.info("Generating embeddings and storing in ChromaDB...")
         logger.info("This may take several minutes depending on the number of documents...")
         
-        vectorstore = Chroma.from_documents(
-            documents=chunks,
-            embedding=self.embeddings,
-            persist_directory=str(self.persist_dir),
-            collection_name=COLLECTION_NAME
-        )
+        if ids is None:
+            ids, _ = self._assign_chunk_ids(chunks)
+        self.store_chunks(vectorstore, chunks, ids)
         
         logger.info(f"Vector store created with {len(chunks)} chunks")
         return vectorstore
     
-    def index_documents(self) -> Chroma:
+    def update_index(self, streaming: bool = False) -> Chroma:
+        """
+        Incrementally update the vector store from the index manifest.
+        Only new or changed files are loaded and embedded; chunks of changed
+        and removed files are deleted once no other file shares them. Files
+        whose duplicate chunks were merged into a chunk of a changed or
+        removed file are re-indexed too, so their content stays stored.
+        Re-indexed files are deduplicated against each other and against the
+        chunks still stored for the other files (hashed again on every run
+        that re-indexes anything, which is cheap next to embedding).
+        
+        Args:
+            streaming: Load, chunk and embed through the streaming pipeline
+        
+        Returns:
+            ChromaDB vector store instance
+        """
+        logger.info("=" * 70)
+        logger.info("STARTING INCREMENTAL INDEXING")
+        logger.info("=" * 70)
+        
+        manifest = IndexManifest(self.manifest_path, settings=self._manifest_settings())
+        manifest.load()
+        self._reset_deduplicator()
+        
+        files = self.scan_documents()
+        current_hashes = {rel_path: compute_file_hash(path) for rel_path, path in files.items()}
+        added, changed, removed = manifest.diff(current_hashes)
+        
+        # Unchanged files that share chunks of changed or removed files
+        dependent = manifest.dependent_files(changed + removed)
+        
+        logger.info(
+            f"Files: {len(added)} new, {len(changed)} changed, {len(removed)} removed, "
+            f"{len(files) - len(added) - len(changed)} unchanged"
+            + (f" ({len(dependent)} re-indexed for shared duplicate chunks)" if dependent else "")
+        )
+        
+        vectorstore = self._open_vectorstore()
+        
+        # Step 1: Collect the chunk IDs previously stored for changed, removed and
+        # dependent files
+        reindexed = sorted(added + changed + dependent)
+        previous_ids = set()
+        for rel_path in changed + removed + dependent:
+            previous_ids.update(manifest.chunk_ids(rel_path))
+            manifest.remove(rel_path)
+        
+        # Step 2: Load, chunk and upsert new, changed and dependent files, dropping
+        # duplicates of the chunks the other files keep stored
+        if reindexed:
+            self._seed_deduplicator(vectorstore, sorted(manifest.referenced_ids()))
+        file_paths = [files[rel_path] for rel_path in reindexed]
+        
+        if streaming:
+            ids_by_file, num_chunks = self.stream_index(vectorstore, file_paths)
+        else:
+            documents = load_files(
+                file_paths,
+                max_workers=self.loader_workers,
+                pdf_cache=self.pdf_cache,
+                pdf_pages_per_task=PDF_PAGES_PER_TASK
+            )
+            self._log_pdf_cache_stats()
+            chunks = self.deduplicate_chunks(self.chunk_documents(documents)) if documents else []
+            num_chunks = len(chunks)
+            
+            if chunks:
+                ids, ids_by_file = self._assign_chunk_ids(chunks)
+                logger.info("Generating embeddings and storing in ChromaDB...")
+                self.store_chunks(vectorstore, chunks, ids)
+            else:
+                ids_by_file = {}
+        
+        self._log_dedup_stats()
+        
+        # Step 3: Record what is now stored, including files whose chunks were
+        # all dropped as duplicates
+        duplicate_ids_by_file = self._duplicate_ids_by_file()
+        for rel_path in reindexed:
+            if rel_path in ids_by_file or rel_path in duplicate_ids_by_file:
+                manifest.update(
+                    rel_path,
+                    current_hashes[rel_path],
+                    ids_by_file.get(rel_path, []),
+                    duplicate_ids_by_file.get(rel_path)
+                )
+        manifest.save()
+        
+        # Step 4: Delete previous chunks that no file references any more
+        written_ids = {chunk_id for file_ids in ids_by_file.values() for chunk_id in file_ids}
+        referenced_ids = manifest.referenced_ids()
+        stale_ids = sorted(chunk_id for chunk_id in previous_ids if chunk_id not in referenced_ids)
+        self._delete_ids(vectorstore, stale_ids)
+        
+        sparse_index = self.update_sparse_index(
+            vectorstore, stale_ids, sorted(written_ids), streaming=streaming
+        )
+        self.build_dense_index(vectorstore, sparse_index)
+        
+        logger.info("=" * 70)
+        logger.info("INCREMENTAL INDEXING COMPLETED SUCCESSFULLY")
+        logger.info("=" * 70)
+        logger.info(f"Files re-indexed: {len(reindexed)}")
+        logger.info(f"Chunks added: {num_chunks}, chunks deleted: {len(stale_ids)}")
+        logger.info("=" * 70)
+        
+        return vectorstore
+    
+    def index_documents_streaming(self) -> Chroma:
+        """
+        Run the complete indexing pipeline in streaming mode.
+        Memory use stays flat regardless of corpus size: chunks are embedded
+        and stored a batch at a time, and the BM25 index is built from pages
+        of the collection, one segment per page (only segment merges read
+        more than a page, from memory-mapped segments).
+        
+        Returns:
+            ChromaDB vector store instance
+        """
+        logger.info("=" * 70)
+        logger.info("STARTING STREAMING INDEXING PIPELINE")
+        logger.info("=" * 70)
+        
+        files = self.scan_documents()
+        logger.info(f"Found {len(files)} files in: {self.documents_dir}")
+        
+        self._reset_deduplicator()
+        vectorstore = self._open_vectorstore()
+        ids_by_file, num_chunks = self.stream_index(vectorstore, list(files.values()))
+        self._log_dedup_stats()
+        
+        if num_chunks == 0:
+            logger.error("No documents loaded! Please add documents to the documents/ directory.")
+            raise ValueError("No documents found to index")
+        
+        self._delete_stale_chunks(
+            vectorstore,
+            {chunk_id for file_ids in ids_by_file.values() for chunk_id in file_ids}
+        )
+        self._write_manifest(ids_by_file)
+        self.build_dense_index(vectorstore, self.build_sparse_index(vectorstore, streaming=True))
+        
+        logger.info("=" * 70)
+        logger.info("INDEXING PIPELINE COMPLETED SUCCESSFULLY")
+        logger.info("=" * 70)
+        logger.info(f"Total files processed: {len(ids_by_file)}")
+        logger.info(f"Total chunks created: {num_chunks}")
+        logger.info(f"Vector store location: {self.persist_dir}")
+        logger.info("=" * 70)
+        
+        return vectorstore
+    
+    def index_documents(self, incremental: bool = False, streaming: bool = False) -> Chroma:
         """
         Run the complete indexing pipeline.
         
+        Args:
+            incremental: Only re-index files that changed since the last run
+            streaming: Overlap loading, chunking and embedding with bounded memory
+        
         Returns:
             ChromaDB vector store instance
         """
+        if incremental:
+            return self.update_index(streaming=streaming)
+        if streaming:
+            return self.index_documents_streaming()
+        
         logger.info("=" * 70)
         logger.info("STARTING INDEXING PIPELINE")
         logger.info("=" * 70)
@@ -226,11 +914,23 @@ class DocumentIndexer:
             logger.error("No documents loaded! Please add documents to the documents/ directory.")
             raise ValueError("No documents found to index")
         
-        # Step 2: Chunk documents
+        # Step 2: Chunk documents and drop duplicates
         chunks = self.chunk_documents(documents)
+        self._reset_deduplicator()
+        chunks = self.deduplicate_chunks(chunks)
+        self._log_dedup_stats()
         
         # Step 3: Create vector store
-        vectorstore = self.create_vectorstore(chunks)
+        ids, ids_by_file = self._assign_chunk_ids(chunks)
+        vectorstore = self.create_vectorstore(chunks, ids=ids)
+        self._delete_stale_chunks(vectorstore, set(ids))
+        
+        # Step 4: Record indexed files for later incremental runs
+        self._write_manifest(ids_by_file)
+        
+        # Step 5: Persist the BM25 index (and the dense index, if enabled) for the app
+        sparse_index = self.build_sparse_index(vectorstore)
+        self.build_dense_index(vectorstore, sparse_index)
         
         logger.info("=" * 70)
         logger.info("INDEXING PIPELINE COMPLETED SUCCESSFULLY")
@@ -246,6 +946,19 @@ class DocumentIndexer:
 def main():
     """Main function to run the indexing pipeline."""
     
+    parser = argparse.ArgumentParser(description="Index documents into ChromaDB")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only re-index new, changed and removed files (uses the index manifest)"
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Stream documents through load, chunk, embed and store stages with bounded memory"
+    )
+    args = parser.parse_args()
+    
     # Setup logging
     setup_logging("INFO")
     
@@ -268,7 +981,10 @@ def main():
         )
         
         # Run indexing
-        vectorstore = indexer.index_documents()
+        vectorstore = indexer.index_documents(
+            incremental=args.incremental,
+            streaming=args.streaming
+        )
         
         logger.info("\n✅ SUCCESS: Documents indexed and ready for retrieval")
         logger.info(f"You can now run the chatbot application: streamlit run app.py")
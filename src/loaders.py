@@ -0,0 +1,239 @@
+"""
+Document loading for the indexing pipeline.
+Scans the documents directory once and parses files in parallel worker processes.
+PDFs are split into page ranges so the pages of a single large PDF are also
+extracted in parallel, and their text is cached on disk.
+"""
+
+import logging
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from langchain_community.document_loaders import (
+    TextLoader,
+    PyPDFLoader,
+    Docx2txtLoader
+)
+from langchain_core.documents import Document
+from tqdm import tqdm
+
+from src.manifest import compute_file_hash
+from src.pdf_loader import PdfPageCache, count_pdf_pages, extract_pdf_pages, split_page_ranges
+
+logger = logging.getLogger(__name__)
+
+# Loader used for each supported file extension
+LOADER_MAPPING = {
+    ".pdf": PyPDFLoader,
+    ".txt": TextLoader,
+    ".docx": Docx2txtLoader,
+    ".md": TextLoader,
+}
+
+
+def scan_documents(documents_dir: Path) -> Dict[str, Path]:
+    """
+    Find all loadable files in a directory tree with a single walk.
+
+    Args:
+        documents_dir: Root directory to scan
+
+    Returns:
+        Mapping of path relative to documents_dir (POSIX style) to absolute path
+    """
+    files = {}
+    for root, dirs, filenames in os.walk(documents_dir):
+        dirs.sort()
+        for filename in sorted(filenames):
+            if Path(filename).suffix.lower() in LOADER_MAPPING:
+                path = Path(root) / filename
+                files[path.relative_to(documents_dir).as_posix()] = path
+    return files
+
+
+def load_file(file_path: Path) -> List:
+    """
+    Load a single document with the loader matching its extension.
+    Defined at module level so it can run in a worker process.
+
+    Args:
+        file_path: Path to the document
+
+    Returns:
+        List of loaded Document objects (empty on failure)
+    """
+    loader_cls = LOADER_MAPPING.get(Path(file_path).suffix.lower())
+    if loader_cls is None:
+        logger.warning(f"Unsupported file type: {file_path}")
+        return []
+
+    try:
+        return loader_cls(str(file_path)).load()
+    except Exception as e:
+        logger.warning(f"Error loading {file_path}: {e}")
+        return []
+
+
+def load_files(
+    file_paths: List[Path],
+    max_workers: Optional[int] = None,
+    pdf_cache: Optional[PdfPageCache] = None,
+    pdf_pages_per_task: int = 16
+) -> List:
+    """
+    Load several documents, parsing them in parallel worker processes.
+
+    Args:
+        file_paths: Paths of the documents to load
+        max_workers: Number of worker processes (defaults to the CPU count,
+            1 loads in the current process)
+        pdf_cache: Optional cache of extracted PDF page text
+        pdf_pages_per_task: Number of PDF pages extracted per worker task
+
+    Returns:
+        List of loaded Document objects, in the order of file_paths
+    """
+    documents = []
+    with tqdm(total=len(file_paths), desc="Loading documents", unit="file") as progress:
+        for _, file_docs in iter_load_files(
+            file_paths,
+            max_workers=max_workers,
+            pdf_cache=pdf_cache,
+            pdf_pages_per_task=pdf_pages_per_task
+        ):
+            documents.extend(file_docs)
+            progress.update(1)
+    return documents
+
+
+class _SerialExecutor:
+    """Executor stand-in that runs each task immediately in the calling process."""
+
+    def submit(self, fn, *args) -> Future:
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class _PendingFile:
+    """A file whose loading tasks have been submitted but not yet collected."""
+
+    def __init__(self, path: Path, futures: List[Future], file_hash: Optional[str] = None,
+                 pages: Optional[List[str]] = None):
+        self.path = path
+        self.futures = futures
+        self.file_hash = file_hash
+        self.pages = pages
+
+    @property
+    def is_pdf(self) -> bool:
+        return self.path.suffix.lower() == ".pdf"
+
+
+def _submit_file(
+    executor,
+    path: Path,
+    pdf_cache: Optional[PdfPageCache],
+    pdf_pages_per_task: int
+) -> _PendingFile:
+    """Submit the tasks that load one file (one per page range for PDFs)."""
+    if path.suffix.lower() != ".pdf":
+        return _PendingFile(path, [executor.submit(load_file, path)])
+
+    try:
+        file_hash = compute_file_hash(path) if pdf_cache is not None else None
+        if file_hash is not None:
+            pages = pdf_cache.get(file_hash)
+            if pages is not None:
+                return _PendingFile(path, [], file_hash, pages)
+
+        ranges = split_page_ranges(count_pdf_pages(path), pdf_pages_per_task)
+    except Exception as e:
+        logger.warning(f"Error loading {path}: {e}")
+        return _PendingFile(path, [], pages=[])
+
+    futures = [
+        executor.submit(extract_pdf_pages, path, page_range.start, page_range.stop)
+        for page_range in ranges
+    ]
+    return _PendingFile(path, futures, file_hash)
+
+
+def _collect_file(pending: _PendingFile, pdf_cache: Optional[PdfPageCache]) -> List:
+    """Wait for a file's loading tasks and assemble its Documents."""
+    try:
+        if not pending.is_pdf:
+            return pending.futures[0].result()
+
+        pages = pending.pages
+        if pages is None:
+            pages = [text for future in pending.futures for text in future.result()]
+            if pdf_cache is not None and pending.file_hash is not None:
+                pdf_cache.put(pending.file_hash, pages)
+    except Exception as e:
+        logger.warning(f"Error loading {pending.path}: {e}")
+        return []
+
+    # Same content and metadata as PyPDFLoader
+    return [
+        Document(page_content=text, metadata={"source": str(pending.path), "page": page_number})
+        for page_number, text in enumerate(pages)
+    ]
+
+
+def iter_load_files(
+    file_paths: List[Path],
+    max_workers: Optional[int] = None,
+    max_pending: Optional[int] = None,
+    pdf_cache: Optional[PdfPageCache] = None,
+    pdf_pages_per_task: int = 16
+) -> Iterator[Tuple[Path, List]]:
+    """
+    Lazily load documents in worker processes, keeping a bounded number of files in flight.
+
+    Args:
+        file_paths: Paths of the documents to load
+        max_workers: Number of worker processes (defaults to the CPU count,
+            1 loads in the current process)
+        max_pending: Maximum number of files submitted but not yet consumed
+            (defaults to twice the number of workers)
+        pdf_cache: Optional cache of extracted PDF page text
+        pdf_pages_per_task: Number of PDF pages extracted per worker task
+
+    Yields:
+        Tuples of (file path, loaded Document objects), in the order of file_paths
+    """
+    if not file_paths:
+        return
+
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending = max_pending or max_workers * 2
+
+    if max_workers == 1:
+        executor = _SerialExecutor()
+    else:
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+
+    with executor:
+        pending = deque()
+        for path in file_paths:
+            pending.append(_submit_file(executor, Path(path), pdf_cache, pdf_pages_per_task))
+            if len(pending) >= max_pending:
+                done = pending.popleft()
+                yield done.path, _collect_file(done, pdf_cache)
+
+        while pending:
+            done = pending.popleft()
+            yield done.path, _collect_file(done, pdf_cache)
@@ -0,0 +1,207 @@
+"""
+Index manifest for incremental re-indexing.
+Tracks the content hash of every indexed file, the chunk IDs stored for it in
+ChromaDB, and the IDs of other files' chunks its duplicate chunks were merged into.
+"""
+
+import hashlib
+import itertools
+import json
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Bump when the manifest layout changes so old manifests are discarded
+MANIFEST_VERSION = 1
+
+
+def compute_file_hash(file_path: Path, block_size: int = 1 << 20) -> str:
+    """
+    Compute the SHA-256 hash of a file's content.
+
+    Args:
+        file_path: Path to the file
+        block_size: Number of bytes read per iteration
+
+    Returns:
+        Hex digest of the file content
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IndexManifest:
+    """
+    Persisted record of what is currently stored in the vector store.
+    Maps each source file (relative to the documents directory) to its
+    content hash, the IDs of the chunks created from it, and the IDs of the
+    chunks of other files that stand in for its deduplicated chunks. A chunk
+    stays stored while any file lists it under either.
+    """
+
+    def __init__(self, manifest_path: Path, settings: Optional[Dict] = None):
+        """
+        Initialize the manifest.
+
+        Args:
+            manifest_path: Location of the JSON manifest file
+            settings: Indexing settings (chunking, embedding model) the chunks were
+                built with. A change in settings invalidates every file hash.
+        """
+        self.manifest_path = manifest_path
+        self.settings = settings or {}
+        self.files: Dict[str, Dict] = {}
+
+    def load(self) -> None:
+        """Load the manifest from disk, if present."""
+        if not self.manifest_path.exists():
+            logger.info(f"No index manifest found at: {self.manifest_path}")
+            return
+
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read index manifest, starting fresh: {e}")
+            return
+
+        if data.get("version") != MANIFEST_VERSION:
+            logger.warning("Index manifest version mismatch, starting fresh")
+            return
+
+        self.files = data.get("files", {})
+
+        if data.get("settings") != self.settings:
+            # Keep the chunk IDs so they can be deleted, but force every file to be re-indexed
+            logger.warning("Indexing settings changed since last run, all files will be re-indexed")
+            for entry in self.files.values():
+                entry["hash"] = None
+
+        logger.info(f"Loaded index manifest with {len(self.files)} files")
+
+    def save(self) -> None:
+        """Write the manifest to disk atomically."""
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": MANIFEST_VERSION,
+            "settings": self.settings,
+            "files": self.files,
+        }
+
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        tmp_path.replace(self.manifest_path)
+
+        logger.info(f"Index manifest saved with {len(self.files)} files")
+
+    def diff(self, current_hashes: Dict[str, str]) -> Tuple[List[str], List[str], List[str]]:
+        """
+        Compare the manifest against the current state of the documents directory.
+
+        Args:
+            current_hashes: Mapping of relative file path to content hash
+
+        Returns:
+            Tuple of (added, changed, removed) relative file paths
+        """
+        added = []
+        changed = []
+
+        for rel_path, file_hash in current_hashes.items():
+            entry = self.files.get(rel_path)
+            if entry is None:
+                added.append(rel_path)
+            elif entry.get("hash") != file_hash:
+                changed.append(rel_path)
+
+        removed = [rel_path for rel_path in self.files if rel_path not in current_hashes]
+
+        return sorted(added), sorted(changed), sorted(removed)
+
+    def chunk_ids(self, rel_path: str) -> List[str]:
+        """
+        Get the chunk IDs recorded for a file.
+
+        Args:
+            rel_path: Relative path of the source file
+
+        Returns:
+            List of chunk IDs (empty if the file is unknown)
+        """
+        return list(self.files.get(rel_path, {}).get("chunk_ids", []))
+
+    def referenced_ids(self) -> Set[str]:
+        """
+        Get the IDs of all chunks some file still needs.
+
+        Returns:
+            Set of chunk IDs stored for or shared with any file in the manifest
+        """
+        return {
+            chunk_id
+            for entry in self.files.values()
+            for chunk_id in itertools.chain(entry.get("chunk_ids", []), entry.get("duplicate_ids", []))
+        }
+
+    def dependent_files(self, rel_paths: List[str]) -> List[str]:
+        """
+        Find the files whose duplicate chunks were merged into chunks of the
+        given files, directly or through other dependent files. They have to
+        be re-indexed when the given files change or are removed.
+
+        Args:
+            rel_paths: Relative paths of the changed and removed files
+
+        Returns:
+            Sorted relative paths of the dependent files (not including rel_paths)
+        """
+        affected = set(rel_paths)
+        dropped_ids = {chunk_id for rel_path in rel_paths for chunk_id in self.chunk_ids(rel_path)}
+        dependents = []
+
+        found = True
+        while found:
+            found = False
+            for rel_path, entry in self.files.items():
+                if rel_path not in affected and dropped_ids.intersection(entry.get("duplicate_ids", [])):
+                    affected.add(rel_path)
+                    dependents.append(rel_path)
+                    dropped_ids.update(entry.get("chunk_ids", []))
+                    found = True
+
+        return sorted(dependents)
+
+    def update(self, rel_path: str, file_hash: str, chunk_ids: List[str],
+               duplicate_ids: Optional[List[str]] = None) -> None:
+        """
+        Record the hash and chunk IDs of an indexed file.
+
+        Args:
+            rel_path: Relative path of the source file
+            file_hash: Content hash of the file
+            chunk_ids: IDs of the chunks stored for the file
+            duplicate_ids: IDs of other files' chunks its duplicate chunks were merged into
+        """
+        entry = {"hash": file_hash, "chunk_ids": list(chunk_ids)}
+        if duplicate_ids:
+            entry["duplicate_ids"] = sorted(set(duplicate_ids))
+        self.files[rel_path] = entry
+
+    def remove(self, rel_path: str) -> None:
+        """
+        Forget a file.
+
+        Args:
+            rel_path: Relative path of the source file
+        """
+        self.files.pop(rel_path, None)
+
+    def reset(self) -> None:
+        """Forget all files."""
+        self.files = {}
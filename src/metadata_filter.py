@@ -0,0 +1,141 @@
+"""
+Metadata filters for retrieval.
+Every chunk records the top-level folder of its source file under the
+documents directory ("folder", e.g. "policies"), the file extension
+("file_type", e.g. "pdf") and, for PDFs, its page number ("page"). A filter
+restricts a search to chunks matching any combination of these; it is applied
+before scoring, as a ChromaDB `where` clause on the dense side and as document
+bitmaps in the sparse index.
+"""
+
+from pathlib import PurePosixPath
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# Categorical metadata fields a filter can select values of
+FILTER_FIELDS = ("folder", "file_type")
+
+
+def source_fields(rel_path: str) -> Dict[str, str]:
+    """
+    Filterable metadata of a source file.
+
+    Args:
+        rel_path: Path of the file relative to the documents directory (POSIX)
+
+    Returns:
+        Dict with the top-level "folder" ("" for files at the root) and the
+        lower-case extension "file_type" (without the dot)
+    """
+    path = PurePosixPath(rel_path)
+    return {
+        "folder": path.parts[0] if len(path.parts) > 1 else "",
+        "file_type": path.suffix.lower().lstrip("."),
+    }
+
+
+class MetadataFilter:
+    """
+    Restriction of a search to chunks from some folders, file types and/or a
+    page range. Criteria left as None do not restrict; values within a
+    criterion are alternatives (OR), and criteria are combined with AND.
+    """
+
+    def __init__(
+        self,
+        folders: Optional[Iterable[str]] = None,
+        file_types: Optional[Iterable[str]] = None,
+        page_range: Optional[Tuple[Optional[int], Optional[int]]] = None
+    ):
+        """
+        Initialize the filter.
+
+        Args:
+            folders: Top-level folders under the documents directory
+            file_types: File extensions, with or without the dot (case-insensitive)
+            page_range: Inclusive (first, last) page numbers as stored in the
+                chunk metadata (0-based for PDFs); either end may be None.
+                Chunks without a page number are excluded.
+        """
+        self.folders = tuple(sorted(set(folders))) if folders is not None else None
+        self.file_types = (
+            tuple(sorted({file_type.lower().lstrip(".") for file_type in file_types}))
+            if file_types is not None else None
+        )
+        if page_range is not None and page_range[0] is None and page_range[1] is None:
+            page_range = None
+        self.page_range = tuple(page_range) if page_range is not None else None
+
+    def values(self, field: str) -> Optional[Tuple[str, ...]]:
+        """Accepted values of a categorical field (None = any value)."""
+        return {"folder": self.folders, "file_type": self.file_types}[field]
+
+    @property
+    def key(self) -> Tuple:
+        """Hashable form of the filter (for caching)."""
+        return self.folders, self.file_types, self.page_range
+
+    @property
+    def is_empty(self) -> bool:
+        """True if the filter does not restrict anything."""
+        return self.folders is None and self.file_types is None and self.page_range is None
+
+    @property
+    def matches_nothing(self) -> bool:
+        """True if no chunk can pass the filter (an empty value list or page range)."""
+        if any(self.values(field) == () for field in FILTER_FIELDS):
+            return True
+        if self.page_range is not None:
+            first, last = self.page_range
+            return first is not None and last is not None and first > last
+        return False
+
+    def where(self) -> Optional[Dict[str, Any]]:
+        """
+        Equivalent ChromaDB `where` clause.
+
+        Returns:
+            Metadata filter for collection queries, or None if the filter is empty
+        """
+        conditions = [
+            {field: {"$in": list(self.values(field))}}
+            for field in FILTER_FIELDS if self.values(field) is not None
+        ]
+        if self.page_range is not None:
+            first, last = self.page_range
+            if first is not None:
+                conditions.append({"page": {"$gte": first}})
+            if last is not None:
+                conditions.append({"page": {"$lte": last}})
+
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+    def matches(self, metadata: Dict[str, Any]) -> bool:
+        """
+        Check a chunk's metadata against the filter.
+
+        Args:
+            metadata: Chunk metadata
+
+        Returns:
+            True if the chunk passes the filter
+        """
+        for field in FILTER_FIELDS:
+            accepted = self.values(field)
+            if accepted is not None and metadata.get(field, "") not in accepted:
+                return False
+        if self.page_range is not None:
+            page = metadata.get("page")
+            first, last = self.page_range
+            if not isinstance(page, int) or (first is not None and page < first) or (last is not None and page > last):
+                return False
+        return True
+
+    def __repr__(self) -> str:
+        criteria = [
+            f"{name}={value!r}"
+            for name, value in (("folders", self.folders), ("file_types", self.file_types), ("page_range", self.page_range))
+            if value is not None
+        ]
+        return f"MetadataFilter({', '.join(criteria)})"
@@ -0,0 +1,133 @@
+"""
+PDF text extraction for the indexing pipeline.
+Splits PDFs into page ranges that can be extracted in parallel worker
+processes, and caches the extracted page text on disk so unchanged PDFs
+are never parsed twice.
+"""
+
+import gzip
+import json
+import logging
+from pathlib import Path
+from typing import List, Optional
+
+import pypdf
+
+logger = logging.getLogger(__name__)
+
+# Part of the cache key: bump the suffix when the extraction logic changes
+PDF_PARSER_VERSION = f"pypdf-{pypdf.__version__}-1"
+
+
+def count_pdf_pages(file_path: Path) -> int:
+    """
+    Count the pages of a PDF without extracting any text.
+
+    Args:
+        file_path: Path to the PDF
+
+    Returns:
+        Number of pages
+    """
+    return len(pypdf.PdfReader(str(file_path)).pages)
+
+
+def extract_pdf_pages(file_path: Path, start: int, end: int) -> List[str]:
+    """
+    Extract the text of a range of PDF pages.
+    Defined at module level so it can run in a worker process.
+
+    Args:
+        file_path: Path to the PDF
+        start: First page number (inclusive)
+        end: Last page number (exclusive)
+
+    Returns:
+        Text of each page in the range
+    """
+    reader = pypdf.PdfReader(str(file_path))
+    return [reader.pages[page_number].extract_text() for page_number in range(start, end)]
+
+
+def split_page_ranges(num_pages: int, pages_per_task: int) -> List[range]:
+    """
+    Split a page count into consecutive ranges of at most pages_per_task pages.
+
+    Args:
+        num_pages: Number of pages in the PDF
+        pages_per_task: Maximum pages per range
+
+    Returns:
+        List of page ranges
+    """
+    return [
+        range(start, min(start + pages_per_task, num_pages))
+        for start in range(0, num_pages, pages_per_task)
+    ]
+
+
+class PdfPageCache:
+    """
+    On-disk cache of extracted PDF page text.
+    Entries are gzipped JSON files keyed by the PDF's content hash and the
+    parser version, so a changed file or parser produces a new entry.
+    """
+
+    def __init__(self, cache_dir: Path, parser_version: str = PDF_PARSER_VERSION):
+        """
+        Initialize the PDF page cache.
+
+        Args:
+            cache_dir: Directory holding the cache entries
+            parser_version: Version of the extraction logic (part of the cache key)
+        """
+        self.cache_dir = cache_dir
+        self.parser_version = parser_version
+        self.hits = 0
+        self.misses = 0
+
+        cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _entry_path(self, file_hash: str) -> Path:
+        """Location of the cache entry for a file hash."""
+        return self.cache_dir / f"{file_hash}-{self.parser_version}.json.gz"
+
+    def get(self, file_hash: str) -> Optional[List[str]]:
+        """
+        Look up the page texts of a PDF.
+
+        Args:
+            file_hash: Content hash of the PDF
+
+        Returns:
+            List of page texts, or None if the PDF is not cached
+        """
+        entry_path = self._entry_path(file_hash)
+        if not entry_path.exists():
+            self.misses += 1
+            return None
+
+        try:
+            with gzip.open(entry_path, "rt", encoding="utf-8") as f:
+                pages = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable PDF cache entry {entry_path}: {e}")
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return pages
+
+    def put(self, file_hash: str, pages: List[str]) -> None:
+        """
+        Store the page texts of a PDF.
+
+        Args:
+            file_hash: Content hash of the PDF
+            pages: Text of every page, in order
+        """
+        entry_path = self._entry_path(file_hash)
+        tmp_path = entry_path.with_suffix(".tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(pages, f)
+        tmp_path.replace(entry_path)
@@ -0,0 +1,95 @@
+"""
+Streaming pipeline helpers for the indexing pipeline.
+Connects generator stages through bounded queues so that stages overlap
+and memory use does not grow with the size of the corpus.
+"""
+
+import logging
+import queue
+import threading
+from typing import Iterable, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stage's output
+_END = object()
+
+
+class _StageError:
+    """Carries an exception raised by a producer thread to the consumer."""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def bounded_stage(iterable: Iterable, maxsize: int = 4, name: str = "pipeline-stage") -> Iterator:
+    """
+    Run an iterable in a background thread and yield its items through a bounded queue.
+    The producer blocks once `maxsize` items are waiting, so at most that many
+    items are buffered between this stage and the next.
+
+    Args:
+        iterable: Producer of the stage's items (typically a generator)
+        maxsize: Maximum number of buffered items
+        name: Name of the producer thread (for logging and debugging)
+
+    Yields:
+        Items produced by the iterable, in order
+    """
+    buffer = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        # Poll so the producer can exit when the consumer stops early
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_StageError(e))
+            return
+        put(_END)
+
+    thread = threading.Thread(target=produce, name=name, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item = buffer.get()
+            if item is _END:
+                break
+            if isinstance(item, _StageError):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+
+
+def batched(iterable: Iterable, batch_size: int) -> Iterator[List]:
+    """
+    Group items of an iterable into lists of at most `batch_size` items.
+
+    Args:
+        iterable: Items to group
+        batch_size: Maximum number of items per batch
+
+    Yields:
+        Lists of items
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -4,10 +4,19 @@ Combines Dense (semantic) and Sparse (BM25) retrieval with Reciprocal Rank Fusio
 """
 
 import logging
-from typing import List, Dict, Any, Tuple
-from rank_bm25 import BM25Okapi
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from pathlib import Path
+from types import SimpleNamespace
+from typing import List, Dict, Any, Callable, Optional, Sequence, Tuple
 import numpy as np
-from collections import defaultdict
+
+from src.config import DENSE_BACKEND
+from src.dense_index import DenseIndex, dense_index_exists
+from src.embedding import embed_queries
+from src.metadata_filter import MetadataFilter
+from src.sparse_index import SparseIndex, sparse_index_exists
+from src.sparse_shards import ShardedSparseSearcher
 
 logger = logging.getLogger(__name__)
 
@@ -24,7 +33,12 @@ class HybridRetriever:
         dense_top_k: int = 50,
         sparse_top_k: int = 50,
         final_top_k: int = 5,
-        rrf_k: int = 60
+        rrf_k: int = 60,
+        dynamic_pruning: bool = True,
+        sparse_shards: int = 1,
+        dense_timeout: Optional[float] = None,
+        sparse_timeout: Optional[float] = None,
+        adaptive_depths: Optional[Sequence[int]] = None
     ):
         """
         Initialize the Hybrid Retriever.
@@ -35,234 +49,848 @@ class HybridRetriever:
             sparse_top_k: Number of documents to retrieve via BM25
             final_top_k: Final number of documents after re-ranking
             rrf_k: RRF constant (typically 60)
+            dynamic_pruning: Skip BM25 candidates that cannot reach the top K
+                (returns the same results as exhaustive scoring)
+            sparse_shards: Worker processes scoring a persisted BM25 index in
+                parallel (1 = score in this process)
+            dense_timeout: Seconds to wait for dense results (None = no deadline)
+            sparse_timeout: Seconds to wait for sparse results (None = no deadline)
+            adaptive_depths: Shallower dense candidate depths tried first, in
+                increasing order; each query stops at the first one that settles
+                the fused top K (see fused_top_k_is_final), and otherwise gets the
+                full dense_top_k (None = always the full depth). Sparse search is
+                exact and cheap to run deep, so it fetches sparse_top_k once
         """
         self.vectorstore = vectorstore
         self.dense_top_k = dense_top_k
         self.sparse_top_k = sparse_top_k
         self.final_top_k = final_top_k
         self.rrf_k = rrf_k
+        self.dynamic_pruning = dynamic_pruning
+        self.sparse_shards = sparse_shards
+        self.dense_timeout = dense_timeout
+        self.sparse_timeout = sparse_timeout
+        self.adaptive_depths = sorted(
+            depth for depth in (adaptive_depths or []) if 0 < depth < min(dense_top_k, sparse_top_k)
+        )
+        
+        # Every retriever runs in its own thread pool (see add_retriever), so the
+        # retrievers of a query run side by side. A call that misses its deadline
+        # keeps its worker until it returns, which only holds up later calls of
+        # the same retriever: a hung dense search cannot starve sparse search
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
+        
+        # Retrievers searched at their full depth on the first adaptive round,
+        # and not again on the deeper ones
+        self._full_depth = set()
         
-        # BM25 index will be initialized when documents are loaded
+        # BM25 index will be initialized when documents are loaded. It also stores
+        # the text and metadata of every chunk, which sparse hits are read from
+        # (memory-mapped, and shared between processes, when loaded from disk)
         self.bm25_index = None
-        self.bm25_documents = []
-        self.bm25_metadatas = []
+        self.bm25_persisted = False
+        self.sparse_searcher = None  # parallel scoring of a persisted index
+        self.sparse_index_dir = None  # where the loaded BM25 index was read from
+        
+        # Optional in-process dense index (searched instead of the vector store
+        # while it is aligned with the loaded BM25 index)
+        self.dense_index = None
+        
+        # Retrievers fused for every query: (name, search function, deadline,
+        # batch search function, applies metadata filters). Each returns chunk
+        # numbers (document numbers of the BM25 index, which stores the
+        # chunks), so results are matched without comparing text
+        self.retrievers = []
+        self.add_retriever("dense", self.dense_retrieval, dense_timeout, self.dense_retrieval_many, filterable=True)
+        self.add_retriever("sparse", self.sparse_retrieval, sparse_timeout, self.sparse_retrieval_many,
+                           filterable=True, adaptive=False)
         
         logger.info("HybridRetriever initialized")
     
-    def initialize_bm25_index(self, documents: List[Any]) -> None:
+    def initialize_bm25_index(self, documents: List[Any], ids: Optional[List[str]] = None) -> None:
         """
         Initialize the BM25 index from documents.
         
         Args:
             documents: List of Document objects with page_content and metadata
+            ids: Chunk IDs of the documents (needed to update or remove them later)
         """
         logger.info("Initializing BM25 index...")
         
-        # Extract text content and metadata
-        self.bm25_documents = []
-        self.bm25_metadatas = []
-        tokenized_corpus = []
+        # Text and metadata are copied into the index's stored fields
+        texts = [doc.page_content if hasattr(doc, 'page_content') else str(doc) for doc in documents]
+        metadatas = [doc.metadata if hasattr(doc, 'metadata') else {} for doc in documents]
         
-        for doc in documents:
-            content = doc.page_content if hasattr(doc, 'page_content') else str(doc)
-            metadata = doc.metadata if hasattr(doc, 'metadata') else {}
+        self._close_sparse_searcher()
+        self.bm25_index = SparseIndex.build(texts, doc_ids=ids, metadatas=metadatas)
+        self.bm25_persisted = False
+        
+        logger.info(f"BM25 index created with {len(texts)} documents")
+    
+    def load_sparse_index(self, index_dir: Path) -> bool:
+        """
+        Load the BM25 index written at ingestion time (memory-mapped).
+        
+        Args:
+            index_dir: Directory of the persisted sparse index
             
-            self.bm25_documents.append(content)
-            self.bm25_metadatas.append(metadata)
+        Returns:
+            True if the index was loaded, False if it is missing or out of date
+        """
+        if not sparse_index_exists(index_dir):
+            logger.info(f"No persisted sparse index at {index_dir}")
+            return False
+        
+        try:
+            sparse_index = SparseIndex.load(index_dir)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load sparse index from {index_dir}: {e}")
+            return False
+        
+        stored_count = self.vectorstore._collection.count()
+        if sparse_index.num_docs != stored_count:
+            logger.warning(
+                f"Sparse index is out of date ({sparse_index.num_docs} documents, "
+                f"vector store has {stored_count}); re-run ingestion to rebuild it"
+            )
+            return False
+        
+        self._close_sparse_searcher()
+        self.bm25_index = sparse_index
+        self.bm25_persisted = True
+        self.sparse_index_dir = index_dir
+        if self.sparse_shards > 1:
+            self.sparse_searcher = ShardedSparseSearcher(sparse_index, index_dir, self.sparse_shards)
+        logger.info(
+            f"Loaded sparse index with {sparse_index.num_docs} documents "
+            f"and {sparse_index.num_terms} terms"
+        )
+        return True
+    
+    def load_dense_index(self, index_dir: Path, ef_search: int = 128, rescore_factor: int = 0) -> bool:
+        """
+        Load the in-process dense index written at ingestion time (memory-mapped).
+        Requires the persisted BM25 index it was built against to be loaded.
+        
+        Args:
+            index_dir: Directory of the persisted dense index
+            ef_search: HNSW candidate list size at query time
+            rescore_factor: Re-rank this many times k candidates of a quantized
+                index with the full-precision embeddings (0 = none)
             
-            # Simple tokenization (split by whitespace and lowercase)
-            tokenized_corpus.append(content.lower().split())
+        Returns:
+            True if the index was loaded, False if it is missing or out of date
+        """
+        if not dense_index_exists(index_dir):
+            logger.info(f"No persisted dense index at {index_dir}; dense search goes through ChromaDB")
+            return False
         
-        # Create BM25 index
-        self.bm25_index = BM25Okapi(tokenized_corpus)
+        try:
+            dense_index = DenseIndex.load(index_dir, ef_search=ef_search, rescore_factor=rescore_factor)
+        except (OSError, ValueError, ImportError) as e:
+            logger.warning(f"Could not load dense index from {index_dir}: {e}")
+            return False
+        
+        if not self._dense_index_aligned(dense_index):
+            logger.warning(
+                "Dense index does not match the sparse index; re-run ingestion to rebuild it "
+                "(dense search goes through ChromaDB until then)"
+            )
+            return False
+        
+        self.dense_index = dense_index
+        if dense_index.graph is not None:
+            mode = "HNSW"
+        elif dense_index.quantizer is not None:
+            mode = f"{dense_index.quantizer.kind}, rescoring x{dense_index.rescore_factor}"
+        else:
+            mode = "exact"
+        logger.info(
+            f"Loaded dense index with {dense_index.num_rows} embeddings "
+            f"({mode} search, {dense_index.bytes_per_row} bytes per embedding)"
+        )
+        return True
+    
+    def _dense_index_aligned(self, dense_index: Optional[DenseIndex]) -> bool:
+        """Check that a dense index's rows refer to the documents of the loaded BM25 index."""
+        if dense_index is None or self.bm25_index is None or self.sparse_index_dir is None:
+            return False
+        return dense_index.aligned_with(self.bm25_index.commit_state(self.sparse_index_dir))
+    
+    def add_documents(self, documents: List[Any], ids: List[str]) -> None:
+        """
+        Make new or updated chunks searchable by the sparse retriever without a
+        rebuild (they are indexed as a new segment).
         
-        logger.info(f"BM25 index created with {len(self.bm25_documents)} documents")
+        Args:
+            documents: Document objects with page_content and metadata
+            ids: Chunk IDs of the documents (existing chunks with these IDs are replaced)
+        """
+        if self.bm25_index is None:
+            self.initialize_bm25_index(documents, ids=ids)
+            return
+        
+        texts = [doc.page_content if hasattr(doc, 'page_content') else str(doc) for doc in documents]
+        metadatas = [doc.metadata if hasattr(doc, 'metadata') else {} for doc in documents]
+        self.bm25_index.add_documents(texts, ids, metadatas)
+        
+        logger.info(f"Added {len(ids)} documents to the BM25 index")
+    
+    def remove_documents(self, ids: List[str]) -> int:
+        """
+        Remove chunks from the sparse retriever.
+        
+        Args:
+            ids: Chunk IDs to remove (unknown IDs are ignored)
+            
+        Returns:
+            Number of chunks removed
+        """
+        if self.bm25_index is None:
+            return 0
+        return self.bm25_index.remove_documents(ids)
+    
+    def _close_sparse_searcher(self) -> None:
+        """Stop the sparse scoring workers, if any."""
+        if self.sparse_searcher is not None:
+            self.sparse_searcher.close()
+            self.sparse_searcher = None
     
-    def dense_retrieval(self, query: str, k: int = None) -> List[Tuple[Any, float]]:
+    def dense_retrieval(self, query: str, k: int = None,
+                        metadata_filter: Optional[MetadataFilter] = None) -> Tuple[np.ndarray, np.ndarray]:
         """
-        Perform dense semantic retrieval using the vector store.
+        Perform dense semantic retrieval.
         
         Args:
             query: Search query
             k: Number of documents to retrieve (defaults to self.dense_top_k)
+            metadata_filter: Only search chunks passing this filter
             
         Returns:
-            List of (document, score) tuples
+            Tuple of (chunk numbers, distances), nearest first
         """
         k = k or self.dense_top_k
         
+        if self.bm25_index is None:
+            logger.error("BM25 index not initialized (it stores the chunks dense hits are read from)")
+            return _empty_ranking()
+        
         try:
-            # Perform similarity search with scores
-            results = self.vectorstore.similarity_search_with_score(query, k=k)
+            doc_numbers, distances = self._dense_search([query], k, metadata_filter)[0]
             
-            logger.info(f"Dense retrieval found {len(results)} documents")
-            return results
+            logger.info(f"Dense retrieval found {len(doc_numbers)} documents")
+            return doc_numbers, distances
         
         except Exception as e:
             logger.error(f"Dense retrieval failed: {e}")
-            return []
+            return _empty_ranking()
     
-    def sparse_retrieval(self, query: str, k: int = None) -> List[Tuple[str, int, float]]:
+    def dense_retrieval_many(self, queries: List[str], k: int = None,
+                             metadata_filter: Optional[MetadataFilter] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Perform dense retrieval for many queries: one batched embedding call,
+        then one matrix multiplication (in-process index) or one vector store
+        request for all of them.
+        
+        Args:
+            queries: Search queries
+            k: Number of documents to retrieve per query (defaults to self.dense_top_k)
+            metadata_filter: Only search chunks passing this filter
+            
+        Returns:
+            (chunk numbers, distances) of every query, nearest first
+        """
+        k = k or self.dense_top_k
+        
+        if self.bm25_index is None:
+            logger.error("BM25 index not initialized (it stores the chunks dense hits are read from)")
+            return [_empty_ranking() for _ in queries]
+        
+        try:
+            rankings = self._dense_search(queries, k, metadata_filter)
+            logger.info(f"Dense retrieval found {sum(len(docs) for docs, _ in rankings)} documents for {len(queries)} queries")
+            return rankings
+        
+        except Exception as e:
+            logger.error(f"Dense retrieval failed: {e}")
+            return [_empty_ranking() for _ in queries]
+    
+    def _dense_search(self, queries: List[str], k: int,
+                      metadata_filter: Optional[MetadataFilter] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Search the in-process index while it matches the BM25 index, otherwise
+        the vector store. A metadata filter restricts the in-process search to
+        the rows of the chunks passing it (from the BM25 index's filter
+        bitmaps), and becomes a `where` clause for the vector store.
+        
+        Args:
+            queries: Search queries
+            k: Number of documents to retrieve per query
+            metadata_filter: Only search chunks passing this filter
+            
+        Returns:
+            (chunk numbers, distances) of every query, nearest first
+        """
+        if metadata_filter is not None and metadata_filter.matches_nothing:
+            return [_empty_ranking() for _ in queries]
+        
+        if self._dense_index_aligned(self.dense_index):
+            allowed = self.bm25_index.filter_docs(metadata_filter) if metadata_filter is not None else None
+            query_vectors = embed_queries(self.vectorstore.embeddings, queries)
+            if len(queries) == 1:
+                return [self.dense_index.search(query_vectors[0], k, allowed)]
+            return self.dense_index.search_many(np.asarray(query_vectors, dtype=np.float32), k, allowed)
+        return self._vectorstore_search(queries, k, metadata_filter.where() if metadata_filter is not None else None)
+    
+    def _vectorstore_search(self, queries: List[str], k: int,
+                            where: Optional[Dict[str, Any]] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Query the vector store (one request for all queries) and map the chunk
+        IDs it returns to chunk numbers.
+        
+        Args:
+            queries: Search queries
+            k: Number of documents to retrieve per query
+            where: ChromaDB metadata filter (applied by the store before the search)
+            
+        Returns:
+            (chunk numbers, distances) of every query, nearest first
+        """
+        if self.vectorstore.embeddings is not None:
+            query_args = {"query_embeddings": embed_queries(self.vectorstore.embeddings, queries)}
+        else:
+            query_args = {"query_texts": list(queries)}
+        result = self.vectorstore._collection.query(n_results=k, where=where, include=["distances"], **query_args)
+        
+        rankings = []
+        num_unknown = 0
+        for ids, distances in zip(result["ids"], result["distances"]):
+            doc_numbers = self.bm25_index.doc_numbers(ids)
+            known = doc_numbers >= 0
+            num_unknown += int((~known).sum())
+            rankings.append((doc_numbers[known], np.asarray(distances, dtype=np.float32)[known]))
+        
+        if num_unknown:
+            logger.warning(
+                f"{num_unknown} dense hits are not in the BM25 index; "
+                f"build it with the vector store's chunk IDs to fuse them"
+            )
+        return rankings
+    
+    def sparse_retrieval(self, query: str, k: int = None,
+                         metadata_filter: Optional[MetadataFilter] = None) -> Tuple[np.ndarray, np.ndarray]:
         """
         Perform sparse BM25 retrieval.
         
         Args:
             query: Search query
             k: Number of documents to retrieve (defaults to self.sparse_top_k)
+            metadata_filter: Only score chunks passing this filter
             
         Returns:
-            List of (document_content, doc_index, score) tuples
+            Tuple of (chunk numbers, BM25 scores), best first
         """
         k = k or self.sparse_top_k
         
         if self.bm25_index is None:
             logger.error("BM25 index not initialized")
-            return []
+            return _empty_ranking()
         
         try:
-            # Tokenize query
-            tokenized_query = query.lower().split()
-            
-            # Get BM25 scores
-            scores = self.bm25_index.get_scores(tokenized_query)
-            
-            # Get top K indices
-            top_k_indices = np.argsort(scores)[::-1][:k]
+            # Score only the postings of the query terms and keep the top K
+            # (documents with a zero score are never returned), in worker
+            # processes when the index is sharded. Filtered queries score
+            # only the postings of chunks passing the filter, in this process
+            if metadata_filter is not None:
+                doc_numbers, scores = self.bm25_index.top_k(
+                    query, k, prune=self.dynamic_pruning, metadata_filter=metadata_filter
+                )
+            else:
+                searcher = self.sparse_searcher or self.bm25_index
+                doc_numbers, scores = searcher.top_k(query, k, prune=self.dynamic_pruning)
             
-            results = []
-            for idx in top_k_indices:
-                if scores[idx] > 0:  # Only include documents with positive scores
-                    results.append((
-                        self.bm25_documents[idx],
-                        int(idx),
-                        float(scores[idx])
-                    ))
+            logger.info(f"Sparse retrieval found {len(doc_numbers)} documents")
+            return doc_numbers, scores
+        
+        except Exception as e:
+            logger.error(f"Sparse retrieval failed: {e}")
+            return _empty_ranking()
+    
+    def sparse_retrieval_many(self, queries: List[str], k: int = None,
+                              metadata_filter: Optional[MetadataFilter] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Perform sparse BM25 retrieval for many queries, scored together as
+        sparse matrix products (see SparseIndex.top_k_many).
+        
+        Args:
+            queries: Search queries
+            k: Number of documents to retrieve per query (defaults to self.sparse_top_k)
+            metadata_filter: Only score chunks passing this filter
             
-            logger.info(f"Sparse retrieval found {len(results)} documents")
-            return results
+        Returns:
+            (chunk numbers, BM25 scores) of every query, best first
+        """
+        k = k or self.sparse_top_k
+        
+        if self.bm25_index is None:
+            logger.error("BM25 index not initialized")
+            return [_empty_ranking() for _ in queries]
+        
+        try:
+            rankings = self.bm25_index.top_k_many(queries, k, metadata_filter=metadata_filter)
+            logger.info(f"Sparse retrieval found {sum(len(docs) for docs, _ in rankings)} documents for {len(queries)} queries")
+            return rankings
         
         except Exception as e:
             logger.error(f"Sparse retrieval failed: {e}")
-            return []
+            return [_empty_ranking() for _ in queries]
     
-    def reciprocal_rank_fusion(
+    def add_retriever(
         self,
-        dense_results: List[Tuple[Any, float]],
-        sparse_results: List[Tuple[str, int, float]]
-    ) -> List[Any]:
+        name: str,
+        search: Callable[[str, Optional[int]], Tuple[np.ndarray, np.ndarray]],
+        timeout: Optional[float] = None,
+        search_many: Optional[Callable[[List[str], Optional[int]], List[Tuple[np.ndarray, np.ndarray]]]] = None,
+        filterable: bool = False,
+        adaptive: bool = True
+    ) -> None:
+        """
+        Add a retriever whose ranking is fused with the others.
+        
+        Args:
+            name: Retriever name (for logging); each name gets its own thread
+                pool, so a slow retriever does not delay the others
+            search: Function of (query, k) returning (chunk numbers, scores), best
+                first, where chunk numbers are document numbers of the BM25 index
+                (SparseIndex.doc_numbers maps chunk IDs to them) and k = None
+                means the retriever's default depth
+            timeout: Seconds to wait for its results (None = no deadline)
+            search_many: Batch version of search for retrieve_many, taking a
+                list of queries (None = search is called for each query)
+            filterable: search and search_many take a `metadata_filter` keyword
+                and only return chunks passing it; other retrievers' rankings
+                are filtered after the search
+            adaptive: With adaptive depths, search at each depth in turn; False
+                searches at the default depth once and reuses the ranking on
+                deeper rounds (for exact retrievers that are cheap to run deep)
+        """
+        self.retrievers.append((name, search, timeout, search_many, filterable))
+        if not adaptive:
+            self._full_depth.add(name)
+        if name not in self._executors:
+            self._executors[name] = ThreadPoolExecutor(max_workers=2, thread_name_prefix=f"retrieval-{name}")
+    
+    def materialize(self, doc_numbers: Sequence[int]) -> List[Any]:
+        """
+        Build document objects for chunks, from the BM25 index's stored fields.
+        
+        Args:
+            doc_numbers: Chunk numbers
+            
+        Returns:
+            Objects with page_content and metadata
+        """
+        return [
+            SimpleNamespace(page_content=self.bm25_index.text(doc), metadata=self.bm25_index.metadata(doc))
+            for doc in doc_numbers
+        ]
+    
+    def reciprocal_rank_fusion(self, rankings: Sequence[Tuple[np.ndarray, np.ndarray]]) -> List[Any]:
         """
         Apply Reciprocal Rank Fusion to combine and re-rank results.
         
         Formula: RRF_score(d) = Σ(1 / (k + rank_i(d))) for all retrievers i
         
         Args:
-            dense_results: Results from dense retrieval (document, score)
-            sparse_results: Results from sparse retrieval (content, index, score)
+            rankings: (chunk numbers, scores) of every retriever, best first
             
         Returns:
             Re-ranked list of documents (top K)
         """
         logger.info("Applying Reciprocal Rank Fusion...")
         
-        # Dictionary to store RRF scores: doc_id -> (score, document)
-        rrf_scores = defaultdict(float)
-        doc_map = {}  # doc_id -> actual document object
-        
-        # Process dense results
-        for rank, (doc, score) in enumerate(dense_results, start=1):
-            # Create a unique ID for the document
-            doc_content = doc.page_content if hasattr(doc, 'page_content') else str(doc)
-            doc_id = hash(doc_content[:200])  # Use hash of first 200 chars as ID
-            
-            # Calculate RRF contribution
-            rrf_scores[doc_id] += 1.0 / (self.rrf_k + rank)
-            
-            # Store document
-            if doc_id not in doc_map:
-                doc_map[doc_id] = doc
-        
-        # Process sparse results
-        for rank, (content, idx, score) in enumerate(sparse_results, start=1):
-            doc_id = hash(content[:200])
-            
-            # Calculate RRF contribution
-            rrf_scores[doc_id] += 1.0 / (self.rrf_k + rank)
-            
-            # Store document if not already present (create from BM25 result)
-            if doc_id not in doc_map:
-                # Create a simple document-like object
-                from types import SimpleNamespace
-                doc = SimpleNamespace(
-                    page_content=content,
-                    metadata=self.bm25_metadatas[idx] if idx < len(self.bm25_metadatas) else {}
-                )
-                doc_map[doc_id] = doc
-        
-        # Sort by RRF score (descending)
-        sorted_docs = sorted(
-            rrf_scores.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )
-        
-        # Get top K documents
-        top_k_doc_ids = [doc_id for doc_id, score in sorted_docs[:self.final_top_k]]
-        top_k_docs = [doc_map[doc_id] for doc_id in top_k_doc_ids]
+        # Chunks are identified by their number, so only the final top K
+        # are read from the index
+        doc_numbers, rrf_scores = fuse_rankings([docs for docs, _ in rankings], self.rrf_k, self.final_top_k)
+        top_k_docs = self.materialize(doc_numbers.tolist())
         
         logger.info(f"RRF produced top {len(top_k_docs)} documents")
         
         # Log RRF scores for debugging
-        for i, (doc_id, score) in enumerate(sorted_docs[:self.final_top_k], 1):
+        for i, score in enumerate(rrf_scores.tolist(), 1):
             logger.debug(f"  Rank {i}: RRF Score = {score:.4f}")
         
         return top_k_docs
     
-    def retrieve(self, query: str) -> List[Any]:
+    def retrieve(self, query: str, metadata_filter: Optional[MetadataFilter] = None) -> List[Any]:
         """
         Perform hybrid retrieval with RRF re-ranking.
         
         Args:
             query: User query
+            metadata_filter: Only retrieve chunks passing this filter (source
+                folder, file type, page range); applied before scoring
             
         Returns:
             Top K re-ranked documents
         """
         logger.info(f"Hybrid retrieval for query: '{query[:100]}...'")
+        start = time.perf_counter()
         
-        # Step 1: Dense retrieval
-        dense_results = self.dense_retrieval(query)
+        metadata_filter, allowed = self._resolve_filter(metadata_filter)
+        if allowed is not None and not len(allowed):
+            return []
         
-        # Step 2: Sparse retrieval
-        sparse_results = self.sparse_retrieval(query)
+        # Steps 1 and 2: Run the retrievers (dense and sparse, plus any added
+        # ones) concurrently so the latency is that of the slowest rather than
+        # the sum of all. With adaptive depths, start shallow and only fetch
+        # more candidates while they could still change the fused top K; only
+        # adaptive retrievers are searched again (deadlines keep counting from
+        # the start of the query)
+        rankings: List[Optional[Tuple[np.ndarray, np.ndarray]]] = [None] * len(self.retrievers)
+        for round_number, depth in enumerate(self.adaptive_depths + [None]):
+            futures = [
+                (index, name, self._submit(name, search, query, metadata_filter if filterable else None,
+                                           None if name in self._full_depth else depth), timeout)
+                for index, (name, search, timeout, _, filterable) in enumerate(self.retrievers)
+                if round_number == 0 or name not in self._full_depth
+            ]
+            for index, name, future, timeout in futures:
+                rankings[index] = self._wait_for(future, name, timeout, start)
+            if depth is None or self._settled(rankings, depth, allowed):
+                break
+        rankings = self._apply_filter(rankings, allowed)
+        if self.adaptive_depths:
+            logger.info(f"Adaptive depth: {depth or 'full'} candidates per adaptive retriever")
+        logger.info(f"Retrieval took {time.perf_counter() - start:.3f}s")
         
         # Step 3: Re-ranking with RRF
-        if not dense_results and not sparse_results:
-            logger.warning("No results from either retriever")
+        if not any(len(docs) for docs, _ in rankings):
+            logger.warning("No results from any retriever")
             return []
         
-        final_docs = self.reciprocal_rank_fusion(dense_results, sparse_results)
+        final_docs = self.reciprocal_rank_fusion(rankings)
         
         return final_docs
+    
+    def retrieve_many(self, queries: List[str], metadata_filter: Optional[MetadataFilter] = None) -> List[List[Any]]:
+        """
+        Perform hybrid retrieval with RRF re-ranking for many queries at once
+        (offline evaluation, cache warming, bulk question answering). Each
+        retriever handles the whole batch in one call where it can: queries
+        are embedded together and scored with matrix products. Deadlines do
+        not apply.
+        
+        Args:
+            queries: User queries
+            metadata_filter: Only retrieve chunks passing this filter (for every query)
+            
+        Returns:
+            Top K re-ranked documents of every query
+        """
+        logger.info(f"Hybrid retrieval for {len(queries)} queries")
+        start = time.perf_counter()
+        
+        metadata_filter, allowed = self._resolve_filter(metadata_filter)
+        if allowed is not None and not len(allowed):
+            return [[] for _ in queries]
+        
+        # With adaptive depths, every round only re-runs the adaptive retrievers
+        # for the queries whose fused top K is not settled yet
+        rankings = [[None] * len(self.retrievers) for _ in queries]
+        depth_counts: Dict[Any, int] = {}
+        pending = list(range(len(queries)))
+        for round_number, depth in enumerate(self.adaptive_depths + [None]):
+            batch = [queries[position] for position in pending]
+            futures = [
+                (index, self._submit(name, search_many or _per_query(search), batch,
+                                     metadata_filter if filterable else None,
+                                     None if name in self._full_depth else depth))
+                for index, (name, search, _, search_many, filterable) in enumerate(self.retrievers)
+                if round_number == 0 or name not in self._full_depth
+            ]
+            for index, future in futures:
+                for position, ranking in zip(pending, future.result()):
+                    rankings[position][index] = ranking
+            
+            unsettled = []
+            for position in pending:
+                if depth is None or self._settled(rankings[position], depth, allowed):
+                    depth_counts[depth or "full"] = depth_counts.get(depth or "full", 0) + 1
+                else:
+                    unsettled.append(position)
+            pending = unsettled
+            if not pending:
+                break
+        
+        results = []
+        for query_rankings in rankings:
+            doc_numbers, _ = fuse_rankings(
+                [docs for docs, _ in self._apply_filter(query_rankings, allowed)],
+                self.rrf_k,
+                self.final_top_k
+            )
+            results.append(self.materialize(doc_numbers.tolist()))
+        
+        if self.adaptive_depths:
+            logger.info(
+                "Adaptive depth: " + ", ".join(f"{count} queries at {depth}" for depth, count in depth_counts.items())
+            )
+        logger.info(f"Retrieved {len(queries)} queries in {time.perf_counter() - start:.3f}s")
+        return results
+    
+    def _resolve_filter(self, metadata_filter: Optional[MetadataFilter]) -> Tuple[Optional[MetadataFilter], Optional[np.ndarray]]:
+        """
+        Find the chunks passing a metadata filter.
+        
+        Args:
+            metadata_filter: Filter of the retrieval (None or empty = no filter)
+            
+        Returns:
+            Tuple of (the filter, or None if it restricts nothing; the chunk
+            numbers passing it, ascending, or None without a filter)
+        """
+        if metadata_filter is None or metadata_filter.is_empty or self.bm25_index is None:
+            return None, None
+        
+        allowed = self.bm25_index.filter_docs(metadata_filter)
+        logger.info(f"{metadata_filter} matches {len(allowed)} of {self.bm25_index.num_docs} chunks")
+        if not len(allowed):
+            logger.warning("No chunks match the metadata filter")
+        return metadata_filter, allowed
+    
+    def _submit(self, name: str, search: Callable, queries, metadata_filter: Optional[MetadataFilter],
+                k: Optional[int] = None) -> Future:
+        """Run a retriever's search (or batch search) in its executor, passing the filter if there is one."""
+        executor = self._executors[name]
+        if metadata_filter is None:
+            return executor.submit(search, queries, k)
+        return executor.submit(search, queries, k, metadata_filter=metadata_filter)
+    
+    def _settled(self, rankings: List[Tuple[np.ndarray, np.ndarray]], depth: int,
+                 allowed: Optional[np.ndarray]) -> bool:
+        """
+        Check whether rankings fetched at an adaptive depth already give the
+        final fused top K. A ranking shorter than the depth is complete (it
+        has no more candidates), as is the ranking of a retriever searched at
+        its full depth; a retriever that missed its deadline also returns an
+        empty ranking, and is fused without, as at full depth.
+        
+        Args:
+            rankings: (chunk numbers, scores) of every retriever, before post-filtering
+            depth: Number of candidates requested from every retriever
+            allowed: Sorted chunk numbers passing the metadata filter (None = all)
+            
+        Returns:
+            True if deeper rankings would fuse to the same top K
+        """
+        return fused_top_k_is_final(
+            [docs for docs, _ in self._apply_filter(rankings, allowed)],
+            [
+                name not in self._full_depth and len(docs) >= depth
+                for (docs, _), (name, *_) in zip(rankings, self.retrievers)
+            ],
+            self.rrf_k,
+            self.final_top_k
+        )
+    
+    def _apply_filter(self, rankings: List[Tuple[np.ndarray, np.ndarray]],
+                      allowed: Optional[np.ndarray]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Drop chunks outside a filter from the rankings of retrievers that do
+        not apply filters themselves.
+        
+        Args:
+            rankings: (chunk numbers, scores) of every retriever, in registration order
+            allowed: Chunk numbers passing the filter, ascending (None = no filter)
+            
+        Returns:
+            Filtered rankings
+        """
+        if allowed is None:
+            return rankings
+        
+        filtered = []
+        for (docs, scores), (_, _, _, _, filterable) in zip(rankings, self.retrievers):
+            if not filterable:
+                positions = np.minimum(np.searchsorted(allowed, docs), len(allowed) - 1)
+                keep = allowed[positions] == docs
+                docs, scores = docs[keep], scores[keep]
+            filtered.append((docs, scores))
+        return filtered
+    
+    def _wait_for(self, future: Future, name: str, timeout: Optional[float], start: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Wait for a retriever's results until its deadline.
+        
+        Args:
+            future: Running retriever call
+            name: Retriever name (for logging)
+            timeout: Seconds allowed since start (None = no deadline)
+            start: When the retrieval started (time.perf_counter())
+            
+        Returns:
+            The retriever's ranking, or an empty one if it missed its deadline
+        """
+        remaining = None if timeout is None else max(0.0, start + timeout - time.perf_counter())
+        try:
+            return future.result(timeout=remaining)
+        except FutureTimeoutError:
+            logger.warning(f"{name.capitalize()} retrieval missed its {timeout:.1f}s deadline; fusing without it")
+            return _empty_ranking()
+
+
+def _per_query(search: Callable) -> Callable:
+    """Batch search function calling a retriever's search for each query."""
+    return lambda queries, k, **kwargs: [search(query, k, **kwargs) for query in queries]
+
+
+def _empty_ranking() -> Tuple[np.ndarray, np.ndarray]:
+    return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+
+def fuse_rankings(
+    rankings: Sequence[np.ndarray],
+    rrf_k: int = 60,
+    top_k: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reciprocal Rank Fusion of rankings of chunk numbers, computed with NumPy.
+    
+    Args:
+        rankings: Chunk numbers of every retriever, best first
+        rrf_k: RRF constant
+        top_k: Number of chunks to return (None = all)
+        
+    Returns:
+        Tuple of (chunk numbers, RRF scores), best first; ties go to the chunk
+        that appears first (earlier retrievers first)
+    """
+    rankings = [np.asarray(docs, dtype=np.int64) for docs in rankings]
+    if not any(len(docs) for docs in rankings):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+    
+    docs = np.concatenate(rankings)
+    contributions = np.concatenate([1.0 / (rrf_k + np.arange(1, len(ranking) + 1)) for ranking in rankings])
+    
+    chunks, first, inverse = np.unique(docs, return_index=True, return_inverse=True)
+    scores = np.bincount(inverse, weights=contributions)
+    order = np.lexsort((first, -scores))[:top_k]
+    return chunks[order], scores[order]
+
+
+def fused_top_k_is_final(
+    rankings: Sequence[np.ndarray],
+    cut: Sequence[bool],
+    rrf_k: int = 60,
+    top_k: int = 5
+) -> bool:
+    """
+    Check whether deeper rankings could change the RRF top K (a threshold
+    test, as in Fagin's threshold algorithm). A cut ranking of length n can
+    still give a chunk it does not list at most 1 / (rrf_k + n + 1). The top
+    K is final when each of its chunks is listed by every cut ranking, so its
+    score is exact, and the lowest of these scores is above the highest score
+    any other chunk could still reach. It then also keeps its order (ties go
+    to the first appearance, which deeper rankings do not move).
+    
+    Args:
+        rankings: Chunk numbers of every retriever, best first
+        cut: Whether each ranking was cut (False if it lists every candidate)
+        rrf_k: RRF constant
+        top_k: Number of fused chunks
+        
+    Returns:
+        True if fusing the full rankings gives the same top K, in the same order
+    """
+    rankings = [np.asarray(docs, dtype=np.int64) for docs in rankings]
+    cut_bounds = [1.0 / (rrf_k + len(docs) + 1) for docs, is_cut in zip(rankings, cut) if is_cut]
+    if not cut_bounds:
+        return True
+    
+    chunks, scores = fuse_rankings(rankings, rrf_k)
+    if len(chunks) < top_k:
+        return False
+    
+    # Highest score a chunk can still reach: its current score plus the bound
+    # of every cut ranking that does not list it
+    reachable = scores.copy()
+    order = np.argsort(chunks)
+    for docs, is_cut in zip(rankings, cut):
+        if is_cut:
+            listed = np.zeros(len(chunks), dtype=bool)
+            listed[order[np.searchsorted(chunks, docs, sorter=order)]] = True
+            reachable[~listed] += 1.0 / (rrf_k + len(docs) + 1)
+    
+    top_exact = np.array_equal(reachable[:top_k], scores[:top_k])
+    others = max(float(reachable[top_k:].max(initial=0.0)), sum(cut_bounds))
+    return top_exact and float(scores[top_k - 1]) > others
+
+
+def load_documents_from_vectorstore(vectorstore) -> Tuple[List[Any], List[str]]:
+    """
+    Read every stored chunk back from the vector store as document objects.
+    
+    Args:
+        vectorstore: ChromaDB vector store
+        
+    Returns:
+        Tuple of (objects with page_content and metadata, chunk IDs)
+    """
+    all_docs = vectorstore.get()
+    
+    documents = []
+    for i in range(len(all_docs['ids'])):
+        doc = SimpleNamespace(
+            page_content=all_docs['documents'][i],
+            metadata=all_docs['metadatas'][i] if all_docs['metadatas'] else {}
+        )
+        documents.append(doc)
+    
+    return documents, all_docs['ids']
 
 
 def create_hybrid_retriever(
     vectorstore,
-    documents: List[Any],
+    documents: Optional[List[Any]] = None,
+    ids: Optional[List[str]] = None,
     dense_top_k: int = 50,
     sparse_top_k: int = 50,
     final_top_k: int = 5,
-    rrf_k: int = 60
+    rrf_k: int = 60,
+    sparse_index_dir: Optional[Path] = None,
+    dynamic_pruning: bool = True,
+    sparse_shards: int = 1,
+    dense_timeout: Optional[float] = None,
+    sparse_timeout: Optional[float] = None,
+    dense_index_dir: Optional[Path] = None,
+    dense_ef_search: int = 128,
+    dense_rescore_factor: int = 0,
+    adaptive_depths: Optional[Sequence[int]] = None
 ) -> HybridRetriever:
     """
     Factory function to create and initialize a HybridRetriever.
     
     Args:
         vectorstore: ChromaDB vector store
-        documents: All documents for BM25 indexing
+        documents: All documents for BM25 indexing (read from the vector store
+            if omitted and no persisted sparse index is available)
+        ids: Vector store chunk IDs of the documents (needed to fuse dense hits)
         dense_top_k: Number of dense retrieval results
         sparse_top_k: Number of sparse retrieval results
         final_top_k: Final number after re-ranking
         rrf_k: RRF constant
+        sparse_index_dir: Persisted sparse index to load instead of building BM25 in memory
+        dynamic_pruning: Prune BM25 candidates that cannot reach the top K
+        sparse_shards: Worker processes scoring the persisted sparse index
+        dense_timeout: Deadline for dense retrieval in seconds
+        sparse_timeout: Deadline for sparse retrieval in seconds
+        dense_index_dir: Persisted dense index to search instead of the vector
+            store (needs the persisted sparse index)
+        dense_ef_search: HNSW candidate list size of the dense index
+        dense_rescore_factor: Full-precision re-ranking depth of a quantized
+            dense index, in multiples of dense_top_k
+        adaptive_depths: Shallower candidate depths tried first (None = fixed depth)
         
     Returns:
         Initialized HybridRetriever instance
@@ -272,11 +900,26 @@ def create_hybrid_retriever(
         dense_top_k=dense_top_k,
         sparse_top_k=sparse_top_k,
         final_top_k=final_top_k,
-        rrf_k=rrf_k
+        rrf_k=rrf_k,
+        dynamic_pruning=dynamic_pruning,
+        sparse_shards=sparse_shards,
+        dense_timeout=dense_timeout,
+        sparse_timeout=sparse_timeout,
+        adaptive_depths=adaptive_depths
     )
     
-    # Initialize BM25 index
-    retriever.initialize_bm25_index(documents)
+    # Use the persisted BM25 index when there is one, otherwise build it in memory
+    if sparse_index_dir is not None and retriever.load_sparse_index(sparse_index_dir):
+        if dense_index_dir is not None:
+            retriever.load_dense_index(dense_index_dir, ef_search=dense_ef_search, rescore_factor=dense_rescore_factor)
+        return retriever
+    
+    if dense_index_dir is not None and DENSE_BACKEND == "in_process":
+        logger.warning("The dense index needs the persisted sparse index; dense search goes through ChromaDB")
+    
+    if documents is None:
+        documents, ids = load_documents_from_vectorstore(vectorstore)
+    retriever.initialize_bm25_index(documents, ids=ids)
     
     return retriever
 
@@ -0,0 +1,1714 @@
+"""
+Persistent BM25 sparse index.
+Stores the vocabulary, postings, document lengths and term statistics as flat
+binary arrays that are memory-mapped on load, so opening the index does not
+depend on the size of the corpus. The text and metadata of every chunk are
+stored alongside (as Lucene stores fields), so search results are read from
+the same shared pages instead of being kept as Python objects per process.
+
+The index is made of immutable segments (as in Lucene). Adding documents
+writes a new segment, removing documents marks them deleted in their segment,
+and a merge policy periodically combines small segments and drops deleted
+documents. Corpus statistics (document count, average length, document
+frequencies) are kept over live documents only and applied at query time, so
+they stay exact without rewriting existing segments.
+"""
+
+import json
+import logging
+import math
+import shutil
+import threading
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from scipy import sparse as scipy_sparse
+except ImportError:  # In requirements.txt; without it batches are scored one query at a time
+    scipy_sparse = None
+
+from src.analyzer import Analyzer
+from src.config import SPARSE_MERGE_FACTOR, SPARSE_MAX_DELETED_RATIO
+from src.metadata_filter import FILTER_FIELDS, MetadataFilter
+
+logger = logging.getLogger(__name__)
+
+# Bump when the on-disk layout changes
+SPARSE_INDEX_FORMAT_VERSION = 5
+
+# Commit point listing the live segments of an index directory
+SEGMENTS_FILE = "segments.json"
+
+# Relative margin applied to pruning bounds and thresholds, so float32
+# rounding in accumulated scores can never prune a document of the top k
+_PRUNING_SLACK = 1e-4
+
+# Queries scored together by top_k_many (bounds the queries x documents product)
+_QUERY_BLOCK = 256
+
+# Distinct metadata filters whose matching documents a segment keeps
+_FILTER_CACHE_SIZE = 32
+
+
+class StringTable:
+    """
+    Immutable list of strings stored as one UTF-8 blob plus an offsets array.
+    Strings are decoded on access, so loading a table costs nothing up front.
+    """
+
+    def __init__(self, blob, offsets: np.ndarray):
+        """
+        Initialize the string table.
+
+        Args:
+            blob: UTF-8 bytes of all strings, concatenated (bytes or uint8 array)
+            offsets: Start offset of every string, plus the end offset (int64, len + 1)
+        """
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings: Sequence[str]) -> "StringTable":
+        """Build a table from a sequence of strings."""
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        if encoded:
+            np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def _bytes(self, index: int) -> bytes:
+        return bytes(self.blob[self.offsets[index]:self.offsets[index + 1]])
+
+    def __getitem__(self, index: int) -> str:
+        return self._bytes(index).decode("utf-8")
+
+    def take(self, indices: np.ndarray) -> "StringTable":
+        """
+        Copy a subset of the strings into a new table, without decoding them.
+
+        Args:
+            indices: Positions of the strings to keep, in the order to keep them
+
+        Returns:
+            StringTable instance
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        starts = np.asarray(self.offsets)[indices]
+        lengths = np.asarray(self.offsets)[indices + 1] - starts
+        offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        # Byte positions of the kept strings in the source blob
+        positions = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return StringTable(np.asarray(self.blob)[positions], offsets)
+
+    @classmethod
+    def concat(cls, tables: Sequence["StringTable"]) -> "StringTable":
+        """Join tables end to end."""
+        offsets = [np.zeros(1, dtype=np.int64)]
+        base = 0
+        for table in tables:
+            offsets.append(np.asarray(table.offsets)[1:] + base)
+            base += int(table.offsets[-1])
+        blob = np.concatenate([np.asarray(table.blob) for table in tables]) if tables else np.zeros(0, dtype=np.uint8)
+        return cls(blob, np.concatenate(offsets))
+
+    def find(self, value: str) -> int:
+        """
+        Binary search for a string (the table must be sorted by UTF-8 bytes).
+
+        Args:
+            value: String to look up
+
+        Returns:
+            Index of the string, or -1 if absent
+        """
+        target = value.encode("utf-8")
+        low, high = 0, len(self) - 1
+        while low <= high:
+            mid = (low + high) // 2
+            current = self._bytes(mid)
+            if current == target:
+                return mid
+            if current < target:
+                low = mid + 1
+            else:
+                high = mid - 1
+        return -1
+
+    def save(self, directory: Path, name: str) -> None:
+        """Write the table as `<name>.bin` and `<name>_offsets.npy`."""
+        with open(directory / f"{name}.bin", "wb") as f:
+            f.write(bytes(self.blob))
+        np.save(directory / f"{name}_offsets.npy", self.offsets)
+
+    @classmethod
+    def load(cls, directory: Path, name: str, mmap: bool = True) -> "StringTable":
+        """Load a table written by `save`."""
+        blob_path = directory / f"{name}.bin"
+        offsets = np.load(directory / f"{name}_offsets.npy", mmap_mode="r" if mmap else None)
+        if blob_path.stat().st_size == 0:
+            blob = np.zeros(0, dtype=np.uint8)
+        elif mmap:
+            blob = np.memmap(blob_path, dtype=np.uint8, mode="r")
+        else:
+            blob = np.fromfile(blob_path, dtype=np.uint8)
+        return cls(blob, offsets)
+
+
+class FilterColumns:
+    """
+    Metadata of a segment's documents that searches can be filtered on (see
+    MetadataFilter): a code per document for every categorical field, into
+    the list of that field's values, and the page number (-1 when absent).
+    A bitmap of the documents holding each value is computed on first use and
+    kept, so applying a filter takes a few vectorized boolean operations, and
+    the documents matching recent filters are cached.
+
+    Layout:
+        filter_values.json  values of every categorical field (code = position)
+        filter_codes.npy    code of every document for every field (documents x fields)
+        filter_pages.npy    page number of every document
+    """
+
+    def __init__(self, values: Dict[str, List[str]], codes: np.ndarray, pages: np.ndarray):
+        self.values = values
+        self.codes = codes
+        self.pages = pages
+        self._bitmaps: Dict[Tuple[str, str], np.ndarray] = {}
+        self._matches: Dict[Tuple, np.ndarray] = {}
+
+    @classmethod
+    def from_metadatas(cls, metadatas: Iterable[Optional[Dict]]) -> "FilterColumns":
+        """
+        Extract the filterable fields from document metadata.
+
+        Args:
+            metadatas: Metadata of every document (None when empty)
+
+        Returns:
+            FilterColumns instance
+        """
+        lookups: Dict[str, Dict[str, int]] = {field: {} for field in FILTER_FIELDS}
+        codes, pages = [], []
+        for metadata in metadatas:
+            metadata = metadata or {}
+            codes.append([
+                lookups[field].setdefault(str(metadata.get(field, "")), len(lookups[field]))
+                for field in FILTER_FIELDS
+            ])
+            page = metadata.get("page")
+            pages.append(page if isinstance(page, int) else -1)
+
+        return cls(
+            {field: list(lookups[field]) for field in FILTER_FIELDS},
+            np.asarray(codes, dtype=np.int32).reshape(len(pages), len(FILTER_FIELDS)),
+            np.asarray(pages, dtype=np.int32)
+        )
+
+    @classmethod
+    def concat(cls, parts: Sequence["FilterColumns"]) -> "FilterColumns":
+        """Stack the columns of several segments, merging their value lists."""
+        values: Dict[str, List[str]] = {field: [] for field in FILTER_FIELDS}
+        code_parts = []
+        for part in parts:
+            codes = np.array(part.codes, dtype=np.int32)
+            for column, field in enumerate(FILTER_FIELDS):
+                lookup = {value: position for position, value in enumerate(values[field])}
+                new_codes = np.array(
+                    [lookup.setdefault(value, len(lookup)) for value in part.values[field]], dtype=np.int32
+                )
+                values[field] = list(lookup)
+                if len(codes):
+                    codes[:, column] = new_codes[codes[:, column]]
+            code_parts.append(codes)
+
+        return cls(
+            values,
+            np.concatenate(code_parts) if code_parts else np.zeros((0, len(FILTER_FIELDS)), dtype=np.int32),
+            _concat([np.asarray(part.pages) for part in parts])
+        )
+
+    def take(self, docs: np.ndarray) -> "FilterColumns":
+        """Columns of a subset of the documents."""
+        return FilterColumns(self.values, np.asarray(self.codes)[docs], np.asarray(self.pages)[docs])
+
+    def bitmap(self, field: str, value: str) -> np.ndarray:
+        """Boolean array marking the documents whose field holds a value."""
+        bitmap = self._bitmaps.get((field, value))
+        if bitmap is None:
+            if value in self.values[field]:
+                code = self.values[field].index(value)
+                bitmap = np.asarray(self.codes[:, FILTER_FIELDS.index(field)]) == code
+            else:
+                bitmap = np.zeros(len(self.pages), dtype=bool)
+            self._bitmaps[(field, value)] = bitmap
+        return bitmap
+
+    def matching(self, metadata_filter: MetadataFilter) -> np.ndarray:
+        """
+        Documents passing a filter (deleted ones included).
+
+        Args:
+            metadata_filter: Filter to apply
+
+        Returns:
+            Segment-local document numbers, ascending
+        """
+        docs = self._matches.get(metadata_filter.key)
+        if docs is not None:
+            return docs
+
+        mask = np.ones(len(self.pages), dtype=bool)
+        for field in FILTER_FIELDS:
+            accepted = metadata_filter.values(field)
+            if accepted is not None:
+                field_mask = np.zeros(len(self.pages), dtype=bool)
+                for value in accepted:
+                    field_mask |= self.bitmap(field, value)
+                mask &= field_mask
+        if metadata_filter.page_range is not None:
+            first, last = metadata_filter.page_range
+            pages = np.asarray(self.pages)
+            mask &= pages >= (first if first is not None else 0)
+            if last is not None:
+                mask &= pages <= last
+
+        docs = np.flatnonzero(mask).astype(np.int32)
+        if len(self._matches) >= _FILTER_CACHE_SIZE:
+            self._matches.pop(next(iter(self._matches)), None)
+        self._matches[metadata_filter.key] = docs
+        return docs
+
+    def save(self, directory: Path) -> None:
+        """Write the columns into a directory."""
+        with open(directory / "filter_values.json", "w", encoding="utf-8") as f:
+            json.dump(self.values, f, ensure_ascii=False)
+        np.save(directory / "filter_codes.npy", np.asarray(self.codes))
+        np.save(directory / "filter_pages.npy", np.asarray(self.pages))
+
+    @classmethod
+    def load(cls, directory: Path, mmap: bool = True) -> Optional["FilterColumns"]:
+        """Read columns written by `save` (None if the directory has none)."""
+        if not (directory / "filter_values.json").exists():
+            return None
+        mode = "r" if mmap else None
+        with open(directory / "filter_values.json", encoding="utf-8") as f:
+            values = json.load(f)
+        return cls(
+            values,
+            np.load(directory / "filter_codes.npy", mmap_mode=mode),
+            np.load(directory / "filter_pages.npy", mmap_mode=mode)
+        )
+
+
+class IndexSegment:
+    """
+    Immutable inverted index over a batch of documents, plus a mutable
+    deletion mask.
+
+    Layout (one file per array, all memory-mappable):
+        terms            sorted vocabulary (term ID = position)
+        postings_offsets start of every term's postings list (+ end)
+        postings_docs    segment-local document numbers, grouped by term
+        postings_tfs     term frequencies, parallel to postings_docs
+        doc_lengths      number of terms in every document
+        doc_ids          chunk ID of every document (as stored in ChromaDB)
+        sorted_ids       chunk IDs in byte order (fixed-width bytes, for binary search)
+        id_order         document number of every entry of sorted_ids
+        texts            text of every document
+        metadatas        metadata of every document, JSON-encoded ("" when empty)
+        term_max_tfs     highest term frequency in every postings list
+        term_min_lengths shortest document in every postings list
+        filter_*         filterable metadata (see FilterColumns)
+        live_<gen>.npy   deletion mask (only once documents have been deleted)
+    """
+
+    def __init__(
+        self,
+        terms: StringTable,
+        postings_offsets: np.ndarray,
+        postings_docs: np.ndarray,
+        postings_tfs: np.ndarray,
+        doc_lengths: np.ndarray,
+        doc_ids: StringTable,
+        texts: StringTable,
+        metadatas: StringTable,
+        term_max_tfs: np.ndarray,
+        term_min_lengths: np.ndarray,
+        filter_columns: Optional[FilterColumns] = None,
+        id_table: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+        live: Optional[np.ndarray] = None,
+        num_live: Optional[int] = None,
+        live_length: Optional[int] = None,
+        name: Optional[str] = None
+    ):
+        self.terms = terms
+        self.postings_offsets = postings_offsets
+        self.postings_docs = postings_docs
+        self.postings_tfs = postings_tfs
+        self.doc_lengths = doc_lengths
+        self.doc_ids = doc_ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.term_max_tfs = term_max_tfs
+        self.term_min_lengths = term_min_lengths
+        self.name = name or uuid.uuid4().hex[:16]
+
+        # Derived from the stored metadata / chunk IDs on first use if not given
+        self._filter_columns = filter_columns
+        self._id_table = id_table
+
+        # None means no document of the segment has been deleted
+        self.live = live
+        self.num_live = len(doc_lengths) if num_live is None else num_live
+        self.live_length = int(np.sum(doc_lengths, dtype=np.int64)) if live_length is None else live_length
+
+        # Where the segment files and its current deletion mask were written
+        self.saved_dir: Optional[Path] = None
+        self.live_generation = 0
+        self.live_dirty = False
+
+        # Per-thread score accumulators, allocated once and reset after each query
+        self._local = threading.local()
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.doc_lengths)
+
+    @property
+    def num_deleted(self) -> int:
+        return self.num_docs - self.num_live
+
+    @property
+    def filter_columns(self) -> FilterColumns:
+        """Filterable metadata of the documents (segments written before filters existed derive it once)."""
+        if self._filter_columns is None:
+            self._filter_columns = FilterColumns.from_metadatas(self.metadata(doc) for doc in range(self.num_docs))
+        return self._filter_columns
+
+    @property
+    def id_table(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Sorted chunk IDs and their document numbers (segments written before the table existed derive it once)."""
+        if self._id_table is None:
+            self._id_table = _sort_ids(self.doc_ids)
+        return self._id_table
+
+    def find_docs(self, keys: np.ndarray) -> np.ndarray:
+        """
+        Look up live documents by chunk ID with a binary search over the
+        sorted IDs (memory-mapped for saved segments).
+
+        Args:
+            keys: UTF-8 encoded chunk IDs (see `_id_keys`)
+
+        Returns:
+            Segment-local number of every chunk ID (-1 if absent or deleted)
+        """
+        sorted_ids, id_order = self.id_table
+        docs = np.full(len(keys), -1, dtype=np.int64)
+        if not len(sorted_ids) or not len(keys):
+            return docs
+
+        positions = np.minimum(np.searchsorted(sorted_ids, keys), len(sorted_ids) - 1)
+        found = np.asarray(sorted_ids[positions]) == keys
+        docs[found] = np.asarray(id_order)[positions[found]]
+        if self.live is not None:
+            docs[found] = np.where(self.live[docs[found]], docs[found], -1)
+        return docs
+
+    @classmethod
+    def from_columns(
+        cls,
+        terms: Sequence[str],
+        term_column: np.ndarray,
+        doc_column: np.ndarray,
+        tf_column: np.ndarray,
+        doc_lengths: np.ndarray,
+        doc_ids: StringTable,
+        texts: StringTable,
+        metadatas: StringTable,
+        filter_columns: Optional[FilterColumns] = None
+    ) -> "IndexSegment":
+        """
+        Assemble a segment from (term, document, term frequency) postings.
+
+        Args:
+            terms: Vocabulary, in any order
+            term_column: Position in `terms` of every posting
+            doc_column: Document number of every posting
+            tf_column: Term frequency of every posting
+            doc_lengths: Number of terms in every document
+            doc_ids: Chunk ID of every document
+            texts: Text of every document
+            metadatas: JSON-encoded metadata of every document
+            filter_columns: Filterable metadata of every document
+
+        Returns:
+            IndexSegment instance
+        """
+        # Keep terms that still have postings, renumbered in UTF-8 byte order
+        # so lookups can binary search the raw blob
+        counts = np.bincount(term_column, minlength=len(terms))
+        used = np.flatnonzero(counts).tolist()
+        used.sort(key=lambda i: terms[i].encode("utf-8"))
+        rank = np.full(len(terms), -1, dtype=np.int32)
+        rank[used] = np.arange(len(used), dtype=np.int32)
+        term_column = rank[term_column]
+
+        # Group postings by term, documents ascending within each list
+        order = np.lexsort((doc_column, term_column))
+        postings_offsets = np.zeros(len(used) + 1, dtype=np.int64)
+        np.cumsum(counts[used], out=postings_offsets[1:])
+        postings_docs = doc_column[order].astype(np.int32)
+        postings_tfs = np.minimum(tf_column[order], 65535).astype(np.uint16)
+        doc_lengths = np.asarray(doc_lengths, dtype=np.int32)
+
+        # Per-term statistics bounding the BM25 contribution of any posting
+        # (used for dynamic pruning); every used term has at least one posting
+        if used:
+            term_max_tfs = np.maximum.reduceat(postings_tfs, postings_offsets[:-1])
+            term_min_lengths = np.minimum.reduceat(doc_lengths[postings_docs], postings_offsets[:-1])
+        else:
+            term_max_tfs = np.zeros(0, dtype=np.uint16)
+            term_min_lengths = np.zeros(0, dtype=np.int32)
+
+        return cls(
+            terms=StringTable.from_strings([terms[i] for i in used]),
+            postings_offsets=postings_offsets,
+            postings_docs=postings_docs,
+            postings_tfs=postings_tfs,
+            doc_lengths=doc_lengths,
+            doc_ids=doc_ids,
+            texts=texts,
+            metadatas=metadatas,
+            term_max_tfs=term_max_tfs,
+            term_min_lengths=term_min_lengths,
+            filter_columns=filter_columns,
+            id_table=_sort_ids(doc_ids)
+        )
+
+    @classmethod
+    def build(cls, texts: Sequence[str], doc_ids: Sequence[str], analyzer: Analyzer,
+              metadatas: Optional[Sequence[Optional[Dict]]] = None) -> "IndexSegment":
+        """
+        Analyze documents into a new segment.
+
+        Args:
+            texts: Document texts
+            doc_ids: Chunk IDs of the documents
+            analyzer: Analyzer turning text into terms
+            metadatas: Metadata of the documents (stored, not indexed)
+
+        Returns:
+            IndexSegment instance
+        """
+        # Intern every term as an integer ID in order of first appearance, and
+        # collect (term ID, document, term frequency) triples as integer arrays
+        vocabulary: Dict[str, int] = {}
+        doc_lengths = np.zeros(len(texts), dtype=np.int32)
+        term_parts, doc_parts, tf_parts = [], [], []
+
+        for doc_number, text in enumerate(texts):
+            term_ids = [vocabulary.setdefault(term, len(vocabulary)) for term in analyzer.analyze(text)]
+            doc_lengths[doc_number] = len(term_ids)
+            if not term_ids:
+                continue
+            unique_ids, counts = np.unique(np.array(term_ids, dtype=np.int32), return_counts=True)
+            term_parts.append(unique_ids)
+            doc_parts.append(np.full(len(unique_ids), doc_number, dtype=np.int32))
+            tf_parts.append(counts)
+
+        return cls.from_columns(
+            list(vocabulary),
+            _concat(term_parts),
+            _concat(doc_parts),
+            _concat(tf_parts),
+            doc_lengths,
+            StringTable.from_strings(list(doc_ids)),
+            StringTable.from_strings(list(texts)),
+            StringTable.from_strings([
+                json.dumps(metadata, ensure_ascii=False) if metadata else ""
+                for metadata in (metadatas or [None] * len(texts))
+            ]),
+            FilterColumns.from_metadatas(metadatas or [None] * len(texts))
+        )
+
+    @classmethod
+    def merge(cls, segments: Sequence["IndexSegment"]) -> "IndexSegment":
+        """
+        Combine segments into one, dropping deleted documents.
+        Postings are merged directly; no text is re-analyzed.
+
+        Args:
+            segments: Segments to merge (their document order is kept)
+
+        Returns:
+            IndexSegment instance
+        """
+        terms: List[str] = []
+        term_index: Dict[str, int] = {}
+        term_parts, doc_parts, tf_parts, length_parts = [], [], [], []
+        id_parts, text_parts, metadata_parts, filter_parts = [], [], [], []
+        doc_base = 0
+
+        for segment in segments:
+            live = segment.live_mask()
+            new_numbers = np.cumsum(live, dtype=np.int64) - 1 + doc_base
+
+            segment_terms = np.empty(len(segment.terms), dtype=np.int32)
+            for term_id in range(len(segment.terms)):
+                term = segment.terms[term_id]
+                if term not in term_index:
+                    term_index[term] = len(terms)
+                    terms.append(term)
+                segment_terms[term_id] = term_index[term]
+
+            posting_terms = np.repeat(segment_terms, np.diff(segment.postings_offsets))
+            docs = np.asarray(segment.postings_docs)
+            keep = live[docs]
+            term_parts.append(posting_terms[keep])
+            doc_parts.append(new_numbers[docs[keep]])
+            tf_parts.append(np.asarray(segment.postings_tfs)[keep])
+
+            live_docs = np.flatnonzero(live)
+            length_parts.append(np.asarray(segment.doc_lengths)[live_docs])
+            id_parts.append(segment.doc_ids.take(live_docs))
+            text_parts.append(segment.texts.take(live_docs))
+            metadata_parts.append(segment.metadatas.take(live_docs))
+            filter_parts.append(segment.filter_columns.take(live_docs))
+            doc_base += len(live_docs)
+
+        return cls.from_columns(
+            terms,
+            _concat(term_parts),
+            _concat(doc_parts),
+            _concat(tf_parts),
+            _concat(length_parts),
+            StringTable.concat(id_parts),
+            StringTable.concat(text_parts),
+            StringTable.concat(metadata_parts),
+            FilterColumns.concat(filter_parts)
+        )
+
+    def live_mask(self) -> np.ndarray:
+        """Boolean array marking documents that have not been deleted."""
+        return self.live if self.live is not None else np.ones(self.num_docs, dtype=bool)
+
+    def delete(self, doc: int) -> bool:
+        """
+        Mark a document as deleted.
+
+        Args:
+            doc: Segment-local document number
+
+        Returns:
+            True if the document was live
+        """
+        if self.live is None:
+            self.live = np.ones(self.num_docs, dtype=bool)
+        if not self.live[doc]:
+            return False
+
+        self.live[doc] = False
+        self.num_live -= 1
+        self.live_length -= int(self.doc_lengths[doc])
+        self.live_dirty = True
+        return True
+
+    def postings(self, term: str) -> Optional[Tuple[int, np.ndarray, np.ndarray]]:
+        """
+        Look up the postings list of a term.
+
+        Args:
+            term: Analyzed term
+
+        Returns:
+            Tuple of (term ID, documents, term frequencies), or None if the term is absent
+        """
+        term_id = self.terms.find(term)
+        if term_id < 0:
+            return None
+        start, end = self.postings_offsets[term_id], self.postings_offsets[term_id + 1]
+        return term_id, self.postings_docs[start:end], self.postings_tfs[start:end]
+
+    def metadata(self, doc: int) -> Dict:
+        """Decode the stored metadata of a document (segment-local number)."""
+        metadata = self.metadatas[doc]
+        return json.loads(metadata) if metadata else {}
+
+    def live_count(self, docs: np.ndarray) -> int:
+        """Number of live documents in a postings list."""
+        return len(docs) if self.live is None else int(np.count_nonzero(self.live[docs]))
+
+    def accumulator(self) -> np.ndarray:
+        """Zeroed score array for the calling thread (reused across queries)."""
+        scores = getattr(self._local, "scores", None)
+        if scores is None:
+            scores = np.zeros(self.num_docs, dtype=np.float32)
+            self._local.scores = scores
+        return scores
+
+    def write(self, segment_dir: Path) -> None:
+        """
+        Write the immutable segment files.
+
+        Args:
+            segment_dir: Directory for this segment (created)
+        """
+        tmp_dir = segment_dir.with_name(segment_dir.name + ".tmp")
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+        tmp_dir.mkdir(parents=True)
+
+        self.terms.save(tmp_dir, "terms")
+        self.doc_ids.save(tmp_dir, "doc_ids")
+        self.texts.save(tmp_dir, "texts")
+        self.metadatas.save(tmp_dir, "metadatas")
+        self.filter_columns.save(tmp_dir)
+        sorted_ids, id_order = self.id_table
+        np.save(tmp_dir / "sorted_ids.npy", np.asarray(sorted_ids))
+        np.save(tmp_dir / "id_order.npy", np.asarray(id_order))
+        np.save(tmp_dir / "postings_offsets.npy", np.asarray(self.postings_offsets))
+        np.save(tmp_dir / "postings_docs.npy", np.asarray(self.postings_docs))
+        np.save(tmp_dir / "postings_tfs.npy", np.asarray(self.postings_tfs))
+        np.save(tmp_dir / "doc_lengths.npy", np.asarray(self.doc_lengths))
+        np.save(tmp_dir / "term_max_tfs.npy", np.asarray(self.term_max_tfs))
+        np.save(tmp_dir / "term_min_lengths.npy", np.asarray(self.term_min_lengths))
+
+        tmp_dir.rename(segment_dir)
+        self.saved_dir = segment_dir.parent
+
+    def write_live(self, segment_dir: Path) -> None:
+        """Write the deletion mask under the next generation number."""
+        self.live_generation += 1
+        np.save(segment_dir / f"live_{self.live_generation}.npy", self.live)
+        self.live_dirty = False
+
+    @classmethod
+    def load(cls, segment_dir: Path, info: Dict, mmap: bool = True) -> "IndexSegment":
+        """
+        Open a segment written by `write`.
+
+        Args:
+            segment_dir: Segment directory
+            info: Segment entry of the commit point
+            mmap: Memory-map the arrays instead of reading them into memory
+
+        Returns:
+            IndexSegment instance
+        """
+        mode = "r" if mmap else None
+        live = None
+        if info.get("live_generation"):
+            live = np.load(segment_dir / f"live_{info['live_generation']}.npy")
+        id_table = None
+        if (segment_dir / "sorted_ids.npy").exists():
+            id_table = (
+                np.load(segment_dir / "sorted_ids.npy", mmap_mode=mode),
+                np.load(segment_dir / "id_order.npy", mmap_mode=mode)
+            )
+
+        segment = cls(
+            terms=StringTable.load(segment_dir, "terms", mmap=mmap),
+            postings_offsets=np.load(segment_dir / "postings_offsets.npy", mmap_mode=mode),
+            postings_docs=np.load(segment_dir / "postings_docs.npy", mmap_mode=mode),
+            postings_tfs=np.load(segment_dir / "postings_tfs.npy", mmap_mode=mode),
+            doc_lengths=np.load(segment_dir / "doc_lengths.npy", mmap_mode=mode),
+            doc_ids=StringTable.load(segment_dir, "doc_ids", mmap=mmap),
+            texts=StringTable.load(segment_dir, "texts", mmap=mmap),
+            metadatas=StringTable.load(segment_dir, "metadatas", mmap=mmap),
+            term_max_tfs=np.load(segment_dir / "term_max_tfs.npy", mmap_mode=mode),
+            term_min_lengths=np.load(segment_dir / "term_min_lengths.npy", mmap_mode=mode),
+            filter_columns=FilterColumns.load(segment_dir, mmap=mmap),
+            id_table=id_table,
+            live=live,
+            num_live=info["num_live"],
+            live_length=info["live_length"],
+            name=info["name"]
+        )
+        segment.saved_dir = segment_dir.parent
+        segment.live_generation = info.get("live_generation", 0)
+        return segment
+
+    def to_info(self) -> Dict:
+        """Segment entry for the commit point."""
+        return {
+            "name": self.name,
+            "num_docs": self.num_docs,
+            "num_live": self.num_live,
+            "live_length": self.live_length,
+            "live_generation": self.live_generation,
+        }
+
+
+def _concat(parts: List[np.ndarray]) -> np.ndarray:
+    """Concatenate arrays, tolerating an empty list."""
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int32)
+
+
+def _id_keys(doc_ids: Iterable[str]) -> np.ndarray:
+    """Chunk IDs as a fixed-width bytes array, comparable with a segment's sorted IDs."""
+    return np.array([chunk_id.encode("utf-8") for chunk_id in doc_ids], dtype=np.bytes_)
+
+
+def _sort_ids(doc_ids: StringTable) -> Tuple[np.ndarray, np.ndarray]:
+    """Sort a segment's chunk IDs for `IndexSegment.find_docs`, without decoding them."""
+    offsets = np.asarray(doc_ids.offsets)
+    lengths = np.diff(offsets)
+    width = max(int(lengths.max(initial=0)), 1)
+
+    # Copy every ID into a zero-padded row of a (documents x width) byte matrix
+    matrix = np.zeros((len(lengths), width), dtype=np.uint8)
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    columns = np.arange(offsets[-1]) - np.repeat(offsets[:-1], lengths)
+    matrix[rows, columns] = np.asarray(doc_ids.blob)[offsets[0]:offsets[-1]]
+
+    keys = matrix.view(f"S{width}").ravel()
+    order = np.argsort(keys, kind="stable").astype(np.int32)
+    return keys[order], order
+
+
+def _average_length(segments: List[IndexSegment]) -> float:
+    """Average length of the live documents of a segment list."""
+    num_docs = sum(segment.num_live for segment in segments)
+    return sum(segment.live_length for segment in segments) / num_docs if num_docs else 0.0
+
+
+def select_top_k(docs: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Select the k best-scoring documents.
+
+    Args:
+        docs: Document numbers
+        scores: Score of every document
+
+    Returns:
+        Tuple of (document numbers, scores), best first; documents tied with
+        the k-th score are taken by document number, so the result does not
+        depend on how many candidates were scored
+    """
+    if len(docs) > k:
+        kth = np.partition(scores, len(docs) - k)[len(docs) - k]
+        above = np.flatnonzero(scores > kth)
+        tied = np.flatnonzero(scores == kth)
+        tied = tied[np.argsort(docs[tied], kind="stable")[:k - len(above)]]
+        selected = np.concatenate([above, tied])
+        docs, scores = docs[selected], scores[selected]
+
+    # Best score first; ties broken by document number for stable results
+    order = np.lexsort((docs, -scores))
+    return docs[order], scores[order]
+
+
+def _kth_largest(values: np.ndarray, k: int) -> float:
+    """k-th largest value of an array, or 0 if it has fewer than k values."""
+    if len(values) < k:
+        return 0.0
+    return float(np.partition(values, len(values) - k)[len(values) - k])
+
+
+def _restrict_postings(docs: np.ndarray, tfs: np.ndarray, allowed: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Keep the postings of allowed documents only. The shorter of the two sorted
+    lists is looked up in the longer one, so a selective filter costs a few
+    binary searches instead of a pass over the postings.
+
+    Args:
+        docs: Documents of a postings list (ascending)
+        tfs: Term frequencies, parallel to docs
+        allowed: Documents to keep (ascending)
+
+    Returns:
+        Tuple of (documents, term frequencies) of the allowed postings
+    """
+    if len(allowed) < len(docs):
+        found, positions = _find_postings(docs, allowed)
+        return allowed[found], tfs[positions]
+    found, _ = _find_postings(allowed, docs)
+    return docs[found], tfs[found]
+
+
+def _find_postings(docs: np.ndarray, candidates: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Look up sorted candidate documents in a postings list.
+
+    Args:
+        docs: Documents of a postings list (ascending)
+        candidates: Documents to look up (ascending)
+
+    Returns:
+        Tuple of (mask of candidates present in the list, their positions in the list)
+    """
+    positions = np.searchsorted(docs, candidates)
+    found = positions < len(docs)
+    found[found] = docs[positions[found]] == candidates[found]
+    return found, positions[found]
+
+
+class SparseIndex:
+    """
+    Segmented BM25 index.
+
+    Scores use the Okapi BM25 formula with Lucene's IDF,
+    log(1 + (N - df + 0.5) / (df + 0.5)), which needs no corpus-wide average
+    and so can be updated incrementally. N, df and the average document length
+    count live documents only. Documents are addressed by a global number
+    (segment base + local number) that is stable until segments change.
+    """
+
+    def __init__(
+        self,
+        segments: Optional[List[IndexSegment]] = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+        analyzer: Optional[Analyzer] = None,
+        merge_factor: int = SPARSE_MERGE_FACTOR,
+        max_deleted_ratio: float = SPARSE_MAX_DELETED_RATIO
+    ):
+        """
+        Initialize the index.
+
+        Args:
+            segments: Segments of the index
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+            analyzer: Analyzer turning text into terms (defaults to the configured one)
+            merge_factor: Number of similarly sized segments merged at a time
+            max_deleted_ratio: Segments with more deleted documents than this are rewritten
+        """
+        self.k1 = k1
+        self.b = b
+        self.analyzer = analyzer or Analyzer()
+        self.merge_factor = merge_factor
+        self.max_deleted_ratio = max_deleted_ratio
+
+        # Writers hold the lock; readers work on a snapshot of the segment list
+        self._lock = threading.RLock()
+        self._set_segments(segments or [])
+
+    def _set_segments(self, segments: List[IndexSegment]) -> None:
+        """Replace the segment list and recompute document number bases."""
+        bases = np.zeros(len(segments) + 1, dtype=np.int64)
+        np.cumsum([segment.num_docs for segment in segments], out=bases[1:])
+        self._view = (segments, bases)
+
+    @property
+    def segments(self) -> List[IndexSegment]:
+        return self._view[0]
+
+    @property
+    def num_docs(self) -> int:
+        """Number of live documents."""
+        return sum(segment.num_live for segment in self.segments)
+
+    @property
+    def num_terms(self) -> int:
+        """Size of the largest segment vocabulary (the exact union is not tracked)."""
+        return max((len(segment.terms) for segment in self.segments), default=0)
+
+    @property
+    def avgdl(self) -> float:
+        """Average length of live documents."""
+        return _average_length(self.segments)
+
+    @property
+    def max_doc(self) -> int:
+        """Number of global document numbers in use (live and deleted documents)."""
+        return int(self._view[1][-1])
+
+    @classmethod
+    def build(
+        cls,
+        texts: Sequence[str],
+        doc_ids: Optional[Sequence[str]] = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+        analyzer: Optional[Analyzer] = None,
+        metadatas: Optional[Sequence[Optional[Dict]]] = None
+    ) -> "SparseIndex":
+        """
+        Build an index in memory.
+
+        Args:
+            texts: Document texts
+            doc_ids: Chunk IDs of the documents (defaults to their positions)
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+            analyzer: Analyzer turning text into terms (defaults to the configured one)
+            metadatas: Metadata of the documents (stored, not indexed)
+
+        Returns:
+            SparseIndex instance
+        """
+        index = cls(k1=k1, b=b, analyzer=analyzer)
+        if doc_ids is None:
+            doc_ids = [str(i) for i in range(len(texts))]
+        if len(texts):
+            index._set_segments([IndexSegment.build(texts, doc_ids, index.analyzer, metadatas)])
+        return index
+
+    @classmethod
+    def build_on_disk(
+        cls,
+        batches: Iterable[Tuple[Sequence[str], Sequence[str], Optional[Sequence[Optional[Dict]]]]],
+        index_dir: Path,
+        k1: float = 1.5,
+        b: float = 0.75,
+        analyzer: Optional[Analyzer] = None
+    ) -> "SparseIndex":
+        """
+        Build an index batch by batch, writing every batch as a segment and
+        reopening the index memory-mapped, so only one batch (and the segments
+        being merged by the merge policy) is held in memory at a time.
+        Replaces any index already in index_dir. Chunk IDs must be unique.
+
+        Args:
+            batches: (texts, chunk IDs, metadatas) of every batch of documents
+            index_dir: Target directory
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+            analyzer: Analyzer turning text into terms (defaults to the configured one)
+
+        Returns:
+            SparseIndex instance (memory-mapped)
+        """
+        index = cls(k1=k1, b=b, analyzer=analyzer)
+        for texts, doc_ids, metadatas in batches:
+            if not len(texts):
+                continue
+            with index._lock:
+                index._set_segments(index.segments + [IndexSegment.build(texts, doc_ids, index.analyzer, metadatas)])
+                index.maybe_merge()
+            index.save(index_dir)
+            index = cls.load(index_dir)
+
+        if not index.segments:
+            index.save(index_dir)
+        return index
+
+    def add_documents(self, texts: Sequence[str], doc_ids: Sequence[str],
+                      metadatas: Optional[Sequence[Optional[Dict]]] = None) -> None:
+        """
+        Index documents as a new segment. Documents whose chunk ID is already
+        indexed are replaced.
+
+        Args:
+            texts: Document texts
+            doc_ids: Chunk IDs of the documents
+            metadatas: Metadata of the documents (stored, not indexed)
+        """
+        if not len(texts):
+            return
+
+        with self._lock:
+            self.remove_documents(doc_ids)
+            segment = IndexSegment.build(texts, doc_ids, self.analyzer, metadatas)
+            self._set_segments(self.segments + [segment])
+            self.maybe_merge()
+
+        logger.debug(f"Added segment {segment.name} with {segment.num_docs} documents")
+
+    def remove_documents(self, doc_ids: Iterable[str]) -> int:
+        """
+        Delete documents by chunk ID (unknown IDs are ignored).
+
+        Args:
+            doc_ids: Chunk IDs to delete
+
+        Returns:
+            Number of documents deleted
+        """
+        keys = _id_keys(doc_ids)
+        removed = 0
+        with self._lock:
+            for segment in self.segments:
+                for doc in segment.find_docs(keys).tolist():
+                    if doc >= 0 and segment.delete(doc):
+                        removed += 1
+        return removed
+
+    def maybe_merge(self) -> None:
+        """
+        Apply the merge policy: rewrite segments with too many deleted documents,
+        drop fully deleted ones, and merge `merge_factor` segments of the same
+        size level (log base merge_factor of their live document count).
+        """
+        with self._lock:
+            segments = [segment for segment in self.segments if segment.num_live > 0]
+            segments = [
+                IndexSegment.merge([segment])
+                if segment.num_deleted > self.max_deleted_ratio * segment.num_docs else segment
+                for segment in segments
+            ]
+
+            while True:
+                levels: Dict[int, List[int]] = {}
+                for position, segment in enumerate(segments):
+                    level = int(math.log(max(segment.num_live, 1), self.merge_factor))
+                    levels.setdefault(level, []).append(position)
+
+                mergeable = [positions for positions in levels.values() if len(positions) >= self.merge_factor]
+                if not mergeable:
+                    break
+
+                positions = min(mergeable, key=lambda p: segments[p[0]].num_live)[:self.merge_factor]
+                merged = IndexSegment.merge([segments[p] for p in positions])
+                logger.info(f"Merged {len(positions)} sparse index segments ({merged.num_docs} documents)")
+
+                # The merged segment takes the place of the first one, keeping document order
+                segments = [
+                    merged if p == positions[0] else segment
+                    for p, segment in enumerate(segments)
+                    if p == positions[0] or p not in positions
+                ]
+
+            if [id(s) for s in segments] != [id(s) for s in self.segments]:
+                self._set_segments(segments)
+
+    def optimize(self) -> None:
+        """Merge all segments into one (removing every deleted document)."""
+        with self._lock:
+            if len(self.segments) > 1 or any(segment.num_deleted for segment in self.segments):
+                self._set_segments([IndexSegment.merge(self.segments)] if self.num_docs else [])
+
+    def save(self, index_dir: Path) -> None:
+        """
+        Write the index to a directory. Only new segments and changed deletion
+        masks are written; the commit point is replaced atomically and files no
+        longer referenced by it are removed.
+
+        Args:
+            index_dir: Target directory
+        """
+        with self._lock:
+            index_dir.mkdir(parents=True, exist_ok=True)
+            segments = self.segments
+
+            for segment in segments:
+                segment_dir = index_dir / segment.name
+                if segment.saved_dir != index_dir:
+                    segment.write(segment_dir)
+                    segment.live_generation = 0
+                    segment.live_dirty = segment.live is not None
+                if segment.live_dirty:
+                    segment.write_live(segment_dir)
+
+            commit = {
+                "format_version": SPARSE_INDEX_FORMAT_VERSION,
+                "k1": self.k1,
+                "b": self.b,
+                "analyzer": self.analyzer.to_config(),
+                "segments": [segment.to_info() for segment in segments],
+            }
+            tmp_path = index_dir / (SEGMENTS_FILE + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(commit, f, indent=2)
+            tmp_path.replace(index_dir / SEGMENTS_FILE)
+
+            # Remove segments and deletion masks the commit point no longer references
+            current = {segment.name: segment.live_generation for segment in segments}
+            for path in index_dir.iterdir():
+                if path.name == SEGMENTS_FILE:
+                    continue
+                if path.name not in current:
+                    if path.is_dir():
+                        shutil.rmtree(path)
+                    else:
+                        path.unlink()
+                    continue
+                for live_path in path.glob("live_*.npy"):
+                    if live_path.name != f"live_{current[path.name]}.npy":
+                        live_path.unlink()
+
+        logger.info(
+            f"Sparse index saved to {index_dir} "
+            f"({self.num_docs} documents in {len(segments)} segment(s))"
+        )
+
+    @classmethod
+    def load(cls, index_dir: Path, mmap: bool = True) -> "SparseIndex":
+        """
+        Open an index written by `save`.
+
+        Args:
+            index_dir: Index directory
+            mmap: Memory-map the arrays instead of reading them into memory
+
+        Returns:
+            SparseIndex instance
+        """
+        with open(index_dir / SEGMENTS_FILE, "r", encoding="utf-8") as f:
+            commit = json.load(f)
+
+        if commit.get("format_version") != SPARSE_INDEX_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported sparse index format {commit.get('format_version')} in {index_dir}"
+            )
+
+        segments = [IndexSegment.load(index_dir / info["name"], info, mmap=mmap) for info in commit["segments"]]
+        return cls(
+            segments=segments,
+            k1=commit["k1"],
+            b=commit["b"],
+            analyzer=Analyzer.from_config(commit["analyzer"])
+        )
+
+    def commit_state(self, index_dir: Path) -> Optional[Tuple[Tuple[str, int], ...]]:
+        """
+        Identify what this index has committed to a directory, so that other
+        processes opening the directory can check they see the same documents.
+
+        Args:
+            index_dir: Index directory
+
+        Returns:
+            (segment name, deletion mask generation) of every segment, or None if
+            the index has changes not saved to index_dir
+        """
+        segments = self.segments
+        if any(segment.saved_dir != index_dir or segment.live_dirty for segment in segments):
+            return None
+        return tuple((segment.name, segment.live_generation) for segment in segments)
+
+    def doc_id(self, doc: int) -> str:
+        """
+        Chunk ID of a document.
+
+        Args:
+            doc: Global document number
+
+        Returns:
+            Chunk ID
+        """
+        segment, local = self._resolve(doc)
+        return segment.doc_ids[local]
+
+    def doc_numbers(self, doc_ids: Sequence[str]) -> np.ndarray:
+        """
+        Global document numbers of live documents, by chunk ID. Every segment
+        is binary searched through its persisted ID table, so no per-process
+        map of all chunk IDs is built.
+
+        Args:
+            doc_ids: Chunk IDs
+
+        Returns:
+            Global document number of every chunk ID (-1 if it is not indexed)
+        """
+        segments, bases = self._view
+        keys = _id_keys(doc_ids)
+
+        numbers = np.full(len(keys), -1, dtype=np.int64)
+        for segment, base in zip(segments, bases):
+            docs = segment.find_docs(keys)
+            found = docs >= 0
+            numbers[found] = base + docs[found]
+        return numbers
+
+    def text(self, doc: int) -> str:
+        """
+        Stored text of a document, read from the (mapped) segment files.
+
+        Args:
+            doc: Global document number
+
+        Returns:
+            Chunk text
+        """
+        segment, local = self._resolve(doc)
+        return segment.texts[local]
+
+    def metadata(self, doc: int) -> Dict:
+        """
+        Stored metadata of a document, read from the (mapped) segment files.
+
+        Args:
+            doc: Global document number
+
+        Returns:
+            Chunk metadata
+        """
+        segment, local = self._resolve(doc)
+        return segment.metadata(local)
+
+    def filter_values(self, field: str) -> List[str]:
+        """
+        Distinct values of a filterable metadata field among live documents.
+
+        Args:
+            field: Field name (one of FILTER_FIELDS)
+
+        Returns:
+            Sorted values
+        """
+        values = set()
+        for segment in self.segments:
+            columns = segment.filter_columns
+            codes = np.asarray(columns.codes[:, FILTER_FIELDS.index(field)])
+            if segment.live is not None:
+                codes = codes[segment.live]
+            values.update(columns.values[field][code] for code in np.unique(codes).tolist())
+        return sorted(values)
+
+    def _filtered_docs(self, segments: List[IndexSegment], metadata_filter: MetadataFilter) -> List[np.ndarray]:
+        """Segment-local numbers of the live documents passing a filter, per segment (ascending)."""
+        allowed = []
+        for segment in segments:
+            docs = segment.filter_columns.matching(metadata_filter)
+            allowed.append(docs if segment.live is None else docs[segment.live[docs]])
+        return allowed
+
+    def filter_docs(self, metadata_filter: MetadataFilter) -> np.ndarray:
+        """
+        Live documents passing a metadata filter, from the per-value bitmaps
+        of every segment.
+
+        Args:
+            metadata_filter: Filter to apply
+
+        Returns:
+            Global document numbers, ascending
+        """
+        segments, bases = self._view
+        allowed = self._filtered_docs(segments, metadata_filter)
+        return _concat([docs.astype(np.int64) + bases[position] for position, docs in enumerate(allowed)]).astype(np.int64)
+
+    def _resolve(self, doc: int) -> Tuple[IndexSegment, int]:
+        """Segment and segment-local number of a global document number."""
+        segments, bases = self._view
+        position = int(np.searchsorted(bases, doc, side="right")) - 1
+        return segments[position], doc - int(bases[position])
+
+    def idf(self, doc_freq: int, num_docs: int) -> float:
+        """Lucene BM25 inverse document frequency."""
+        return math.log(1 + (num_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def _query_terms(self, query: str, segments: List[IndexSegment]) -> List[Tuple[str, float, List]]:
+        """
+        Look up the postings of every distinct query term in every segment.
+
+        Args:
+            query: Query text
+            segments: Segment snapshot to search
+
+        Returns:
+            List of (term, weight, [(segment position, term ID, docs, tfs), ...])
+            per term found, where weight is the term's IDF times its number of
+            occurrences in the query
+        """
+        num_docs = sum(segment.num_live for segment in segments)
+        terms = []
+
+        for term, query_freq in Counter(self.analyzer.analyze(query)).items():
+            postings = []
+            doc_freq = 0
+            for position, segment in enumerate(segments):
+                found = segment.postings(term)
+                if found is None:
+                    continue
+                term_id, docs, tfs = found
+                doc_freq += segment.live_count(docs)
+                postings.append((position, term_id, docs, tfs))
+
+            if doc_freq:
+                terms.append((term, query_freq * self.idf(doc_freq, num_docs), postings))
+
+        return terms
+
+    def _term_scores(self, weight: float, segment: IndexSegment, docs: np.ndarray,
+                     tfs: np.ndarray, avgdl: float) -> np.ndarray:
+        """BM25 contribution of one term to each document of its postings list."""
+        tfs = tfs.astype(np.float32)
+        norms = self.k1 * (1 - self.b + self.b * segment.doc_lengths[docs] / avgdl)
+        return weight * tfs * (self.k1 + 1) / (tfs + norms)
+
+    def _upper_bound(self, weight: float, segment: IndexSegment, term_id: int, avgdl: float) -> float:
+        """
+        Largest BM25 contribution a term can make to any document of a segment.
+        The contribution grows with term frequency and shrinks with document
+        length, so the segment's highest frequency and shortest document bound
+        it; the bound stays valid as corpus statistics change.
+        """
+        tf = float(segment.term_max_tfs[term_id])
+        norm = self.k1 * (1 - self.b + self.b * float(segment.term_min_lengths[term_id]) / avgdl)
+        return weight * tf * (self.k1 + 1) / (tf + norm)
+
+    def _segment_scores(self, segment: IndexSegment, term_postings: List, avgdl: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score every live document of a segment that matches a query term.
+
+        Args:
+            segment: Segment to score
+            term_postings: (weight, term ID, docs, tfs) of every query term found in the segment
+            avgdl: Average length of live documents
+
+        Returns:
+            Tuple of (segment-local document numbers, scores)
+        """
+        scores = segment.accumulator()
+        for weight, _, docs, tfs in term_postings:
+            # Documents appear once per postings list, so fancy-index += is safe
+            scores[docs] += self._term_scores(weight, segment, docs, tfs, avgdl)
+
+        candidates = np.unique(np.concatenate([docs for _, _, docs, _ in term_postings]))
+        candidate_scores = scores[candidates]
+        scores[candidates] = 0.0
+
+        keep = candidate_scores > 0
+        if segment.live is not None:
+            keep &= segment.live[candidates]
+        return candidates[keep], candidate_scores[keep]
+
+    def _pruned_segment_scores(self, segment: IndexSegment, term_postings: List, avgdl: float,
+                               k: int, threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score the documents of a segment that can still reach the top k, using
+        MaxScore dynamic pruning over the per-term upper bounds.
+
+        Terms are visited by decreasing upper bound. While the bounds of the
+        terms not yet visited add up to at least the current k-th best score,
+        any document may still qualify, so whole postings lists are scored.
+        Once they fall below it, documents outside the candidate set can no
+        longer qualify: the remaining terms are only looked up for candidates,
+        and candidates whose partial score plus the remaining bound falls short
+        are dropped. Survivors are rescored in query term order, so their
+        scores are bit-for-bit those of exhaustive scoring.
+
+        Args:
+            segment: Segment to score
+            term_postings: (weight, term ID, docs, tfs) of every query term found in the segment
+            avgdl: Average length of live documents
+            k: Number of documents wanted
+            threshold: k-th best score already found in other segments (0 if none)
+
+        Returns:
+            Tuple of (segment-local document numbers, scores); includes at least
+            every document of the segment that belongs to the overall top k
+        """
+        bounds = np.array([
+            self._upper_bound(weight, segment, term_id, avgdl) for weight, term_id, _, _ in term_postings
+        ]) * (1 + _PRUNING_SLACK)
+        order = np.argsort(-bounds, kind="stable")
+        # Most the terms after each step can still add to a document's score
+        remaining = np.append(np.cumsum(bounds[order][::-1])[::-1][1:], 0.0)
+
+        live = segment.live
+        theta = threshold * (1 - _PRUNING_SLACK)
+        scores = segment.accumulator()
+        scored: List[np.ndarray] = []
+        candidates = partial = None
+
+        for step, term in enumerate(order):
+            weight, _, docs, tfs = term_postings[term]
+
+            if partial is None:
+                scores[docs] += self._term_scores(weight, segment, docs, tfs, avgdl)
+                scored.append(docs)
+                if remaining[step] >= theta:
+                    # The k-th best partial score of this term's documents is a
+                    # lower bound of the k-th best final score
+                    term_scores = scores[docs] if live is None else scores[docs][live[docs]]
+                    theta = max(theta, _kth_largest(term_scores, k) * (1 - _PRUNING_SLACK))
+                if remaining[step] >= theta and step + 1 < len(order):
+                    continue
+
+                # No document outside the candidates can reach the top k any more
+                candidates = np.unique(np.concatenate(scored))
+                partial = scores[candidates].astype(np.float64)
+                scores[candidates] = 0.0
+                if live is not None:
+                    keep = live[candidates]
+                    candidates, partial = candidates[keep], partial[keep]
+            else:
+                found, positions = _find_postings(docs, candidates)
+                partial[found] += self._term_scores(weight, segment, candidates[found], tfs[positions], avgdl)
+
+            theta = max(theta, _kth_largest(partial, k) * (1 - _PRUNING_SLACK))
+            keep = partial + remaining[step] >= theta
+            candidates, partial = candidates[keep], partial[keep]
+
+        # Exact scores, accumulated in the same order and precision as `_segment_scores`
+        exact = np.zeros(len(candidates), dtype=np.float32)
+        for weight, _, docs, tfs in term_postings:
+            found, positions = _find_postings(docs, candidates)
+            exact[found] += self._term_scores(weight, segment, candidates[found], tfs[positions], avgdl)
+
+        keep = exact > 0
+        return candidates[keep], exact[keep]
+
+    def top_k(self, query: str, k: int, prune: bool = False,
+              metadata_filter: Optional[MetadataFilter] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k best-scoring documents for a query.
+        Only the postings of the query terms are read, so the cost grows with
+        the number of matching postings rather than with the corpus size.
+
+        With a metadata filter, only documents passing it are scored: each
+        postings list is cut down to them before scoring (see
+        `_restrict_postings`), so the more selective the filter, the less
+        work. Term statistics (IDF, average length) stay corpus-wide.
+
+        Args:
+            query: Query text
+            k: Number of documents to return
+            prune: Skip documents that provably cannot reach the top k (see
+                `_pruned_segment_scores`); the result is identical either way
+            metadata_filter: Only return documents passing this filter
+
+        Returns:
+            Tuple of (global document numbers, scores), best first; deleted
+            documents and documents with a score of zero are never returned
+        """
+        segments, bases = self._view
+        terms = self._query_terms(query, segments)
+        if not terms or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        allowed = self._filtered_docs(segments, metadata_filter) if metadata_filter is not None else None
+        return self._search(terms, segments, bases, _average_length(segments), k, prune, allowed)
+
+    def top_k_many(self, queries: Sequence[str], k: int,
+                   metadata_filter: Optional[MetadataFilter] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Find the k best-scoring documents for each of many queries. The postings
+        of every distinct term in the batch are read and length-normalized once,
+        and each segment is scored with one sparse matrix product: the
+        (queries x terms) matrix of query term weights times the
+        (terms x documents) matrix of BM25 term frequency components.
+
+        Args:
+            queries: Query texts
+            k: Number of documents to return per query
+            metadata_filter: Only return documents passing this filter (as `top_k`)
+
+        Returns:
+            (global document numbers, scores) of every query, best first (as `top_k`)
+        """
+        if scipy_sparse is None:
+            return [self.top_k(query, k, metadata_filter=metadata_filter) for query in queries]
+
+        results = []
+        for start in range(0, len(queries), _QUERY_BLOCK):
+            results.extend(self._top_k_block(queries[start:start + _QUERY_BLOCK], k, metadata_filter))
+        return results
+
+    def _top_k_block(self, queries: Sequence[str], k: int,
+                     metadata_filter: Optional[MetadataFilter] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Score a block of queries with sparse matrix products (see `top_k_many`)."""
+        segments, bases = self._view
+        allowed = self._filtered_docs(segments, metadata_filter) if metadata_filter is not None else None
+        num_docs = sum(segment.num_live for segment in segments)
+        if k <= 0 or not num_docs:
+            return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)) for _ in queries]
+        avgdl = _average_length(segments)
+
+        # Postings (by segment position) and IDF of every distinct query term found
+        query_terms = [Counter(self.analyzer.analyze(query)) for query in queries]
+        columns: Dict[str, int] = {}
+        term_postings: List[Dict[int, Tuple[np.ndarray, np.ndarray]]] = []
+        idfs = []
+        for term in sorted({term for terms in query_terms for term in terms}):
+            postings = {}
+            doc_freq = 0
+            for position, segment in enumerate(segments):
+                found = segment.postings(term)
+                if found is not None:
+                    _, docs, tfs = found
+                    doc_freq += segment.live_count(docs)
+                    postings[position] = (docs, tfs)
+            if doc_freq:
+                columns[term] = len(idfs)
+                term_postings.append(postings)
+                idfs.append(self.idf(doc_freq, num_docs))
+
+        # Query term weights: IDF times the number of occurrences in the query
+        rows, cols, weights = [], [], []
+        for row, terms in enumerate(query_terms):
+            for term, query_freq in terms.items():
+                col = columns.get(term)
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+                    weights.append(query_freq * idfs[col])
+        query_matrix = scipy_sparse.csr_matrix(
+            (np.asarray(weights, dtype=np.float32), (rows, cols)), shape=(len(queries), len(idfs))
+        )
+
+        doc_parts = [[np.zeros(0, dtype=np.int64)] for _ in queries]
+        score_parts = [[np.zeros(0, dtype=np.float32)] for _ in queries]
+        for position, segment in enumerate(segments):
+            indptr = np.zeros(len(idfs) + 1, dtype=np.int64)
+            indices, data = [np.zeros(0, dtype=np.int32)], [np.zeros(0, dtype=np.float32)]
+            for col, postings in enumerate(term_postings):
+                docs, tfs = postings.get(position, (None, None))
+                if docs is not None and allowed is not None:
+                    docs, tfs = _restrict_postings(docs, tfs, allowed[position])
+                if docs is not None:
+                    indices.append(docs)
+                    data.append(self._term_scores(1.0, segment, docs, tfs, avgdl).astype(np.float32))
+                indptr[col + 1] = indptr[col] + (len(docs) if docs is not None else 0)
+            if not indptr[-1]:
+                continue
+
+            term_matrix = scipy_sparse.csr_matrix(
+                (np.concatenate(data), np.concatenate(indices), indptr), shape=(len(idfs), segment.num_docs)
+            )
+            scores = (query_matrix @ term_matrix).tocsr()
+
+            for row in range(len(queries)):
+                low, high = scores.indptr[row], scores.indptr[row + 1]
+                docs, row_scores = scores.indices[low:high], scores.data[low:high]
+                keep = row_scores > 0
+                if segment.live is not None:
+                    keep &= segment.live[docs]
+                doc_parts[row].append(docs[keep].astype(np.int64) + bases[position])
+                score_parts[row].append(row_scores[keep])
+
+        return [
+            select_top_k(np.concatenate(doc_parts[row]), np.concatenate(score_parts[row]), k)
+            for row in range(len(queries))
+        ]
+
+    def query_weights(self, query: str) -> Tuple[List[Tuple[str, float]], float]:
+        """
+        Corpus-wide scoring statistics of a query, so that parts of the index can
+        be scored separately with `top_k_weighted` and still rank consistently.
+
+        Args:
+            query: Query text
+
+        Returns:
+            Tuple of ([(term, weight), ...] for the query terms found, average
+            length of live documents)
+        """
+        segments, _ = self._view
+        terms = self._query_terms(query, segments)
+        return [(term, weight) for term, weight, _ in terms], _average_length(segments)
+
+    def top_k_weighted(
+        self,
+        weighted_terms: List[Tuple[str, float]],
+        avgdl: float,
+        k: int,
+        prune: bool = False,
+        doc_range: Optional[Tuple[int, int]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k best-scoring documents using term weights and an average
+        length computed elsewhere (see `query_weights`).
+
+        Args:
+            weighted_terms: (term, weight) pairs
+            avgdl: Average length of live documents
+            k: Number of documents to return
+            prune: Skip documents that provably cannot reach the top k
+            doc_range: Only score global document numbers in [start, end)
+
+        Returns:
+            Tuple of (global document numbers, scores), best first
+        """
+        segments, bases = self._view
+        start, end = doc_range if doc_range is not None else (0, int(bases[-1]))
+
+        terms = []
+        for term, weight in weighted_terms:
+            postings = []
+            for position, segment in enumerate(segments):
+                low = max(start - int(bases[position]), 0)
+                high = min(end - int(bases[position]), segment.num_docs)
+                if low >= high:
+                    continue
+                found = segment.postings(term)
+                if found is None:
+                    continue
+                term_id, docs, tfs = found
+                if low > 0 or high < segment.num_docs:
+                    first, last = np.searchsorted(docs, [low, high])
+                    docs, tfs = docs[first:last], tfs[first:last]
+                postings.append((position, term_id, docs, tfs))
+            terms.append((term, weight, postings))
+
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        return self._search(terms, segments, bases, avgdl, k, prune)
+
+    def _search(self, terms: List[Tuple[str, float, List]], segments: List[IndexSegment],
+                bases: np.ndarray, avgdl: float, k: int, prune: bool,
+                allowed: Optional[List[np.ndarray]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score the looked-up postings of a query and select the top k (see
+        `top_k`), among the allowed documents of every segment if given.
+        """
+        # Postings grouped by segment
+        by_segment: Dict[int, List] = {}
+        for _, weight, postings in terms:
+            for position, term_id, docs, tfs in postings:
+                if allowed is not None:
+                    docs, tfs = _restrict_postings(docs, tfs, allowed[position])
+                if len(docs):
+                    by_segment.setdefault(position, []).append((weight, term_id, docs, tfs))
+
+        doc_parts = [np.zeros(0, dtype=np.int64)]
+        score_parts = [np.zeros(0, dtype=np.float32)]
+        threshold = 0.0
+        for position, term_postings in by_segment.items():
+            segment = segments[position]
+            # Postings cut down by a selective filter are too short for pruning to pay off
+            if prune and (allowed is None or 2 * len(allowed[position]) > segment.num_docs):
+                docs, scores = self._pruned_segment_scores(segment, term_postings, avgdl, k, threshold)
+            else:
+                docs, scores = self._segment_scores(segment, term_postings, avgdl)
+            doc_parts.append(docs.astype(np.int64) + bases[position])
+            score_parts.append(scores)
+
+            if prune:
+                # The k-th best exact score so far bounds the top k of the remaining segments
+                threshold = max(threshold, _kth_largest(np.concatenate(score_parts), k))
+
+        return select_top_k(np.concatenate(doc_parts), np.concatenate(score_parts), k)
+
+    def get_scores(self, query: str) -> np.ndarray:
+        """
+        Compute the BM25 score of every document for a query.
+
+        Args:
+            query: Query text
+
+        Returns:
+            Array of scores indexed by global document number (0 for deleted documents)
+        """
+        segments, bases = self._view
+        scores = np.zeros(int(bases[-1]), dtype=np.float32)
+        terms = self._query_terms(query, segments)
+        if not terms:
+            return scores
+
+        avgdl = _average_length(segments)
+        for _, weight, postings in terms:
+            for position, _, docs, tfs in postings:
+                segment = segments[position]
+                scores[docs + bases[position]] += self._term_scores(weight, segment, docs, tfs, avgdl)
+
+        for position, segment in enumerate(segments):
+            if segment.live is not None:
+                scores[bases[position]:bases[position + 1]][~segment.live] = 0.0
+        return scores
+
+
+def sparse_index_exists(index_dir: Path) -> bool:
+    """
+    Check whether a sparse index has been written to a directory.
+
+    Args:
+        index_dir: Index directory
+
+    Returns:
+        True if the index commit point is present
+    """
+    return (index_dir / SEGMENTS_FILE).exists()
@@ -0,0 +1,142 @@
+"""
+Parallel sparse retrieval.
+Splits a persisted sparse index into shards (contiguous ranges of document
+numbers) that are scored in worker processes. Every worker memory-maps the
+same index files, so the shards share one copy of the index in the page cache.
+Term weights and the average document length are computed once over the whole
+index and sent with the query, so all shards score with the same global
+statistics and their top-k lists can simply be merged.
+"""
+
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from src.sparse_index import SparseIndex, select_top_k
+
+logger = logging.getLogger(__name__)
+
+# Index opened by the current worker process
+_worker_index: Optional[SparseIndex] = None
+_worker_dir: Optional[Path] = None
+
+
+def _open_worker_index(index_dir: str) -> None:
+    """Worker initializer: memory-map the index."""
+    global _worker_index, _worker_dir
+    _worker_dir = Path(index_dir)
+    _worker_index = SparseIndex.load(_worker_dir)
+
+
+def _score_shard(
+    state: Tuple,
+    weighted_terms: List[Tuple[str, float]],
+    avgdl: float,
+    k: int,
+    prune: bool,
+    doc_range: Tuple[int, int]
+) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Score one shard in a worker process.
+
+    Args:
+        state: Commit state of the caller's index
+        weighted_terms: Global (term, weight) pairs of the query
+        avgdl: Global average document length
+        k: Number of documents to return
+        prune: Use dynamic pruning
+        doc_range: Global document numbers of the shard, [start, end)
+
+    Returns:
+        Tuple of (global document numbers, scores), or None if the index on
+        disk no longer matches the caller's
+    """
+    if _worker_index.commit_state(_worker_dir) != state:
+        # The index was saved again since this worker opened it
+        _open_worker_index(str(_worker_dir))
+        if _worker_index.commit_state(_worker_dir) != state:
+            return None
+    return _worker_index.top_k_weighted(weighted_terms, avgdl, k, prune=prune, doc_range=doc_range)
+
+
+class ShardedSparseSearcher:
+    """
+    Scores a persisted sparse index in parallel worker processes.
+    Falls back to scoring in the current process while the index has changes
+    that are not saved (the workers only see what is on disk).
+    """
+
+    def __init__(self, index: SparseIndex, index_dir: Path, num_shards: int):
+        """
+        Start the worker processes.
+
+        Args:
+            index: Index loaded from index_dir in this process
+            index_dir: Directory the workers open the index from
+            num_shards: Number of shards (one worker process each)
+        """
+        self.index = index
+        self.index_dir = index_dir
+        self.num_shards = num_shards
+
+        # Spawned rather than forked: the app process runs threads of its own
+        self._executor = ProcessPoolExecutor(
+            max_workers=num_shards,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_open_worker_index,
+            initargs=(str(index_dir),)
+        )
+        logger.info(f"Sparse index split into {num_shards} shards")
+
+    def shard_ranges(self) -> List[Tuple[int, int]]:
+        """Split the document numbers of the index into contiguous ranges of similar size."""
+        bounds = np.linspace(0, self.index.max_doc, self.num_shards + 1).astype(np.int64)
+        return [
+            (int(start), int(end))
+            for start, end in zip(bounds[:-1], bounds[1:])
+            if start < end
+        ]
+
+    def top_k(self, query: str, k: int, prune: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k best-scoring documents for a query (same result as `SparseIndex.top_k`).
+
+        Args:
+            query: Query text
+            k: Number of documents to return
+            prune: Use dynamic pruning within each shard
+
+        Returns:
+            Tuple of (global document numbers, scores), best first
+        """
+        state = self.index.commit_state(self.index_dir)
+        if state is None:
+            return self.index.top_k(query, k, prune=prune)
+
+        weighted_terms, avgdl = self.index.query_weights(query)
+        if not weighted_terms or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        futures = [
+            self._executor.submit(_score_shard, state, weighted_terms, avgdl, k, prune, doc_range)
+            for doc_range in self.shard_ranges()
+        ]
+        results = [future.result() for future in futures]
+
+        if any(result is None for result in results):
+            logger.warning("Sparse index on disk differs from the loaded one; scoring in process")
+            return self.index.top_k(query, k, prune=prune)
+
+        return select_top_k(
+            np.concatenate([docs for docs, _ in results]),
+            np.concatenate([scores for _, scores in results]),
+            k
+        )
+
+    def close(self) -> None:
+        """Stop the worker processes."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -60,12 +60,13 @@ def validate_document_directory(doc_dir: Path) -> bool:
         logging.error(f"Documents directory does not exist: {doc_dir}")
         return False
     
-    # Check if there are any supported documents
+    # Check if there are any supported documents (single pass over the tree)
     supported_extensions = get_supported_file_extensions()
-    files = []
-    
-    for ext in supported_extensions:
-        files.extend(list(doc_dir.glob(f"**/*{ext}")))
+    extension_set = set(supported_extensions)
+    files = [
+        path for path in doc_dir.rglob("*")
+        if path.suffix.lower() in extension_set and path.is_file()
+    ]
     
     if not files:
         logging.warning(f"No supported documents found in: {doc_dir}")
@@ -0,0 +1,119 @@
+"""
+Regression tests for incremental indexing with chunk deduplication.
+Files whose chunks were merged into another file's chunks must stay recorded
+in the manifest (so they are not re-added on every run), and their content must
+survive the file that owns the kept chunk being deleted or edited. Streaming
+runs must record duplicates dropped after their kept chunk was written.
+
+Usage:
+    python -m pytest tests/
+"""
+
+import os
+import random
+import sys
+from pathlib import Path
+
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.embedding import DeterministicEmbeddings
+from src.ingestion import DocumentIndexer
+from src.sparse_index import SparseIndex
+
+
+def paragraph(seed: int) -> str:
+    """A paragraph of about 900 characters (one chunk) that differs per seed."""
+    rng = random.Random(seed)
+    words = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 9))) for _ in range(300)]
+    text = ""
+    while len(text) < 900:
+        text += " ".join(rng.sample(words, 12)).capitalize() + ". "
+    return text.strip()
+
+
+A, B, C = paragraph(1), paragraph(2), paragraph(3)
+
+
+def make_indexer(root: Path, **kwargs) -> DocumentIndexer:
+    return DocumentIndexer(
+        root / "docs",
+        root / "chroma",
+        chunk_size=1000,
+        chunk_overlap=0,
+        manifest_path=root / "manifest.json",
+        loader_workers=1,
+        use_embedding_cache=False,
+        use_pdf_cache=False,
+        sparse_index_dir=root / "sparse",
+        dense_index_dir=None,
+        embeddings=DeterministicEmbeddings(8),
+        **kwargs
+    )
+
+
+def write_files(root: Path, files: dict) -> None:
+    (root / "docs").mkdir(parents=True, exist_ok=True)
+    for name, text in files.items():
+        (root / "docs" / name).write_text(text, encoding="utf-8")
+
+
+def stored_texts(vectorstore, root: Path) -> list:
+    texts = sorted(vectorstore._collection.get()["documents"])
+    assert SparseIndex.load(root / "sparse").num_docs == len(texts)
+    return texts
+
+
+def test_fully_deduplicated_file_is_not_re_added(tmp_path):
+    write_files(tmp_path, {"a.md": A, "b.md": A})
+    indexer = make_indexer(tmp_path)
+    assert stored_texts(indexer.index_documents(), tmp_path) == [A]
+
+    for _ in range(2):
+        assert stored_texts(indexer.index_documents(incremental=True), tmp_path) == [A]
+
+
+def test_shared_chunk_survives_deleting_its_owner(tmp_path):
+    write_files(tmp_path, {"a.md": A, "b.md": A + "\n\n" + B})
+    indexer = make_indexer(tmp_path)
+    assert stored_texts(indexer.index_documents(), tmp_path) == sorted([A, B])
+
+    (tmp_path / "docs" / "a.md").unlink()
+    assert stored_texts(indexer.index_documents(incremental=True), tmp_path) == sorted([A, B])
+
+
+def test_shared_chunk_survives_editing_its_owner(tmp_path):
+    write_files(tmp_path, {"a.md": A, "b.md": A + "\n\n" + B})
+    indexer = make_indexer(tmp_path)
+    indexer.index_documents()
+
+    (tmp_path / "docs" / "a.md").write_text(C, encoding="utf-8")
+    assert stored_texts(indexer.index_documents(incremental=True), tmp_path) == sorted([A, B, C])
+
+
+def test_new_file_is_deduplicated_against_stored_chunks(tmp_path):
+    write_files(tmp_path, {"b.md": A + "\n\n" + B})
+    indexer = make_indexer(tmp_path)
+    indexer.index_documents()
+
+    write_files(tmp_path, {"a.md": A})
+    assert stored_texts(indexer.index_documents(incremental=True), tmp_path) == sorted([A, B])
+
+    (tmp_path / "docs" / "b.md").unlink()
+    assert stored_texts(indexer.index_documents(incremental=True), tmp_path) == [A]
+
+
+def test_streaming_records_duplicates_of_already_written_chunks(tmp_path):
+    # The queue lets loading run only a few batches ahead, so the copy of A in
+    # c.md is dropped after the batch holding A was written
+    files = {"a.md": A, "c.md": A}
+    files.update({f"b{i}.md": paragraph(10 + i) for i in range(8)})
+    write_files(tmp_path, files)
+    indexer = make_indexer(tmp_path, write_batch_size=1, queue_size=1)
+    vectorstore = indexer.index_documents(streaming=True)
+
+    stored = vectorstore._collection.get(include=["documents", "metadatas"])
+    metadata = stored["metadatas"][stored["documents"].index(A)]
+    assert metadata["duplicate_count"] == 1
+    assert metadata["duplicate_sources"].endswith("c.md")
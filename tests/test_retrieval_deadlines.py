@@ -0,0 +1,47 @@
+"""
+Regression tests for retrieval deadlines.
+A retriever that hangs must only cost its own results: the other retrievers
+of the query, and of the queries after it, still return within their deadline.
+
+Usage:
+    python -m pytest tests/
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from langchain_core.documents import Document
+
+from src.retrieval import HybridRetriever
+
+
+def test_hung_dense_retrieval_does_not_starve_sparse():
+    retriever = HybridRetriever(None, final_top_k=3, dense_timeout=0.2, sparse_timeout=2.0)
+    retriever.initialize_bm25_index(
+        [Document(page_content=f"chunk {i} about the budget of team {i}") for i in range(20)],
+        ids=[f"chunk_{i}" for i in range(20)]
+    )
+
+    # Dense calls block until the end of the test, as if the embedding server hung
+    released = threading.Event()
+
+    def hung_search(query, k=None, metadata_filter=None):
+        released.wait()
+        return retriever.dense_retrieval(query, k, metadata_filter)
+
+    name, _, timeout, search_many, filterable = retriever.retrievers[0]
+    assert name == "dense"
+    retriever.retrievers[0] = (name, hung_search, timeout, search_many, filterable)
+
+    try:
+        for _ in range(8):
+            start = time.perf_counter()
+            results = retriever.retrieve("budget of team 7")
+            assert time.perf_counter() - start < 1.0
+            assert "team 7" in results[0].page_content
+    finally:
+        released.set()